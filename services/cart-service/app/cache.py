@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from app.config import Config
+from shared.metrics import registry
+
+CACHE_REQUESTS = registry.counter(
+    'cart_cache_requests_total', 'Cart cache lookups by result (hit, miss)', ('result',))
+CACHE_INVALIDATIONS = registry.counter(
+    'cart_cache_invalidations_total', 'Cached carts dropped because a newer version was announced')
+CACHE_SIZE = registry.gauge(
+    'cart_cache_entries', 'Carts (and invalidation markers) held in the cart cache')
+
+class CartCache:
+    """In-process LRU cache of carts keyed by userId, with a TTL.
+
+    Entries carry the cart's version, the counter every write to the cart
+    increments. Writes store the post-image they got back from MongoDB, and
+    cart events (consumed by every replica) invalidate entries older than the
+    version they announce. An
+    invalidated user keeps a marker with that version, so a read that raced
+    the write cannot put the older cart back.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or Config.CART_CACHE_SIZE
+        self.ttl = ttl or Config.CART_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the cached cart, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] < time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry is None or entry[0] is None:
+                CACHE_REQUESTS.inc(result='miss')
+                return None
+            self._entries.move_to_end(user_id)
+            CACHE_REQUESTS.inc(result='hit')
+            return entry[0]
+
+    def put(self, cart):
+        """Cache a cart read from or returned by MongoDB, unless a newer version is already known"""
+        if not cart:
+            return
+        version = cart.get('version')
+        with self._lock:
+            entry = self._entries.get(cart['userId'])
+            if entry is not None and entry[1] is not None and version is not None and entry[1] > version:
+                return
+            self._store(cart['userId'], (cart, version, time.monotonic() + self.ttl))
+
+    def invalidate(self, user_id, version=None):
+        """Drop the user's cart unless the cached one is at least at the given version"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and version is not None and entry[1] is not None and entry[1] >= version:
+                return
+            if entry is not None and entry[0] is not None:
+                CACHE_INVALIDATIONS.inc()
+            if version is None:
+                self._entries.pop(user_id, None)
+                CACHE_SIZE.set(len(self._entries))
+            else:
+                self._store(user_id, (None, version, time.monotonic() + self.ttl))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            CACHE_SIZE.set(0)
+
+    def _store(self, user_id, entry):
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        CACHE_SIZE.set(len(self._entries))
+
+cart_cache = CartCache()
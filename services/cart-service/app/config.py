@@ -9,4 +9,28 @@ class Config:
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     CART_UPDATES_TOPIC = 'cart-updates'
     CART_REMOVALS_TOPIC = 'cart-removals'
-    NOTIFICATION_TOPIC = 'notification-topic'
\ No newline at end of file
+    NOTIFICATION_TOPIC = 'notification-topic'
+
+    # Read-through cart cache (see app/cache.py)
+    CART_CACHE_SIZE = int(os.getenv('CART_CACHE_SIZE', '10000'))
+    CART_CACHE_TTL = float(os.getenv('CART_CACHE_TTL', '30'))
+
+    # Operations accepted by one POST /api/cart/items/bulk
+    CART_BULK_MAX_OPERATIONS = int(os.getenv('CART_BULK_MAX_OPERATIONS', '100'))
+
+    # Local product projection (see app/projection.py)
+    PRODUCT_PROJECTION_SYNC_INTERVAL = float(os.getenv('PRODUCT_PROJECTION_SYNC_INTERVAL', '2'))
+    # Reject adds of products the projection does not know, has seen deleted or lacks stock for
+    VALIDATE_PRODUCTS = os.getenv('CART_VALIDATE_PRODUCTS', 'true').lower() == 'true'
+    # Take stock when items are added and hold it against the cart (see shared/inventory.py)
+    RESERVE_STOCK = os.getenv('CART_RESERVE_STOCK', 'true').lower() == 'true'
+
+    # Abandoned-cart sweeper (see app/sweeper.py): carts idle for ABANDONED_CART_AFTER_SECONDS
+    # get their stock released and a reminder, scanning only during the off-peak UTC hours
+    # ABANDONED_CART_SWEEP_HOURS (start-end, may wrap midnight) at most ABANDONED_CART_RATE carts/s
+    ABANDONED_CART_SWEEP_ENABLED = os.getenv('ABANDONED_CART_SWEEP_ENABLED', 'true').lower() == 'true'
+    ABANDONED_CART_AFTER_SECONDS = int(os.getenv('ABANDONED_CART_AFTER_SECONDS', '86400'))
+    ABANDONED_CART_SWEEP_HOURS = os.getenv('ABANDONED_CART_SWEEP_HOURS', '2-6')
+    ABANDONED_CART_SWEEP_INTERVAL = float(os.getenv('ABANDONED_CART_SWEEP_INTERVAL', '300'))
+    ABANDONED_CART_BATCH_SIZE = int(os.getenv('ABANDONED_CART_BATCH_SIZE', '200'))
+    ABANDONED_CART_RATE = float(os.getenv('ABANDONED_CART_RATE', '50'))
@@ -1,7 +1,11 @@
-from app.services.mongo_service import save_event_to_mongo
-from shared.kafka_service import KafkaService
+from app.services.mongo_service import save_event_to_mongo, save_events_to_mongo
+from app.cache import cart_cache
+from app.projection import product_projection
+from shared.kafka_service import KafkaService, ConsumerRuntime
 from shared.kafka_config import KafkaConfig
 import logging
+import os
+import socket
 from datetime import datetime
 
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +21,15 @@ def handle_cart_updated(event):
         
     except Exception as e:
         logger.error(f"Error handling cart updated event: {e}")
+        raise
+
+def handle_cart_updates_batch(events):
+    try:
+        save_events_to_mongo(events)
+        logger.info(f"{len(events)} cart updated events saved")
+    except Exception as e:
+        logger.error(f"Error handling cart updated events: {e}")
+        raise
 
 def handle_cart_item_removed(event):
     try:
@@ -35,7 +48,40 @@ def handle_cart_item_removed(event):
                 topic=KafkaConfig.NOTIFICATION_TOPIC,
                 source="CartService",
                 payload=notification_payload,
+                key=event['snapshot'].get('userId'),
                 snapshot=event['snapshot']
             )
     except Exception as e:
-        logger.error(f"Error handling cart item removed event: {e}")
\ No newline at end of file
+        logger.error(f"Error handling cart item removed event: {e}")
+        raise
+
+def handle_product_events_batch(events):
+    applied = product_projection.apply_events(events)
+    logger.info(f"{applied}/{len(events)} product events applied to the product projection")
+
+def invalidate_cached_cart(event):
+    snapshot = event.get('snapshot') or {}
+    if snapshot.get('userId'):
+        cart_cache.invalidate(snapshot['userId'], snapshot.get('version'))
+
+def start_event_consumers():
+    """Start one consumer for every topic cart-service listens to"""
+    # Serve lookups from the stored projection; the consumer below catches it up from the topic
+    product_projection.start()
+
+    runtime = ConsumerRuntime('cart-service-group', workers=KafkaConfig.CONSUMER_WORKERS)
+    runtime.register_batch(KafkaConfig.PRODUCT_EVENTS_TOPIC, handle_product_events_batch)
+    runtime.register_batch(KafkaConfig.CART_UPDATES_TOPIC, handle_cart_updates_batch)
+    runtime.register(KafkaConfig.CART_REMOVALS_TOPIC, handle_cart_item_removed)
+    runtime.start()
+
+    # Every replica needs every cart event to keep its cache coherent, so
+    # invalidation runs in a group of its own that starts at the log end
+    cache_runtime = ConsumerRuntime(
+        f'cart-service-cache-{socket.gethostname()}-{os.getpid()}',
+        retry_delays=[], offset_reset='latest', dead_letter=False
+    )
+    cache_runtime.register(KafkaConfig.CART_UPDATES_TOPIC, invalidate_cached_cart)
+    cache_runtime.register(KafkaConfig.CART_REMOVALS_TOPIC, invalidate_cached_cart)
+    cache_runtime.start()
+    logger.info("Started cart event consumer")
@@ -0,0 +1,21 @@
+# MongoDB indexes of the cart service, applied at startup (see shared/indexes.py)
+from datetime import datetime
+from shared.indexes import index, query
+from shared.event_store import EVENT_INDEXES, EVENT_QUERIES
+from shared.outbox import OUTBOX_INDEXES, OUTBOX_QUERIES
+from shared.inventory import INVENTORY_INDEXES, INVENTORY_QUERIES
+
+INDEXES = [
+    # One cart per user
+    index('carts', 'userId', unique=True),
+    # The abandoned-cart sweeper walks idle carts in this order
+    index('carts', [('updatedAt', 1), ('_id', 1)]),
+    # Replicas poll the product projection for rows changed since their last sync
+    index('product_projection', 'syncedAt')
+] + EVENT_INDEXES + OUTBOX_INDEXES + INVENTORY_INDEXES
+
+QUERIES = [
+    query('cart-by-user', 'carts', {'userId': 'probe'}),
+    query('idle-carts', 'carts', {'updatedAt': {'$lt': datetime(2000, 1, 1)}}, [('updatedAt', 1), ('_id', 1)]),
+    query('product-projection-changes', 'product_projection', {'syncedAt': {'$gt': datetime(2000, 1, 1)}})
+] + EVENT_QUERIES + OUTBOX_QUERIES + INVENTORY_QUERIES
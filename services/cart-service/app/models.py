@@ -1,70 +1,132 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from app import mongo
 
+# Concurrent upserts of a new cart race on the unique userId index; the loser retries as an update
+UPSERT_RETRIES = 3
+
+# Bulk updates are compare-and-set on the cart's version, which every write increments
+CAS_RETRIES = 5
+
+def apply_operations(items, operations, now):
+    """Return the items of a cart after applying add/remove/set operations in order"""
+    items = [dict(item) for item in items]
+    for operation in operations:
+        product_id = operation['productId']
+        item = next((item for item in items if item['productId'] == product_id), None)
+        if operation['op'] == 'add':
+            if item:
+                item['quantity'] += operation['quantity']
+            else:
+                items.append({'productId': product_id, 'quantity': operation['quantity'], 'addedAt': now})
+        elif operation['op'] == 'set' and operation['quantity'] > 0:
+            if item:
+                item['quantity'] = operation['quantity']
+            else:
+                items.append({'productId': product_id, 'quantity': operation['quantity'], 'addedAt': now})
+        else:
+            # remove, or set to 0; removing a product that is not in the cart is a no-op
+            items = [i for i in items if i['productId'] != product_id]
+    return items
+
 class Cart:
     @staticmethod
     def get_or_create_cart(user_id):
-        cart = mongo.db.carts.find_one({'userId': user_id})
-        if not cart:
-            cart_data = {
-                'userId': user_id,
-                'items': [],
-                'createdAt': datetime.utcnow(),
-                'updatedAt': datetime.utcnow()
-            }
-            result = mongo.db.carts.insert_one(cart_data)
-            cart = mongo.db.carts.find_one({'_id': result.inserted_id})
-        return cart
+        now = datetime.utcnow()
+        for attempt in range(UPSERT_RETRIES):
+            try:
+                return mongo.db.carts.find_one_and_update(
+                    {'userId': user_id},
+                    {'$setOnInsert': {'items': [], 'version': 0, 'createdAt': now, 'updatedAt': now}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                if attempt == UPSERT_RETRIES - 1:
+                    raise
 
     @staticmethod
     def add_item(user_id, product_id, quantity):
-        cart = Cart.get_or_create_cart(user_id)
-        
-        # Check if product already exists in cart
-        item_index = next((i for i, item in enumerate(cart['items']) 
-                          if item['productId'] == product_id), None)
-        
-        if item_index is not None:
-            # Update quantity if product exists
-            cart['items'][item_index]['quantity'] += quantity
-        else:
-            # Add new item
-            cart['items'].append({
-                'productId': product_id,
-                'quantity': quantity,
-                'addedAt': datetime.utcnow()
-            })
-        
-        cart['updatedAt'] = datetime.utcnow()
-        mongo.db.carts.update_one(
-            {'_id': cart['_id']},
-            {'$set': {
-                'items': cart['items'],
-                'updatedAt': cart['updatedAt']
-            }}
-        )
-        return cart
+        """Add quantity of a product to the user's cart, creating the cart if needed; returns the updated cart"""
+        for attempt in range(UPSERT_RETRIES):
+            now = datetime.utcnow()
+
+            # Product already in the cart: bump the matched element in place
+            cart = mongo.db.carts.find_one_and_update(
+                {'userId': user_id, 'items.productId': product_id},
+                {'$inc': {'items.$.quantity': quantity, 'version': 1}, '$set': {'updatedAt': now}},
+                return_document=ReturnDocument.AFTER
+            )
+            if cart:
+                return cart
+
+            # Otherwise append it, creating the cart if there is none. If another request added
+            # the product in between, the filter no longer matches, the upsert collides on
+            # userId and the next attempt takes the $inc path
+            try:
+                return mongo.db.carts.find_one_and_update(
+                    {'userId': user_id, 'items.productId': {'$ne': product_id}},
+                    {
+                        '$push': {'items': {'productId': product_id, 'quantity': quantity, 'addedAt': now}},
+                        '$set': {'updatedAt': now},
+                        '$inc': {'version': 1},
+                        '$setOnInsert': {'createdAt': now}
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                if attempt == UPSERT_RETRIES - 1:
+                    raise
 
     @staticmethod
     def remove_item(user_id, product_id):
+        """Remove a product from the user's cart; returns the updated cart, or None if it was not in it"""
+        return mongo.db.carts.find_one_and_update(
+            {'userId': user_id, 'items.productId': product_id},
+            {
+                '$pull': {'items': {'productId': product_id}},
+                '$set': {'updatedAt': datetime.utcnow()},
+                '$inc': {'version': 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def apply_operations(user_id, operations, before_write=None):
+        """Apply a list of operations to the user's cart as one atomic update; returns the updated cart.
+
+        before_write(previous_items, items), if given, runs before each write
+        attempt and returns a callable that undoes it should the attempt lose.
+        """
         cart = Cart.get_or_create_cart(user_id)
-        initial_count = len(cart['items'])
-        
-        cart['items'] = [item for item in cart['items'] 
-                        if item['productId'] != product_id]
-        
-        if len(cart['items']) < initial_count:
-            cart['updatedAt'] = datetime.utcnow()
-            mongo.db.carts.update_one(
-                {'_id': cart['_id']},
-                {'$set': {
-                    'items': cart['items'],
-                    'updatedAt': cart['updatedAt']
-                }}
-            )
-            return True
-        return False
+        for attempt in range(CAS_RETRIES):
+            now = datetime.utcnow()
+            items = apply_operations(cart['items'], operations, now)
+            undo = before_write(cart['items'], items) if before_write else None
+            try:
+                updated = mongo.db.carts.find_one_and_update(
+                    # Carts written before versioning have no version field; None matches them
+                    {'_id': cart['_id'], 'version': cart.get('version')},
+                    {
+                        '$set': {'items': items, 'updatedAt': now},
+                        '$inc': {'version': 1}
+                    },
+                    return_document=ReturnDocument.AFTER
+                )
+            except Exception:
+                if undo:
+                    undo()
+                raise
+            if updated:
+                return updated
+            if undo:
+                undo()
+            # Someone else wrote the cart since we read it: start over from its current state
+            cart = Cart.get_or_create_cart(user_id)
+        raise ValueError("Cart is being modified concurrently, please retry")
 
     @staticmethod
     def get_cart(user_id):
@@ -72,11 +134,25 @@ class Cart:
 
     @staticmethod
     def clear_cart(user_id):
-        result = mongo.db.carts.update_one(
+        """Empty the user's cart; returns the updated cart, or None if the user has none"""
+        return mongo.db.carts.find_one_and_update(
             {'userId': user_id},
             {'$set': {
                 'items': [],
                 'updatedAt': datetime.utcnow()
-            }}
+            }, '$inc': {'version': 1}},
+            return_document=ReturnDocument.AFTER
         )
-        return result.modified_count > 0
\ No newline at end of file
+
+
+class ProductCatalog:
+    """Read-only view of product-service's products collection (same database)"""
+
+    @staticmethod
+    def get_products(product_ids):
+        """Name, price and stock of the given products in a single $in query, keyed by productId"""
+        object_ids = [ObjectId(product_id) for product_id in set(product_ids) if ObjectId.is_valid(product_id)]
+        if not object_ids:
+            return {}
+        products = mongo.db.products.find({'_id': {'$in': object_ids}}, {'name': 1, 'price': 1, 'stock': 1})
+        return {str(product['_id']): product for product in products}
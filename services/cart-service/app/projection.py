@@ -0,0 +1,191 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.config import Config
+from shared.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_SIZE = registry.gauge(
+    'cart_product_projection_entries', 'Products held in cart-service\'s in-memory product projection')
+PROJECTION_EVENTS = registry.counter(
+    'cart_product_projection_events_total', 'product-events applied to the projection by result (applied, stale)',
+    ('result',))
+
+DUPLICATE_KEY = 11000
+FIELDS = ('name', 'price', 'stock')
+
+# Rows written by another replica may become visible slightly after their syncedAt
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def _projection_collection():
+    from app import mongo
+    return mongo.db.product_projection
+
+def _products_collection():
+    from app import mongo
+    return mongo.db.products
+
+def _millis(value):
+    # BSON keeps milliseconds; compare what the collection will hold
+    return value.replace(microsecond=value.microsecond // 1000 * 1000) if value else None
+
+def _version(event):
+    value = (event.get('snapshot') or {}).get('timestamp') or event.get('timestamp')
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return _millis(value)
+
+def _changes(event):
+    """The projection fields a product event sets, or None if it is not about a product"""
+    snapshot = event.get('snapshot') or {}
+    payload = event.get('payload') or {}
+    if not snapshot.get('productId'):
+        return None
+    if snapshot.get('status') == 'DELETED':
+        return {'deleted': True}
+    changes = {field: payload[field] for field in FIELDS if field in payload}
+    if snapshot.get('status') == 'CREATED':
+        changes['deleted'] = False
+    return changes
+
+class ProductProjection:
+    """Compact local copy of the product catalog: name, price, stock and a deleted flag.
+
+    cart-service-group applies product-events to the product_projection
+    collection; its committed offsets are the point up to which that
+    collection is current, so on startup the consumer resumes from there.
+    Every replica loads the collection into memory when it starts and then
+    polls it for rows changed since (syncedAt), so lookups never leave the
+    process. Each row keeps the timestamp of the event that last changed it
+    and older or replayed events are ignored.
+
+    product-events only goes back as far as the topic's retention, so an
+    empty collection is first seeded from the products collection itself
+    (versioned by updated_at); the topic then applies anything newer.
+    """
+
+    def __init__(self, sync_interval=None):
+        self.sync_interval = sync_interval or Config.PRODUCT_PROJECTION_SYNC_INTERVAL
+        self._products = {}
+        self._synced_until = None
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Load the snapshot and keep following the collection on a background thread"""
+        if _projection_collection().find_one({}, {'_id': 1}) is None:
+            self.seed()
+        self.sync()
+        threading.Thread(target=self._run, name='product-projection-sync', daemon=True).start()
+        logger.info(f"Product projection loaded with {len(self._products)} products")
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def loaded(self):
+        return self._loaded.is_set()
+
+    def get(self, product_id):
+        """The projected product, or None if it is unknown"""
+        return self._products.get(product_id)
+
+    def get_many(self, product_ids):
+        return {product_id: self._products[product_id] for product_id in product_ids if product_id in self._products}
+
+    def apply_events(self, events):
+        """Apply product-events to the collection (one unordered bulk write) and to memory"""
+        requests, rows = [], []
+        for event in events:
+            changes, version = _changes(event), _version(event)
+            if changes is None or version is None:
+                continue
+            product_id = event['snapshot']['productId']
+            # The filter misses when the row holds a newer (or the same) event; the upsert then
+            # collides on _id and the write is skipped
+            requests.append(UpdateOne(
+                {'_id': product_id, '$or': [{'version': {'$lt': version}}, {'version': None}]},
+                {'$set': {**changes, 'version': version}, '$currentDate': {'syncedAt': True}},
+                upsert=True
+            ))
+            rows.append({'_id': product_id, **changes, 'version': version})
+        if not requests:
+            return 0
+
+        applied = self._write(requests)
+        stale = len(requests) - applied
+        PROJECTION_EVENTS.inc(applied, result='applied')
+        if stale:
+            PROJECTION_EVENTS.inc(stale, result='stale')
+
+        with self._lock:
+            for row in rows:
+                self._merge(row)
+        return applied
+
+    def seed(self, batch_size=1000):
+        """Copy the products collection into the projection; rows already holding a newer event are kept"""
+        seeded, requests = 0, []
+        for product in _products_collection().find({}, {field: 1 for field in FIELDS + ('updated_at',)}):
+            version = _millis(product.get('updated_at')) or datetime(1970, 1, 1)
+            changes = {field: product.get(field) for field in FIELDS}
+            requests.append(UpdateOne(
+                {'_id': str(product['_id']), '$or': [{'version': {'$lt': version}}, {'version': None}]},
+                {'$set': {**changes, 'deleted': False, 'version': version}, '$currentDate': {'syncedAt': True}},
+                upsert=True
+            ))
+            if len(requests) >= batch_size:
+                seeded += self._write(requests)
+                requests = []
+        if requests:
+            seeded += self._write(requests)
+        logger.info(f"Product projection seeded with {seeded} products from the products collection")
+        return seeded
+
+    @staticmethod
+    def _write(requests):
+        """Unordered bulk write of guarded upserts; returns how many were applied (the rest were stale)"""
+        try:
+            _projection_collection().bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY for error in errors):
+                raise
+            return len(requests) - len(errors)
+        return len(requests)
+
+    def sync(self):
+        """Pull rows changed since the last sync (all of them the first time)"""
+        query = {}
+        if self._synced_until is not None:
+            query = {'syncedAt': {'$gt': self._synced_until - SYNC_OVERLAP}}
+        latest = self._synced_until
+        with self._lock:
+            for row in _projection_collection().find(query):
+                self._merge(row)
+                if row.get('syncedAt') and (latest is None or row['syncedAt'] > latest):
+                    latest = row['syncedAt']
+            self._synced_until = latest
+            PROJECTION_SIZE.set(len(self._products))
+        self._loaded.set()
+
+    def _merge(self, row):
+        current = self._products.get(row['_id'])
+        if current is not None and current['version'] and row.get('version') and current['version'] >= row['version']:
+            return
+        product = dict(current or {'productId': row['_id'], 'name': None, 'price': None, 'stock': None, 'deleted': False})
+        product.update({field: row[field] for field in FIELDS + ('deleted', 'version') if field in row})
+        self._products[row['_id']] = product
+
+    def _run(self):
+        while not self._stopped.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Failed to sync product projection: {str(e)}")
+
+product_projection = ProductProjection()
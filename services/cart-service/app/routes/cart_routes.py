@@ -29,6 +29,27 @@ def add_item():
         logger.error(f"Unexpected error adding item to cart: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+@cart_bp.route('/items/bulk', methods=['POST'])
+def apply_bulk_operations():
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+
+        data = request.get_json(force=True)
+        logger.info(f"Received {len(data.get('operations') or [])} cart operations for user {data.get('userId')}")
+
+        cart = CartService.apply_bulk_operations(data)
+        return jsonify({
+            "message": "Cart updated",
+            "cart": json.loads(json_util.dumps(cart))
+        }), 200
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error applying cart operations: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
 @cart_bp.route('/items/<product_id>', methods=['DELETE'])
 def remove_item(product_id):
     try:
@@ -57,7 +78,11 @@ def get_cart():
         if not user_id:
             return jsonify({"error": "userId parameter is required"}), 400
             
-        cart = CartService.get_cart(user_id)
+        # ?priced=true adds names, unit prices, line totals and the cart total
+        if request.args.get('priced', '').lower() in ('1', 'true', 'yes'):
+            cart = CartService.get_priced_cart(user_id)
+        else:
+            cart = CartService.get_cart(user_id)
         return jsonify(json.loads(json_util.dumps(cart))), 200
     except ValueError as e:
         logger.error(f"Error getting cart: {str(e)}")
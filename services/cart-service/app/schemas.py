@@ -1,4 +1,5 @@
 from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+from app.config import Config
 
 class CartItemSchema(Schema):
     productId = fields.Str(required=True)
@@ -9,5 +10,25 @@ class AddCartItemSchema(Schema):
     productId = fields.Str(required=True)
     quantity = fields.Int(required=True, validate=validate.Range(min=1))
 
+class CartOperationSchema(Schema):
+    op = fields.Str(required=True, validate=validate.OneOf(['add', 'remove', 'set']))
+    productId = fields.Str(required=True)
+    quantity = fields.Int(validate=validate.Range(min=0))
+
+    @validates_schema
+    def validate_quantity(self, data, **kwargs):
+        if data.get('op') == 'add' and not data.get('quantity'):
+            raise ValidationError("add requires a quantity of at least 1", 'quantity')
+        if data.get('op') == 'set' and data.get('quantity') is None:
+            raise ValidationError("set requires a quantity", 'quantity')
+
+class BulkCartSchema(Schema):
+    userId = fields.Str(required=True)
+    operations = fields.List(
+        fields.Nested(CartOperationSchema), required=True,
+        validate=validate.Length(min=1, max=Config.CART_BULK_MAX_OPERATIONS)
+    )
+
 class RemoveCartItemSchema(Schema):
-    userId = fields.Str(required=True)
\ No newline at end of file
+    userId = fields.Str(required=True)
+    productId = fields.Str(required=True)
\ No newline at end of file
@@ -1,15 +1,56 @@
-from app.models import Cart
-from app.schemas import AddCartItemSchema, RemoveCartItemSchema
+from app.models import Cart, ProductCatalog
+from app.cache import cart_cache
+from app.projection import product_projection
+from app.schemas import AddCartItemSchema, BulkCartSchema, RemoveCartItemSchema
 from app.services.kafka_service import KafkaService
 from app.services.mongo_service import save_event_to_mongo
 from app.config import Config
-from datetime import datetime
+from marshmallow import ValidationError
+from shared.inventory import Inventory
+from decimal import Decimal
+from bson import Decimal128
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
+CENTS = Decimal('0.01')
+
+def _money(price):
+    if isinstance(price, Decimal128):
+        price = price.to_decimal()
+    return Decimal(str(price)).quantize(CENTS)
+
+def _quantity_deltas(previous_items, items):
+    """{productId: change in quantity} between two versions of a cart's items"""
+    deltas = {item['productId']: -item['quantity'] for item in previous_items}
+    for item in items:
+        deltas[item['productId']] = deltas.get(item['productId'], 0) + item['quantity']
+    return {product_id: delta for product_id, delta in deltas.items() if delta}
+
 class CartService:
+    @staticmethod
+    def validate_products(lines):
+        """Check (productId, quantity) pairs against the local product projection.
+
+        Products it does not know (not projected yet, or the projection is
+        still loading) are looked up in the products collection with one $in query.
+        """
+        if not Config.VALIDATE_PRODUCTS:
+            return
+        product_ids = [product_id for product_id, _ in lines]
+        products = product_projection.get_many(product_ids) if product_projection.loaded else {}
+        missing = [product_id for product_id in product_ids if product_id not in products]
+        if missing:
+            products.update(ProductCatalog.get_products(missing))
+        for product_id, quantity in lines:
+            product = products.get(product_id)
+            if product is None or product.get('deleted'):
+                raise ValueError(f"Product {product_id} not found")
+            # With reservations the stock check is the conditional decrement itself
+            if not Config.RESERVE_STOCK and product.get('stock') is not None and quantity > product['stock']:
+                raise ValueError(f"Only {product['stock']} units of product {product_id} in stock")
+
     @staticmethod
     def add_item_to_cart(cart_data):
         # Validate data
@@ -17,24 +58,86 @@ class CartService:
         errors = schema.validate(cart_data)
         if errors:
             raise ValueError(errors)
+        CartService.validate_products([(cart_data['productId'], cart_data['quantity'])])
+
+        if Config.RESERVE_STOCK:
+            Inventory.reserve(cart_data['userId'], cart_data['productId'], cart_data['quantity'])
 
         # Add item to cart
-        cart = Cart.add_item(
-            cart_data['userId'],
-            cart_data['productId'],
-            cart_data['quantity']
-        )
+        try:
+            cart = Cart.add_item(
+                cart_data['userId'],
+                cart_data['productId'],
+                cart_data['quantity']
+            )
+        except Exception:
+            if Config.RESERVE_STOCK:
+                Inventory.release(cart_data['userId'], cart_data['productId'], cart_data['quantity'])
+            raise
+        cart_cache.put(cart)
 
         # Publish event
         KafkaService.produce_event(
             topic=Config.CART_UPDATES_TOPIC,
             source="CartService",
             payload=cart_data,
+            key=cart['userId'],
             snapshot={
                 "cartId": str(cart['_id']),
                 "userId": cart['userId'],
                 "totalItems": len(cart['items']),
-                "updatedAt": datetime.utcnow().isoformat()
+                "updatedAt": cart['updatedAt'].isoformat(),
+                "version": cart.get('version')
+            }
+        )
+
+        return cart
+
+    @staticmethod
+    def apply_bulk_operations(bulk_data):
+        """Apply a list of add/remove/set operations to one cart and publish a single event"""
+        # Work on the deserialized operations: a quantity sent as "3" must reach the cart as 3
+        try:
+            bulk_data = BulkCartSchema().load(bulk_data)
+        except ValidationError as e:
+            raise ValueError(e.messages)
+        CartService.validate_products([
+            (operation['productId'], operation['quantity'])
+            for operation in bulk_data['operations'] if operation['op'] != 'remove' and operation.get('quantity')
+        ])
+
+        user_id = bulk_data['userId']
+        changes = {}
+
+        def reserve_increases(previous_items, items):
+            # Runs before every write attempt; undone if the attempt loses the compare-and-set
+            changes['deltas'] = _quantity_deltas(previous_items, items)
+            reserved = Inventory.reserve_many(user_id, {
+                product_id: delta for product_id, delta in changes['deltas'].items() if delta > 0
+            })
+            return lambda: Inventory.release_many(user_id, reserved)
+
+        cart = Cart.apply_operations(
+            user_id, bulk_data['operations'], before_write=reserve_increases if Config.RESERVE_STOCK else None
+        )
+        if Config.RESERVE_STOCK:
+            Inventory.release_many(user_id, {
+                product_id: -delta for product_id, delta in changes['deltas'].items() if delta < 0
+            })
+        cart_cache.put(cart)
+
+        KafkaService.produce_event(
+            topic=Config.CART_UPDATES_TOPIC,
+            source="CartService",
+            payload=bulk_data,
+            key=cart['userId'],
+            snapshot={
+                "cartId": str(cart['_id']),
+                "userId": cart['userId'],
+                "totalItems": len(cart['items']),
+                "operations": len(bulk_data['operations']),
+                "updatedAt": cart['updatedAt'].isoformat(),
+                "version": cart.get('version')
             }
         )
 
@@ -49,26 +152,29 @@ class CartService:
             raise ValueError(errors)
 
         # Remove item from cart
-        removed = Cart.remove_item(
+        cart = Cart.remove_item(
             remove_data['userId'],
             remove_data.get('productId')
         )
 
-        if not removed:
+        if not cart:
             raise ValueError("Item not found in cart")
-
-        cart = Cart.get_cart(remove_data['userId'])
+        if Config.RESERVE_STOCK:
+            Inventory.release(remove_data['userId'], remove_data['productId'])
+        cart_cache.put(cart)
 
         # Publish event
         KafkaService.produce_event(
             topic=Config.CART_REMOVALS_TOPIC,
             source="CartService",
             payload=remove_data,
+            key=cart['userId'],
             snapshot={
                 "cartId": str(cart['_id']),
                 "userId": cart['userId'],
                 "totalItems": len(cart['items']),
-                "updatedAt": datetime.utcnow().isoformat()
+                "updatedAt": cart['updatedAt'].isoformat(),
+                "version": cart.get('version')
             }
         )
 
@@ -76,14 +182,61 @@ class CartService:
 
     @staticmethod
     def get_cart(user_id):
-        cart = Cart.get_cart(user_id)
+        cart = cart_cache.get(user_id)
+        if cart is None:
+            cart = Cart.get_cart(user_id)
+            cart_cache.put(cart)
         if not cart:
             raise ValueError("Cart not found")
         return cart
 
+    @staticmethod
+    def get_priced_cart(user_id):
+        """The user's cart with each line's name, unit price and line total, and the cart total"""
+        cart = CartService.get_cart(user_id)
+        product_ids = [item['productId'] for item in cart['items']]
+        products = product_projection.get_many(product_ids)
+        missing = [product_id for product_id in product_ids if product_id not in products]
+        if missing:
+            # Not projected yet (e.g. right after the first start): one $in query for the rest
+            products.update(ProductCatalog.get_products(missing))
+
+        items, total, unpriced = [], Decimal('0.00'), []
+        for item in cart['items']:
+            product = products.get(item['productId'])
+            if product is None or product.get('deleted') or product.get('price') is None:
+                # Deleted or unknown product: listed, but left out of the total
+                unpriced.append(item['productId'])
+                items.append({**item, 'name': None, 'unitPrice': None, 'lineTotal': None})
+                continue
+            unit_price = _money(product['price'])
+            line_total = unit_price * item['quantity']
+            total += line_total
+            items.append({**item, 'name': product.get('name'), 'unitPrice': float(unit_price), 'lineTotal': float(line_total)})
+
+        return {**cart, 'items': items, 'total': float(total), 'unpricedItems': unpriced}
+
     @staticmethod
     def clear_cart(user_id):
-        cleared = Cart.clear_cart(user_id)
-        if not cleared:
+        cart = Cart.clear_cart(user_id)
+        if not cart:
             raise ValueError("Cart not found or already empty")
+        if Config.RESERVE_STOCK:
+            Inventory.release_all(user_id)
+        cart_cache.put(cart)
+
+        # Published so other replicas drop their cached copy
+        KafkaService.produce_event(
+            topic=Config.CART_UPDATES_TOPIC,
+            source="CartService",
+            payload={"userId": user_id, "cleared": True},
+            key=user_id,
+            snapshot={
+                "cartId": str(cart['_id']),
+                "userId": user_id,
+                "totalItems": 0,
+                "updatedAt": cart['updatedAt'].isoformat(),
+                "version": cart.get('version')
+            }
+        )
         return {"message": "Cart cleared successfully"}
\ No newline at end of file
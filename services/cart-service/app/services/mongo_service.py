@@ -1,28 +1,27 @@
-from app import mongo
-from datetime import datetime
-from bson import json_util
-import json
+from shared.event_store import EventStoreWriter
 import logging
 
 logger = logging.getLogger(__name__)
 
-def save_event_to_mongo(event):
+def save_event_to_mongo(event, sync=False, upsert=False):
     """
-    Save event to MongoDB with robust data type handling
+    Queue an event for the events collection; with sync=True wait until it is stored.
+    An eventId that is already stored is skipped, unless upsert=True updates its fields
     """
     try:
-        event_to_store = event.copy()
-        
-        if 'timestamp' in event_to_store and isinstance(event_to_store['timestamp'], datetime):
-            event_to_store['timestamp'] = event_to_store['timestamp'].isoformat()
-        
-        event_to_store['stored_at'] = datetime.utcnow()
-        event_to_store = json.loads(json_util.dumps(event_to_store))
-        
-        result = mongo.db.events.insert_one(event_to_store)
-        logger.info(f"Event saved to MongoDB with ID: {result.inserted_id}")
-        return result.inserted_id
+        return EventStoreWriter.instance().write([event], sync=sync, upsert=upsert)[0]
         
     except Exception as e:
         logger.error(f"Failed to save event to MongoDB. Error: {str(e)}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+def save_events_to_mongo(events, sync=False, upsert=False):
+    """
+    Queue a batch of events for the events collection; with sync=True wait until they are stored
+    """
+    try:
+        return EventStoreWriter.instance().write(events, sync=sync, upsert=upsert)
+        
+    except Exception as e:
+        logger.error(f"Failed to save events to MongoDB. Error: {str(e)}", exc_info=True)
+        raise
@@ -0,0 +1,193 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from pymongo import ReturnDocument
+from app.config import Config
+from shared.inventory import Inventory, ABANDONED
+from shared.kafka_config import KafkaConfig
+from shared.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_ID = 'abandoned-carts'
+
+ABANDONED_CARTS = registry.counter(
+    'cart_abandoned_total', 'Idle carts handled by the abandoned-cart sweeper')
+SWEEP_POSITION = registry.gauge(
+    'cart_abandoned_sweep_position_seconds', 'updatedAt of the last cart the sweeper handled, as a Unix timestamp')
+
+def _carts_collection():
+    from app import mongo
+    return mongo.db.carts
+
+def _checkpoints_collection():
+    from app import mongo
+    return mongo.db.sweeper_checkpoints
+
+def parse_hours(window):
+    """'2-6' -> (2, 6); the window is [start, end) in UTC hours and may wrap midnight"""
+    start, end = (int(hour) for hour in window.split('-'))
+    return start, end
+
+def in_window(now, window):
+    start, end = parse_hours(window)
+    if start == end:
+        return True
+    if start < end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+class AbandonedCartSweeper:
+    """Finds carts idle past ABANDONED_CART_AFTER_SECONDS, releases their stock and sends reminders.
+
+    Carts are walked in (updatedAt, _id) order, which the carts index
+    serves, one batch per query. After every batch the position is saved in
+    sweeper_checkpoints, so a restart resumes where the last one stopped and
+    a cart is handled once per idle period (any write moves its updatedAt
+    past the checkpoint). The checkpoint is leased: with several replicas
+    only one sweeps at a time. To stay off the request path's back the
+    sweeper only runs within the off-peak hours and sleeps between batches
+    to keep under ABANDONED_CART_RATE carts per second.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, idle_seconds=None, batch_size=None, rate=None, hours=None, interval=None):
+        self.idle_seconds = idle_seconds or Config.ABANDONED_CART_AFTER_SECONDS
+        self.batch_size = batch_size or Config.ABANDONED_CART_BATCH_SIZE
+        self.rate = rate or Config.ABANDONED_CART_RATE
+        self.hours = hours or Config.ABANDONED_CART_SWEEP_HOURS
+        self.interval = interval or Config.ABANDONED_CART_SWEEP_INTERVAL
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._stopped = threading.Event()
+
+    @classmethod
+    def start(cls):
+        """Start the process-wide sweeper when ABANDONED_CART_SWEEP_ENABLED is set"""
+        if not Config.ABANDONED_CART_SWEEP_ENABLED:
+            return None
+        with cls._lock:
+            if cls._instance is None:
+                sweeper = cls()
+                threading.Thread(target=sweeper.run, name='abandoned-cart-sweeper', daemon=True).start()
+                cls._instance = sweeper
+                logger.info(f"Abandoned-cart sweeper started as {sweeper.owner} (hours {sweeper.hours} UTC)")
+        return cls._instance
+
+    def stop(self):
+        self._stopped.set()
+
+    def claim(self, lease_seconds):
+        """Lease the checkpoint; returns it, or None while another replica holds it"""
+        now = datetime.utcnow()
+        checkpoints = _checkpoints_collection()
+        checkpoints.update_one({'_id': CHECKPOINT_ID}, {'$setOnInsert': {'updatedAt': None, 'cartId': None}}, upsert=True)
+        return checkpoints.find_one_and_update(
+            {'_id': CHECKPOINT_ID, '$or': [{'leaseUntil': None}, {'leaseUntil': {'$lt': now}}, {'owner': self.owner}]},
+            {'$set': {'owner': self.owner, 'leaseUntil': now + timedelta(seconds=lease_seconds)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def next_batch(self, checkpoint, cutoff):
+        """The next carts idle since before cutoff, after the checkpoint in (updatedAt, _id) order"""
+        query = {'updatedAt': {'$lt': cutoff}, 'items.0': {'$exists': True}}
+        if checkpoint.get('updatedAt') is not None:
+            query['$or'] = [
+                {'updatedAt': {'$gt': checkpoint['updatedAt']}},
+                {'updatedAt': checkpoint['updatedAt'], '_id': {'$gt': checkpoint['cartId']}}
+            ]
+        return list(
+            _carts_collection()
+            .find(query, {'userId': 1, 'items': 1, 'updatedAt': 1})
+            .sort([('updatedAt', 1), ('_id', 1)])
+            .limit(self.batch_size)
+        )
+
+    def handle(self, carts):
+        """Release the batch's stock and publish one reminder request for all of it"""
+        from app.services.kafka_service import KafkaService
+
+        released = 0
+        if Config.RESERVE_STOCK:
+            for cart in carts:
+                released += Inventory.release_all(cart['userId'], reason=ABANDONED)
+
+        KafkaService.produce_event(
+            topic=KafkaConfig.NOTIFICATION_TOPIC,
+            source="CartService",
+            payload={
+                "type": "ABANDONED_CART",
+                "recipients": [
+                    {
+                        "userId": cart['userId'],
+                        "cartId": str(cart['_id']),
+                        "items": [{"productId": item['productId'], "quantity": item['quantity']} for item in cart['items']],
+                        "idleSince": cart['updatedAt'].isoformat()
+                    }
+                    for cart in carts
+                ]
+            },
+            key=CHECKPOINT_ID,
+            snapshot={
+                "status": "ABANDONED_CARTS",
+                "carts": len(carts),
+                "releasedUnits": released,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        )
+        ABANDONED_CARTS.inc(len(carts))
+        return released
+
+    def sweep_once(self):
+        """Handle every cart currently past the idle threshold; returns how many were handled"""
+        pause = self.batch_size / self.rate
+        checkpoint = self.claim(lease_seconds=max(60, pause * 10))
+        if checkpoint is None:
+            return 0
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.idle_seconds)
+        handled = 0
+        while not self._stopped.is_set() and in_window(datetime.utcnow(), self.hours):
+            carts = self.next_batch(checkpoint, cutoff)
+            if not carts:
+                break
+            started = time.monotonic()
+            self.handle(carts)
+            handled += len(carts)
+
+            last = carts[-1]
+            checkpoint = _checkpoints_collection().find_one_and_update(
+                {'_id': CHECKPOINT_ID, 'owner': self.owner},
+                {'$set': {
+                    'updatedAt': last['updatedAt'], 'cartId': last['_id'],
+                    'leaseUntil': datetime.utcnow() + timedelta(seconds=max(60, pause * 10))
+                }},
+                return_document=ReturnDocument.AFTER
+            )
+            if checkpoint is None:
+                logger.warning("Abandoned-cart sweeper lost its checkpoint lease")
+                return handled
+            SWEEP_POSITION.set((last['updatedAt'] - datetime(1970, 1, 1)).total_seconds())
+            # Rate limit: at most batch_size carts every batch_size / rate seconds
+            self._stopped.wait(max(0, pause - (time.monotonic() - started)))
+
+        _checkpoints_collection().update_one(
+            {'_id': CHECKPOINT_ID, 'owner': self.owner}, {'$set': {'leaseUntil': None}}
+        )
+        if handled:
+            logger.info(f"Handled {handled} abandoned carts")
+        return handled
+
+    def run(self):
+        while not self._stopped.is_set():
+            if in_window(datetime.utcnow(), self.hours):
+                try:
+                    self.sweep_once()
+                except Exception as e:
+                    logger.error(f"Error sweeping abandoned carts: {str(e)}", exc_info=True)
+            self._stopped.wait(self.interval)
@@ -4,7 +4,7 @@ from shared.kafka_config import KafkaConfig
 import logging
 from datetime import datetime
 
-from shared.kafka_service import KafkaService
+from shared.kafka_service import ConsumerRuntime
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,11 +13,11 @@ def handle_welcome_notification(event):
     try:
         logger.info(f"Processing welcome notification event: {event['eventId']}")
         
-        # 1. Save the received event to MongoDB
+        # 1. Save the received event (or mark the stored one as being processed)
         save_event_to_mongo({
             **event,
             "processing_started_at": datetime.utcnow()
-        })
+        }, upsert=True)
         
         # 2. Process the notification
         notification_result = NotificationService.send_welcome_notification(event)
@@ -37,11 +37,11 @@ def handle_cart_removal_notification(event):
         if not event.get('payload') or not event['payload'].get('to'):
             raise ValueError("Invalid payload: missing recipient email")
         
-        # 1. Save the received event
+        # 1. Save the received event (or mark the stored one as being processed)
         save_event_to_mongo({
             **event,
             "processing_started_at": datetime.utcnow()
-        })
+        }, upsert=True)
         
         # 2. Process the notification
         notification_result = NotificationService.send_cart_removal_notification(event)
@@ -61,11 +61,11 @@ def handle_order_notification(event):
         if not event.get('snapshot') or not event['snapshot'].get('orderId'):
             raise ValueError("Invalid order notification: missing order ID")
         
-        # 1. Save the original event
+        # 1. Save the original event (or mark the stored one as being processed)
         save_event_to_mongo({
             **event,
             "processing_started_at": datetime.utcnow()
-        })
+        }, upsert=True)
         
         # 2. Process the notification
         notification_result = NotificationService.send_order_notification(event)
@@ -79,37 +79,21 @@ def handle_order_notification(event):
 
 def start_event_consumers():
     """
-    Start all event consumers in separate threads
+    Start a single consumer for all notification topics
     """
-    from threading import Thread
-    
-    consumers = [
-        {
-            "topic": KafkaConfig.WELCOME_TOPIC,
-            "handler": handle_welcome_notification,
-            "group_id": "notification-welcome-group"
-        },
-        {
-            "topic": KafkaConfig.CART_REMOVALS_TOPIC,
-            "handler": handle_cart_removal_notification,
-            "group_id": "notification-cart-group"
-        },
-        {
-            "topic": KafkaConfig.INVOICE_PROCESSING_TOPIC,
-            "handler": handle_order_notification,
-            "group_id": "notification-order-group"
+    # Take over the offsets of the per-topic groups these topics were consumed by
+    runtime = ConsumerRuntime(
+        'notification-service-group',
+        workers=KafkaConfig.CONSUMER_WORKERS,
+        previous_groups={
+            KafkaConfig.WELCOME_TOPIC: ['notification-welcome-group'],
+            KafkaConfig.CART_REMOVALS_TOPIC: ['notification-cart-group'],
+            KafkaConfig.INVOICE_PROCESSING_TOPIC: ['notification-order-group']
         }
-    ]
-    
-    for consumer in consumers:
-        Thread(
-            target=lambda c: KafkaService.consume_events(
-                c['topic'],
-                c['group_id'],
-                c['handler']
-            ),
-            args=(consumer,),
-            daemon=True
-        ).start()
+    )
+    runtime.register(KafkaConfig.WELCOME_TOPIC, handle_welcome_notification)
+    runtime.register(KafkaConfig.CART_REMOVALS_TOPIC, handle_cart_removal_notification)
+    runtime.register(KafkaConfig.INVOICE_PROCESSING_TOPIC, handle_order_notification)
+    runtime.start()
     
-    logger.info("Started all notification event consumers")
\ No newline at end of file
+    logger.info("Started all notification event consumers")
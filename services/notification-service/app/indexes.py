@@ -0,0 +1,14 @@
+# MongoDB indexes of the notification service, applied at startup (see shared/indexes.py)
+from shared.indexes import index, query
+from shared.event_store import EVENT_INDEXES, EVENT_QUERIES
+from shared.outbox import OUTBOX_INDEXES, OUTBOX_QUERIES
+
+INDEXES = [
+    index('notifications', 'recipient'),
+    index('notifications', 'type')
+] + EVENT_INDEXES + OUTBOX_INDEXES
+
+QUERIES = [
+    query('notifications-by-recipient', 'notifications', {'recipient': 'probe@example.com'}),
+    query('notifications-by-type', 'notifications', {'type': 'probe'})
+] + EVENT_QUERIES + OUTBOX_QUERIES
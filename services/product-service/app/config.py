@@ -9,4 +9,17 @@ class Config:
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     PRODUCT_TOPIC = 'product-events'
     CATEGORY_TOPIC = 'category-events'
-    INVENTORY_TOPIC = 'inventory-updates'
\ No newline at end of file
+    INVENTORY_TOPIC = 'inventory-updates'
+
+    # Listado de productos: tamaño máximo de página (?limit=)
+    PRODUCTS_MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', '500'))
+
+    # Búsqueda (ver app/search.py); sin índice en memoria se usa el índice de texto de Mongo
+    SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+    SEARCH_SYNC_INTERVAL = float(os.getenv('SEARCH_SYNC_INTERVAL', '30'))
+    SEARCH_PREFIX_EXPANSIONS = int(os.getenv('SEARCH_PREFIX_EXPANSIONS', '50'))
+    SEARCH_MAX_PAGE_SIZE = int(os.getenv('SEARCH_MAX_PAGE_SIZE', '100'))
+    # Ranking BM25F: peso de cada campo, saturación (k1) y normalización por longitud (b)
+    SEARCH_FIELD_BOOSTS = os.getenv('SEARCH_FIELD_BOOSTS', 'name:3,category:2,description:1')
+    SEARCH_BM25_K1 = float(os.getenv('SEARCH_BM25_K1', '1.2'))
+    SEARCH_BM25_B = float(os.getenv('SEARCH_BM25_B', '0.75'))
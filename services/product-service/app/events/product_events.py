@@ -1,45 +1,56 @@
-from app.services.mongo_service import save_event_to_mongo
-from shared.kafka_service import KafkaService
+from app.services.mongo_service import save_events_to_mongo
+from shared.kafka_service import ConsumerRuntime
 from shared.kafka_config import KafkaConfig
+from app.config import Config
+from app.search import search_index
 import logging
+import os
+import socket
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def handle_product_created(event):
-    try:
-        # Save event to MongoDB
-        save_event_to_mongo(event)
-        logger.info(f"Product created event saved: {event}")
-        
-        # Here you could add additional processing logic
-        # For example, update search indexes, etc.
-    except Exception as e:
-        logger.error(f"Error handling product created event: {e}")
-
-def handle_product_updated(event):
-    try:
-        # Save event to MongoDB
-        save_event_to_mongo(event)
-        logger.info(f"Product updated event saved: {event}")
-    except Exception as e:
-        logger.error(f"Error handling product updated event: {e}")
-
-def handle_product_deleted(event):
-    try:
-        # Save event to MongoDB
-        save_event_to_mongo(event)
-        logger.info(f"Product deleted event saved: {event}")
-    except Exception as e:
-        logger.error(f"Error handling product deleted event: {e}")
+def handle_products_created(events):
+    logger.info(f"{len(events)} product created events saved")
+    # Here you could add additional processing logic
+    # For example, update search indexes, etc.
+
+def handle_products_updated(events):
+    logger.info(f"{len(events)} product updated events saved")
+
+def handle_products_deleted(events):
+    logger.info(f"{len(events)} product deleted events saved")
+
+STATUS_HANDLERS = {
+    'CREATED': handle_products_created,
+    'UPDATED': handle_products_updated,
+    'DELETED': handle_products_deleted
+}
+
+def handle_product_events_batch(events):
+    """Save the whole batch with a single insert, then route it by snapshot status"""
+    save_events_to_mongo(events)
+    by_status = {}
+    for event in events:
+        by_status.setdefault((event.get('snapshot') or {}).get('status'), []).append(event)
+    for status, batch in by_status.items():
+        handler = STATUS_HANDLERS.get(status)
+        if handler is not None:
+            handler(batch)
 
 def start_event_consumers():
-    # Start background consumers
-    from threading import Thread
-
-    # Consumer for product events
-    Thread(target=lambda: KafkaService.consume_events(
-        KafkaConfig.PRODUCT_EVENTS_TOPIC,
-        'product-service-group',
-        handle_product_created
-    )).start()
\ No newline at end of file
+    """Start one consumer for product events, saved in batches and routed by snapshot status"""
+    runtime = ConsumerRuntime('product-service-group')
+    runtime.register_batch(KafkaConfig.PRODUCT_EVENTS_TOPIC, handle_product_events_batch)
+    runtime.start()
+
+    if Config.SEARCH_INDEX_ENABLED:
+        search_index.start()
+        # Cada réplica mantiene su propio índice, así que necesita todos los eventos
+        search_runtime = ConsumerRuntime(
+            f'product-service-search-{socket.gethostname()}-{os.getpid()}',
+            retry_delays=[], offset_reset='latest', dead_letter=False
+        )
+        search_runtime.register(KafkaConfig.PRODUCT_EVENTS_TOPIC, search_index.apply_event)
+        search_runtime.start()
+    logger.info("Started product event consumer")
@@ -0,0 +1,33 @@
+# Índices de MongoDB del servicio de productos; se aplican al arrancar (ver shared/indexes.py)
+from datetime import datetime
+from shared.indexes import index, query
+from shared.event_store import EVENT_INDEXES, EVENT_QUERIES
+from shared.outbox import OUTBOX_INDEXES, OUTBOX_QUERIES
+
+INDEXES = [
+    # El nombre identifica al producto al crearlo
+    index('products', 'name', unique=True),
+    # Listados paginados: cada orden admitido (ver pagination.SORT_FIELDS), con y sin categoría,
+    # para que un listado completo sin limit no tenga que ordenar el catálogo en memoria
+    index('products', [('category', 1), ('_id', 1)]),
+    index('products', [('name', 1), ('_id', 1)]),
+    index('products', [('price', 1), ('_id', 1)]),
+    index('products', [('created_at', 1), ('_id', 1)]),
+    index('products', [('category', 1), ('name', 1), ('_id', 1)]),
+    index('products', [('category', 1), ('price', 1), ('_id', 1)]),
+    index('products', [('category', 1), ('created_at', 1), ('_id', 1)]),
+    # Búsqueda de respaldo mientras se construye el índice en memoria
+    index('products', [('name', 'text'), ('category', 'text'), ('description', 'text')],
+          name='products_text', weights={'name': 3, 'category': 2, 'description': 1}, default_language='spanish'),
+    # Sincronización incremental del índice de búsqueda
+    index('products', 'updated_at')
+] + EVENT_INDEXES + OUTBOX_INDEXES
+
+QUERIES = [
+    query('product-by-name', 'products', {'name': 'probe'}),
+    query('products-by-category', 'products', {'category': 'probe'}, [('_id', 1)]),
+    query('products-by-price', 'products', {}, [('price', 1), ('_id', 1)]),
+    query('products-by-created-at', 'products', {}, [('created_at', 1), ('_id', 1)]),
+    query('products-by-category-and-price', 'products', {'category': 'probe'}, [('price', 1), ('_id', 1)]),
+    query('products-changed-since', 'products', {'updated_at': {'$gt': datetime(2000, 1, 1)}})
+] + EVENT_QUERIES + OUTBOX_QUERIES
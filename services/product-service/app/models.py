@@ -4,46 +4,65 @@ from app import mongo
 
 class Product:
     @staticmethod
-    def create(product_data):
+    def create(product_data, session=None):
         product_data['created_at'] = datetime.utcnow()
         product_data['updated_at'] = datetime.utcnow()
-        result = mongo.db.products.insert_one(product_data)
+        result = mongo.db.products.insert_one(product_data, session=session)
         return str(result.inserted_id)
 
     @staticmethod
-    def get_by_id(product_id):
-        return mongo.db.products.find_one({'_id': ObjectId(product_id)})
+    def get_by_id(product_id, session=None):
+        return mongo.db.products.find_one({'_id': ObjectId(product_id)}, session=session)
 
     @staticmethod
     def get_by_name(name):
         return mongo.db.products.find_one({'name': name})
 
     @staticmethod
-    def update(product_id, update_data):
+    def update(product_id, update_data, session=None):
         update_data['updated_at'] = datetime.utcnow()
         return mongo.db.products.update_one(
             {'_id': ObjectId(product_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            session=session
         )
 
     @staticmethod
-    def delete(product_id):
-        return mongo.db.products.delete_one({'_id': ObjectId(product_id)})
+    def delete(product_id, session=None):
+        return mongo.db.products.delete_one({'_id': ObjectId(product_id)}, session=session)
 
     @staticmethod
     def get_all():
         return list(mongo.db.products.find())
 
+    @staticmethod
+    def find(query=None, projection=None, sort=None, limit=0):
+        """Cursor perezoso: los documentos se leen del servidor por lotes al iterar"""
+        cursor = mongo.db.products.find(query or {}, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
     @staticmethod
     def get_by_category(category):
         return list(mongo.db.products.find({'category': category}))
 
     @staticmethod
-    def search(query):
-        return list(mongo.db.products.find({
-            '$or': [
-                {'name': {'$regex': query, '$options': 'i'}},
-                {'description': {'$regex': query, '$options': 'i'}},
-                {'category': {'$regex': query, '$options': 'i'}}
-            ]
-        }))
\ No newline at end of file
+    def get_many(product_ids):
+        """Productos por id en una sola consulta, en el orden de product_ids (los que no existen se omiten)"""
+        object_ids = [ObjectId(product_id) for product_id in product_ids if ObjectId.is_valid(product_id)]
+        products = {str(product['_id']): product for product in mongo.db.products.find({'_id': {'$in': object_ids}})}
+        return [products[product_id] for product_id in product_ids if product_id in products]
+
+    @staticmethod
+    def search(query, skip=0, limit=20):
+        """Búsqueda con el índice de texto de Mongo, ordenada por relevancia"""
+        score = {'score': {'$meta': 'textScore'}}
+        return list(
+            mongo.db.products.find({'$text': {'$search': query}}, score)
+            .sort([('score', {'$meta': 'textScore'})])
+            .skip(skip)
+            .limit(limit)
+        )
\ No newline at end of file
@@ -0,0 +1,97 @@
+import base64
+from datetime import datetime
+from bson import Decimal128, ObjectId, json_util
+from flask import current_app
+
+# Campos por los que se puede ordenar; el _id desempata y hace el orden total
+SORT_FIELDS = ('_id', 'name', 'price', 'created_at')
+FIELDS = ('name', 'description', 'price', 'category', 'stock', 'image_url', 'sku', 'created_at', 'updated_at')
+
+def encode_cursor(product, sort_field):
+    """Cursor opaco con la clave de orden del último producto de la página"""
+    key = [product.get(sort_field), product['_id']] if sort_field != '_id' else [product['_id']]
+    return base64.urlsafe_b64encode(json_util.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort_field):
+    try:
+        key = json_util.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != (1 if sort_field == '_id' else 2) or not isinstance(key[-1], ObjectId):
+        raise ValueError("Invalid cursor")
+    return key
+
+# Grupos de tipos BSON en el orden en que Mongo los ordena; None son los nulos y los campos ausentes
+TYPE_ORDER = (None, 'number', 'string', 'object', 'binData', 'objectId', 'bool', 'date')
+
+def _type_bracket(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return TYPE_ORDER.index('bool')
+    if isinstance(value, (int, float, Decimal128)):
+        return TYPE_ORDER.index('number')
+    if isinstance(value, str):
+        return TYPE_ORDER.index('string')
+    if isinstance(value, dict):
+        return TYPE_ORDER.index('object')
+    if isinstance(value, bytes):
+        return TYPE_ORDER.index('binData')
+    if isinstance(value, ObjectId):
+        return TYPE_ORDER.index('objectId')
+    if isinstance(value, datetime):
+        return TYPE_ORDER.index('date')
+    raise ValueError("Invalid cursor")
+
+def _of_type(sort_field, bson_type):
+    return {sort_field: None} if bson_type is None else {sort_field: {'$type': bson_type}}
+
+def keyset_filter(key, sort_field, descending=False):
+    """Filtro que selecciona los productos posteriores a la clave del cursor.
+
+    $gt/$lt solo comparan valores del mismo tipo, así que los productos con
+    el campo nulo, ausente o de otro tipo (precios guardados como texto) se
+    seleccionan aparte por su grupo de tipo, en el orden en que Mongo ordena.
+    """
+    op = '$lt' if descending else '$gt'
+    if sort_field == '_id':
+        return {'_id': {op: key[0]}}
+    value, last_id = key
+    bracket = _type_bracket(value)
+    later = TYPE_ORDER[:bracket] if descending else TYPE_ORDER[bracket + 1:]
+    branches = [{sort_field: value, '_id': {op: last_id}}]
+    if value is not None:
+        branches.append({sort_field: {op: value}})
+    branches += [_of_type(sort_field, bson_type) for bson_type in later]
+    return {'$or': branches}
+
+def parse_fields(fields):
+    """'name,price' -> proyección de Mongo; None devuelve el documento completo"""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in requested}
+
+def _encode(product):
+    product['_id'] = str(product['_id'])
+    # Mismo formato que jsonify (fechas incluidas)
+    return current_app.json.dumps(product)
+
+def stream_json_array(products):
+    """Codifica los productos a medida que salen del cursor, como un único array JSON"""
+    yield '['
+    first = True
+    for product in products:
+        if not first:
+            yield ','
+        first = False
+        yield _encode(product)
+    yield ']'
+
+def stream_ndjson(products):
+    """Un producto por línea (application/x-ndjson)"""
+    for product in products:
+        yield _encode(product) + '\n'
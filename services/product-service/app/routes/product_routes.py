@@ -1,5 +1,6 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from app.services.product_service import ProductService
+from app.pagination import stream_json_array, stream_ndjson
 from bson import ObjectId
 import logging
 from datetime import datetime
@@ -49,13 +50,32 @@ def get_product(product_id):
         logger.error(f"Unexpected error getting product: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+def _list_products(category=None):
+    """Listado con ?limit=&cursor=&sort=&order=&fields= y formato JSON o NDJSON (?format=ndjson)"""
+    products, next_cursor = ProductService.list_products(
+        category=category,
+        limit=request.args.get('limit', type=int),
+        cursor=request.args.get('cursor'),
+        sort=request.args.get('sort', '_id'),
+        order=request.args.get('order', 'asc'),
+        fields=request.args.get('fields')
+    )
+    ndjson = request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+    body = stream_ndjson(products) if ndjson else stream_json_array(products)
+    response = Response(
+        stream_with_context(body), mimetype='application/x-ndjson' if ndjson else 'application/json'
+    )
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
 @product_bp.route('/', methods=['GET'])
 def get_all_products():
     try:
-        products = ProductService.get_all_products()
-        for product in products:
-            product['_id'] = str(product['_id'])  # Convert ObjectId to string
-        return jsonify(products), 200
+        return _list_products(), 200
+    except ValueError as e:
+        logger.error(f"Invalid product listing request: {str(e)}")
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting all products: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
@@ -95,10 +115,10 @@ def delete_product(product_id):
 @product_bp.route('/category/<category>', methods=['GET'])
 def get_products_by_category(category):
     try:
-        products = ProductService.get_products_by_category(category)
-        for product in products:
-            product['_id'] = str(product['_id'])  # Convert ObjectId to string
-        return jsonify(products), 200
+        return _list_products(category), 200
+    except ValueError as e:
+        logger.error(f"Invalid product listing request: {str(e)}")
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting products by category: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
@@ -110,10 +130,20 @@ def search_products():
         if not query:
             return jsonify({"error": "Query parameter 'q' is required"}), 400
             
-        products = ProductService.search_products(query)
+        products, total = ProductService.search_products(
+            query,
+            limit=request.args.get('limit', 20, type=int),
+            offset=request.args.get('offset', 0, type=int)
+        )
         for product in products:
             product['_id'] = str(product['_id'])  # Convert ObjectId to string
-        return jsonify(products), 200
+        response = jsonify(products)
+        if total is not None:
+            response.headers['X-Total-Count'] = str(total)
+        return response, 200
+    except ValueError as e:
+        logger.error(f"Invalid search request: {str(e)}")
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error searching products: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
\ No newline at end of file
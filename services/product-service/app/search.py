@@ -0,0 +1,288 @@
+import bisect
+import logging
+import re
+import threading
+import unicodedata
+from datetime import timedelta
+import numpy as np
+from bson import ObjectId
+from app.config import Config
+from shared.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LATENCY = registry.histogram(
+    'product_search_seconds', 'Product search latency by backend (index, text)', ('backend',))
+INDEXED_PRODUCTS = registry.gauge(
+    'product_search_indexed_products', 'Products in the in-process search index')
+
+FIELDS = ('name', 'category', 'description')
+# Un término que solo coincide por prefijo puntúa menos que uno exacto
+PREFIX_WEIGHT = 0.5
+# Las actualizaciones de otras réplicas pueden verse con algo de retraso
+SYNC_OVERLAP = timedelta(seconds=5)
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+# (sufijo, reemplazo, longitud mínima de lo que queda): rápidamente, canciones, batteries, luces, running, used
+SUFFIXES = (('mente', '', 3), ('ciones', 'cion', 3), ('ies', 'y', 3), ('ces', 'z', 2), ('ing', '', 3), ('ed', '', 3))
+
+def _fold(text):
+    """Minúsculas y sin tildes: 'Camión' -> 'camion'"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def stem(token):
+    """Stemming ligero para español e inglés (plurales y sufijos frecuentes).
+
+    No busca la raíz lingüística: basta con que se aplique igual a los
+    productos y a las consultas.
+    """
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement, min_stem in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= min_stem:
+            return token[:-len(suffix)] + replacement
+    if token.endswith('es') and len(token) > 4 and token[-3] not in 'aeiou':
+        return token[:-2]
+    if token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    return _TOKEN.findall(_fold(text or ''))
+
+def parse_boosts(value):
+    """'name:3,category:2,description:1' -> array de pesos en el orden de FIELDS"""
+    boosts = dict(item.split(':') for item in value.split(',') if item.strip())
+    unknown = set(boosts) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown search fields: {', '.join(sorted(unknown))}")
+    return np.array([float(boosts.get(field, 0)) for field in FIELDS], dtype=np.float32)
+
+class ProductSearchIndex:
+    """Índice invertido en memoria sobre nombre, categoría y descripción, con ranking BM25F.
+
+    Cada término (ya normalizado y con stemming) apunta a los productos que
+    lo contienen con su frecuencia en cada campo. Los productos ocupan filas
+    de un array con la longitud de cada campo, y las listas de cada término
+    se compactan en arrays de NumPy (filas, frecuencias por campo) la
+    primera vez que se consultan tras un cambio, así que puntuar decenas de
+    miles de candidatos son unas pocas operaciones vectoriales.
+
+    La puntuación es BM25F: la frecuencia de cada campo se normaliza por su
+    longitud (b), se pondera con SEARCH_FIELD_BOOSTS y se satura con k1. El
+    último término de la consulta también se expande por prefijo ('zapat'
+    encuentra 'zapatilla'), hasta SEARCH_PREFIX_EXPANSIONS términos para que
+    la latencia no dependa del tamaño del vocabulario.
+
+    Se construye leyendo la colección al arrancar y se mantiene con
+    product-events y con una sincronización periódica por updated_at. Los
+    resultados se hidratan desde Mongo, así que un producto borrado que el
+    índice aún no ha visto no llega a devolverse.
+    """
+
+    def __init__(self, sync_interval=None, prefix_expansions=None, boosts=None, k1=None, b=None):
+        self.sync_interval = sync_interval or Config.SEARCH_SYNC_INTERVAL
+        self.prefix_expansions = prefix_expansions or Config.SEARCH_PREFIX_EXPANSIONS
+        self.boosts = parse_boosts(boosts or Config.SEARCH_FIELD_BOOSTS)
+        self.k1 = Config.SEARCH_BM25_K1 if k1 is None else k1
+        self.b = Config.SEARCH_BM25_B if b is None else b
+        self._rows = {}
+        self._ids = []
+        self._free = []
+        self._lengths = np.zeros((1024, len(FIELDS)), dtype=np.float32)
+        self._length_sums = np.zeros(len(FIELDS), dtype=np.float64)
+        self._postings = {}
+        self._arrays = {}
+        self._doc_terms = {}
+        self._vocabulary = []
+        self._synced_until = None
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def start(self):
+        """Construye el índice en segundo plano y lo mantiene sincronizado"""
+        threading.Thread(target=self._run, name='product-search-index', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def add(self, product):
+        """Indexa (o reindexa) un producto"""
+        product_id = str(product['_id'])
+        frequencies, lengths = {}, []
+        for position, field in enumerate(FIELDS):
+            tokens = tokenize(product.get(field))
+            lengths.append(len(tokens))
+            for token in tokens:
+                counts = frequencies.setdefault(stem(token), [0] * len(FIELDS))
+                counts[position] += 1
+        with self._lock:
+            self._remove(product_id)
+            row = self._allocate(product_id)
+            self._lengths[row] = lengths
+            self._length_sums += lengths
+            for term, counts in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._vocabulary, term)
+                postings[row] = counts
+                self._arrays.pop(term, None)
+            self._doc_terms[row] = list(frequencies)
+        INDEXED_PRODUCTS.set(len(self._rows))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(str(product_id))
+        INDEXED_PRODUCTS.set(len(self._rows))
+
+    def search(self, query, offset=0, limit=20):
+        """Devuelve (ids de la página ordenados por relevancia, total de coincidencias)"""
+        tokens = tokenize(query)
+        if not tokens:
+            return [], 0
+        with self._lock:
+            scores = self.score(self._query_terms(tokens, prefix=not query.endswith(' ')))
+            if scores is None:
+                return [], 0
+            candidates = np.flatnonzero(scores)
+            wanted = offset + limit
+            if len(candidates) > wanted:
+                # Selección parcial: solo se ordenan los primeros offset + limit
+                candidates = candidates[np.argpartition(-scores[candidates], wanted - 1)[:wanted]]
+            ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+            return [self._ids[row] for row in ranked[offset:wanted]], int(np.count_nonzero(scores))
+
+    def score(self, terms):
+        """Puntuación BM25F de todos los productos (array por fila) para [(término, peso)], o None"""
+        count = len(self._rows)
+        if not count:
+            return None
+        average = np.maximum(self._length_sums / count, 1.0).astype(np.float32)
+        rows, contributions = [], []
+        for term, boost in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            term_rows, frequencies = self._term_arrays(term)
+            idf = np.log(1.0 + (count - len(term_rows) + 0.5) / (len(term_rows) + 0.5))
+            norms = 1.0 - self.b + self.b * self._lengths[term_rows] / average
+            weighted = (frequencies / norms) @ self.boosts
+            rows.append(term_rows)
+            contributions.append(boost * idf * weighted * (self.k1 + 1.0) / (weighted + self.k1))
+        if not rows:
+            return None
+        return np.bincount(np.concatenate(rows), weights=np.concatenate(contributions), minlength=len(self._ids))
+
+    def _term_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            arrays = (
+                np.fromiter(postings.keys(), dtype=np.int32, count=len(postings)),
+                np.array(list(postings.values()), dtype=np.float32).reshape(len(postings), len(FIELDS))
+            )
+            self._arrays[term] = arrays
+        return arrays
+
+    def _query_terms(self, tokens, prefix):
+        terms = {stem(token): 1.0 for token in tokens}
+        last = tokens[-1]
+        if prefix and len(last) >= 2:
+            start = bisect.bisect_left(self._vocabulary, last)
+            for term in self._vocabulary[start:start + self.prefix_expansions]:
+                if not term.startswith(last):
+                    break
+                terms.setdefault(term, PREFIX_WEIGHT)
+        return list(terms.items())
+
+    def _allocate(self, product_id):
+        if self._free:
+            row = self._free.pop()
+            self._ids[row] = product_id
+        else:
+            row = len(self._ids)
+            self._ids.append(product_id)
+            if row >= len(self._lengths):
+                grown = np.zeros((len(self._lengths) * 2, len(FIELDS)), dtype=np.float32)
+                grown[:len(self._lengths)] = self._lengths
+                self._lengths = grown
+        self._rows[product_id] = row
+        return row
+
+    def _remove(self, product_id):
+        row = self._rows.pop(product_id, None)
+        if row is None:
+            return
+        for term in self._doc_terms.pop(row, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(row, None)
+            self._arrays.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                index = bisect.bisect_left(self._vocabulary, term)
+                if index < len(self._vocabulary) and self._vocabulary[index] == term:
+                    del self._vocabulary[index]
+        self._length_sums -= self._lengths[row]
+        self._lengths[row] = 0
+        self._ids[row] = None
+        self._free.append(row)
+
+    def apply_event(self, event):
+        """Aplica un evento de product-events"""
+        from app.models import Product
+
+        snapshot = event.get('snapshot') or {}
+        product_id = snapshot.get('productId')
+        if not product_id:
+            return
+        if snapshot.get('status') == 'DELETED':
+            self.remove(product_id)
+            return
+        # Los eventos de actualización solo traen los campos cambiados
+        product = Product.get_by_id(product_id) if ObjectId.is_valid(product_id) else None
+        if product is None:
+            self.remove(product_id)
+        else:
+            self.add(product)
+
+    def sync(self):
+        """Indexa los productos creados o modificados desde la última sincronización (todos la primera vez)"""
+        from app.models import Product
+
+        query = {}
+        if self._synced_until is not None:
+            query = {'updated_at': {'$gt': self._synced_until - SYNC_OVERLAP}}
+        latest = self._synced_until
+        count = 0
+        for product in Product.find(query, {'name': 1, 'category': 1, 'description': 1, 'updated_at': 1}):
+            self.add(product)
+            count += 1
+            if product.get('updated_at') and (latest is None or product['updated_at'] > latest):
+                latest = product['updated_at']
+        self._synced_until = latest
+        if not self._ready.is_set():
+            self._ready.set()
+            logger.info(f"Índice de búsqueda construido con {count} productos")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Error sincronizando el índice de búsqueda: {str(e)}", exc_info=True)
+            self._stopped.wait(self.sync_interval)
+
+search_index = ProductSearchIndex()
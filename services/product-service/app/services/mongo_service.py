@@ -1,35 +1,29 @@
-from app import mongo
-from datetime import datetime
-from bson import json_util
-import json
+from shared.event_store import EventStoreWriter
 import logging
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
-def save_event_to_mongo(event):
+def save_event_to_mongo(event, sync=False, upsert=False):
     """
-    Guarda un evento en MongoDB con manejo robusto de tipos de datos y errores
+    Encola un evento para la colección de eventos; con sync=True espera a que quede guardado.
+    Un eventId ya guardado se ignora, salvo con upsert=True, que actualiza sus campos
     """
     try:
-        # Convertir el evento a un formato compatible con MongoDB
-        event_to_store = event.copy()
-        
-        # Asegurar que las fechas estén en formato ISO string
-        if 'timestamp' in event_to_store and isinstance(event_to_store['timestamp'], datetime):
-            event_to_store['timestamp'] = event_to_store['timestamp'].isoformat()
-        
-        # Añadir marca de tiempo de almacenamiento
-        event_to_store['stored_at'] = datetime.utcnow()
-        
-        # Convertir cualquier tipo especial (como ObjectId) a formato serializable
-        event_to_store = json.loads(json_util.dumps(event_to_store))
-        
-        # Insertar en la colección de eventos
-        result = mongo.db.events.insert_one(event_to_store)
-        logger.info(f"Event saved to MongoDB with ID: {result.inserted_id}")
-        return result.inserted_id
+        # El escritor agrupa los eventos y los inserta con insert_many
+        return EventStoreWriter.instance().write([event], sync=sync, upsert=upsert)[0]
         
     except Exception as e:
         logger.error(f"Failed to save event to MongoDB. Error: {str(e)}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+def save_events_to_mongo(events, sync=False, upsert=False):
+    """
+    Encola un lote de eventos; con sync=True espera a que queden guardados
+    """
+    try:
+        return EventStoreWriter.instance().write(events, sync=sync, upsert=upsert)
+        
+    except Exception as e:
+        logger.error(f"Failed to save events to MongoDB. Error: {str(e)}", exc_info=True)
+        raise
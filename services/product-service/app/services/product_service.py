@@ -3,7 +3,11 @@ from app.schemas import ProductSchema, ProductUpdateSchema
 from app.services.kafka_service import KafkaService
 from app.services.mongo_service import save_event_to_mongo
 from app.config import Config
+from shared.outbox import Outbox
+from app.search import search_index, SEARCH_LATENCY
+from app.pagination import SORT_FIELDS, decode_cursor, encode_cursor, keyset_filter, parse_fields
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 import logging
 import uuid
@@ -23,21 +27,28 @@ class ProductService:
         if Product.get_by_name(product_data['name']):
             raise ValueError("Product with this name already exists")
 
-        # Crear producto
-        product_id = Product.create(product_data)
-        product = Product.get_by_id(product_id)
-
-        # Publicar evento
-        KafkaService.produce_event(
-            topic=Config.PRODUCT_TOPIC,
-            source="ProductService",
-            payload=product_data,
-            snapshot={
-                "productId": str(product['_id']),
-                "status": "CREATED",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+        # El producto y su evento en el outbox se confirman juntos (donde Mongo admite transacciones)
+        try:
+            with Outbox.transaction() as session:
+                product_id = Product.create(product_data, session=session)
+                product = Product.get_by_id(product_id, session=session)
+
+                # Publicar evento
+                KafkaService.produce_event(
+                    topic=Config.PRODUCT_TOPIC,
+                    source="ProductService",
+                    payload=product_data,
+                    key=str(product['_id']),
+                    snapshot={
+                        "productId": str(product['_id']),
+                        "status": "CREATED",
+                        "timestamp": datetime.utcnow().isoformat()
+                    },
+                    session=session
+                )
+        except DuplicateKeyError:
+            # Otra petición lo creó entre la comprobación y el insert
+            raise ValueError("Product with this name already exists")
 
         return product
 
@@ -54,6 +65,38 @@ class ProductService:
             raise ValueError("Product not found")
         return product
 
+    @staticmethod
+    def list_products(category=None, limit=None, cursor=None, sort='_id', order='asc', fields=None):
+        """Devuelve (productos, cursor de la página siguiente).
+
+        Sin limit los productos son un cursor de Mongo que se recorre mientras
+        se escribe la respuesta; con limit se lee una página (limit + 1 para
+        saber si hay más) y el cursor siguiente apunta a su último producto.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be asc or desc")
+        if limit is not None and not 1 <= limit <= Config.PRODUCTS_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {Config.PRODUCTS_MAX_PAGE_SIZE}")
+
+        descending = order == 'desc'
+        direction = -1 if descending else 1
+        query = {'category': category} if category is not None else {}
+        if cursor:
+            query.update(keyset_filter(decode_cursor(cursor, sort), sort, descending))
+        projection = parse_fields(fields)
+        if projection and sort != '_id':
+            # El cursor necesita la clave de orden
+            projection[sort] = 1
+        sort_spec = [(sort, direction)] + ([('_id', direction)] if sort != '_id' else [])
+
+        if limit is None:
+            return Product.find(query, projection, sort_spec), None
+        products = list(Product.find(query, projection, sort_spec, limit=limit + 1))
+        next_cursor = encode_cursor(products[limit - 1], sort) if len(products) > limit else None
+        return products[:limit], next_cursor
+
     @staticmethod
     def get_all_products():
         products = Product.get_all()
@@ -73,23 +116,30 @@ class ProductService:
         if errors:
             raise ValueError(errors)
 
-        result = Product.update(product_obj_id, update_data)
-        if result.modified_count == 0:
-            raise ValueError("Product not found or no changes made")
-
-        product = Product.get_by_id(product_obj_id)
-        
-        # Publicar evento de actualización
-        KafkaService.produce_event(
-            topic=Config.PRODUCT_TOPIC,
-            source="ProductService",
-            payload=update_data,
-            snapshot={
-                "productId": str(product['_id']),
-                "status": "UPDATED",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+        # La actualización y su evento en el outbox se confirman juntos
+        try:
+            with Outbox.transaction() as session:
+                result = Product.update(product_obj_id, update_data, session=session)
+                if result.modified_count == 0:
+                    raise ValueError("Product not found or no changes made")
+
+                product = Product.get_by_id(product_obj_id, session=session)
+
+                # Publicar evento de actualización
+                KafkaService.produce_event(
+                    topic=Config.PRODUCT_TOPIC,
+                    source="ProductService",
+                    payload=update_data,
+                    key=str(product['_id']),
+                    snapshot={
+                        "productId": str(product['_id']),
+                        "status": "UPDATED",
+                        "timestamp": datetime.utcnow().isoformat()
+                    },
+                    session=session
+                )
+        except DuplicateKeyError:
+            raise ValueError("Product with this name already exists")
         return product
 
     @staticmethod
@@ -101,25 +151,29 @@ class ProductService:
         except Exception:
             raise ValueError("Invalid product ID format")
             
-        product = Product.get_by_id(product_obj_id)
-        if not product:
-            raise ValueError("Product not found")
-
-        result = Product.delete(product_obj_id)
-        if result.deleted_count == 0:
-            raise ValueError("Product not found")
-
-        # Publicar evento de eliminación
-        KafkaService.produce_event(
-            topic=Config.PRODUCT_TOPIC,
-            source="ProductService",
-            payload={"productId": str(product['_id'])},
-            snapshot={
-                "productId": str(product['_id']),
-                "status": "DELETED",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+        # El borrado y su evento en el outbox se confirman juntos
+        with Outbox.transaction() as session:
+            product = Product.get_by_id(product_obj_id, session=session)
+            if not product:
+                raise ValueError("Product not found")
+
+            result = Product.delete(product_obj_id, session=session)
+            if result.deleted_count == 0:
+                raise ValueError("Product not found")
+
+            # Publicar evento de eliminación
+            KafkaService.produce_event(
+                topic=Config.PRODUCT_TOPIC,
+                source="ProductService",
+                payload={"productId": str(product['_id'])},
+                key=str(product['_id']),
+                snapshot={
+                    "productId": str(product['_id']),
+                    "status": "DELETED",
+                    "timestamp": datetime.utcnow().isoformat()
+                },
+                session=session
+            )
 
         return {"message": "Product deleted successfully"}
 
@@ -129,6 +183,21 @@ class ProductService:
         return products
 
     @staticmethod
-    def search_products(query):
-        products = Product.search(query)
-        return products
\ No newline at end of file
+    def search_products(query, limit=20, offset=0):
+        """Devuelve (productos de la página, total de coincidencias o None si no se conoce)"""
+        if not 1 <= limit <= Config.SEARCH_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {Config.SEARCH_MAX_PAGE_SIZE}")
+        if offset < 0:
+            raise ValueError("offset must be positive")
+
+        if Config.SEARCH_INDEX_ENABLED and search_index.ready:
+            with SEARCH_LATENCY.time(backend='index'):
+                product_ids, total = search_index.search(query, offset, limit)
+                return Product.get_many(product_ids), total
+
+        # Mientras se construye el índice en memoria
+        with SEARCH_LATENCY.time(backend='text'):
+            products = Product.search(query, skip=offset, limit=limit)
+        for product in products:
+            product.pop('score', None)
+        return products, None
\ No newline at end of file
@@ -0,0 +1,64 @@
+# shared/backends.py
+"""Pick the Kafka and Mongo implementations a service runs against.
+
+KAFKA_BACKEND=memory swaps confluent_kafka for the in-process broker in
+shared.memory_kafka; MONGO_BACKEND=memory swaps the MongoDB client behind
+flask_pymongo for mongomock. Both default to the real servers.
+"""
+import logging
+from confluent_kafka import Producer, Consumer
+from confluent_kafka.admin import AdminClient
+from shared.kafka_config import KafkaConfig
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+logger = logging.getLogger(__name__)
+
+MEMORY = 'memory'
+
+_memory_mongo_client = None
+
+def memory_kafka():
+    return KafkaConfig.BACKEND == MEMORY
+
+def create_producer(config):
+    if memory_kafka():
+        from shared.memory_kafka import MemoryProducer
+        return MemoryProducer(config)
+    return Producer(config)
+
+def create_consumer(config):
+    if memory_kafka():
+        from shared.memory_kafka import MemoryConsumer
+        return MemoryConsumer(config)
+    return Consumer(config)
+
+def create_admin_client(config):
+    if memory_kafka():
+        from shared.memory_kafka import MemoryAdminClient
+        return MemoryAdminClient(config)
+    return AdminClient(config)
+
+def init_mongo(mongo, app):
+    """Initialize the app's PyMongo against MongoDB or, with MONGO_BACKEND=memory, mongomock"""
+    if app.config.get('MONGO_BACKEND', 'mongo') != MEMORY:
+        mongo.init_app(app)
+        return
+
+    global _memory_mongo_client
+    if mongomock is None:
+        raise RuntimeError("MONGO_BACKEND=memory requires the mongomock package")
+    from flask_pymongo import BSONObjectIdConverter
+    from pymongo import uri_parser
+
+    # One client per process so every app and background thread sees the same data
+    if _memory_mongo_client is None:
+        _memory_mongo_client = mongomock.MongoClient()
+    database = uri_parser.parse_uri(app.config['MONGO_URI'])['database'] or 'ecommerce'
+    mongo.cx = _memory_mongo_client
+    mongo.db = mongo.cx[database]
+    app.url_map.converters['ObjectId'] = BSONObjectIdConverter
+    logger.info(f"Using in-memory MongoDB database {database}")
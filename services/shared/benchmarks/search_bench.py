@@ -0,0 +1,108 @@
+# shared/benchmarks/search_bench.py
+"""Benchmark product-service's BM25 search index over a synthetic catalog.
+
+Builds a ProductSearchIndex from generated products (names, categories and
+descriptions drawn from a fixed vocabulary with a skewed word frequency, so
+common words match large parts of the catalog), then runs a mix of one-word,
+multi-word and prefix queries. Reports build time, query latency
+percentiles and scoring throughput: postings (term, product) scored per second.
+
+The index is exercised directly; importing product-service's app package
+still starts it, against the in-memory Kafka and Mongo backends. Run from
+the services directory:
+
+    python -m shared.benchmarks.search_bench [--products N] [--queries N]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOUNS = ['zapatilla', 'camiseta', 'pantalon', 'chaqueta', 'mochila', 'reloj', 'lampara', 'silla', 'mesa',
+         'auricular', 'teclado', 'raton', 'monitor', 'cargador', 'cable', 'botella', 'taza', 'sarten',
+         'almohada', 'toalla', 'balon', 'raqueta', 'bicicleta', 'casco', 'guante', 'gorra', 'bufanda']
+ADJECTIVES = ['rojo', 'azul', 'negro', 'blanco', 'verde', 'ligero', 'resistente', 'comodo', 'premium',
+              'deportivo', 'clasico', 'moderno', 'inalambrico', 'recargable', 'impermeable', 'compacto']
+FILLER = ['ideal', 'para', 'uso', 'diario', 'con', 'acabado', 'de', 'alta', 'calidad', 'garantia', 'envio',
+          'rapido', 'material', 'algodon', 'acero', 'aluminio', 'bateria', 'larga', 'duracion', 'diseno']
+CATEGORIES = ['ropa', 'calzado', 'hogar', 'cocina', 'electronica', 'deportes', 'accesorios', 'oficina']
+
+def _word(rng, words):
+    # Zipf-like: the first words of each list are far more common than the last
+    return words[min(int(rng.paretovariate(1.2)) - 1, len(words) - 1)]
+
+def synthetic_catalog(n, seed=42):
+    rng = random.Random(seed)
+    for i in range(n):
+        noun = _word(rng, NOUNS)
+        yield {
+            '_id': f'product-{i}',
+            'name': f"{noun.capitalize()} {_word(rng, ADJECTIVES)} {i % 500}",
+            'category': rng.choice(CATEGORIES),
+            'description': ' '.join(
+                _word(rng, FILLER + ADJECTIVES + NOUNS) for _ in range(rng.randint(8, 40))
+            )
+        }
+
+def synthetic_queries(n, seed=7):
+    rng = random.Random(seed)
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.4:
+            yield _word(rng, NOUNS)
+        elif kind < 0.8:
+            yield f"{_word(rng, NOUNS)} {_word(rng, ADJECTIVES)} {rng.choice(CATEGORIES)}"
+        else:
+            # Typing in progress: the last word is a prefix
+            noun = _word(rng, NOUNS)
+            yield f"{_word(rng, ADJECTIVES)} {noun[:rng.randint(2, len(noun) - 1)]}"
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run(products, queries, limit):
+    os.environ.setdefault('KAFKA_BACKEND', 'memory')
+    os.environ.setdefault('MONGO_BACKEND', 'memory')
+    sys.path.insert(0, os.path.join(SERVICES_DIR, 'product-service'))
+    import numpy as np
+    from app.search import ProductSearchIndex, tokenize
+
+    index = ProductSearchIndex()
+    started = time.perf_counter()
+    for product in synthetic_catalog(products):
+        index.add(product)
+    build = time.perf_counter() - started
+
+    latencies, candidates, matches = [], 0, 0
+    for query in synthetic_queries(queries):
+        t0 = time.perf_counter()
+        _, total = index.search(query, limit=limit)
+        latencies.append(time.perf_counter() - t0)
+        matches += total
+        # Postings scored for this query (a product matching several terms counts once per term)
+        terms = index._query_terms(tokenize(query), prefix=True)
+        candidates += sum(len(index._postings.get(term, ())) for term, _ in terms)
+    elapsed = sum(latencies)
+
+    print(f"catalog: {products} products, {len(index._vocabulary)} terms, built in {build:.2f}s "
+          f"({products / build:,.0f} products/s) with numpy {np.__version__}")
+    print(f"queries: {queries}, {matches / queries:,.0f} matches and {candidates / queries:,.0f} postings scored per query")
+    print(f"latency: p50 {statistics.median(latencies) * 1000:.3f} ms  p95 {_percentile(latencies, 95) * 1000:.3f} ms  "
+          f"p99 {_percentile(latencies, 99) * 1000:.3f} ms")
+    print(f"throughput: {queries / elapsed:,.0f} queries/s, {candidates / elapsed:,.0f} postings scored/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the product search index on a synthetic catalog')
+    parser.add_argument('--products', type=int, default=50000, help='products in the synthetic catalog')
+    parser.add_argument('--queries', type=int, default=2000, help='queries to run')
+    parser.add_argument('--limit', type=int, default=20, help='results per query')
+    args = parser.parse_args()
+    run(args.products, args.queries, args.limit)
+
+if __name__ == '__main__':
+    main()
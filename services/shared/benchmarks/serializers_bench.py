@@ -0,0 +1,114 @@
+# shared/benchmarks/serializers_bench.py
+"""Compare event codecs on the event shapes our services actually produce.
+
+Run from the services directory:
+
+    python -m shared.benchmarks.serializers_bench [iterations]
+"""
+import json
+import sys
+import timeit
+from datetime import datetime
+from uuid import uuid4
+from bson import ObjectId, json_util
+from shared.serializers import CODECS
+
+def sample_events():
+    now = datetime.utcnow()
+    user_id = str(uuid4())
+    product_id = ObjectId()
+    return {
+        "user-registration": {
+            "eventId": str(uuid4()),
+            "timestamp": now,
+            "source": "UserService",
+            "topic": "user-registration",
+            "key": user_id,
+            "payload": {
+                "_id": ObjectId(),
+                "name": "Juan",
+                "last_name": "Pérez",
+                "email": "juan@example.com",
+                "phone": "+123456789",
+                "user_id": user_id,
+                "created_at": now,
+                "updated_at": now
+            },
+            "snapshot": {"userId": user_id, "status": "REGISTERED", "timestamp": now.isoformat()}
+        },
+        "cart-updates": {
+            "eventId": str(uuid4()),
+            "timestamp": now,
+            "source": "CartService",
+            "topic": "cart-updates",
+            "key": user_id,
+            "payload": {"userId": user_id, "productId": str(product_id), "quantity": 2},
+            "snapshot": {
+                "cartId": str(ObjectId()),
+                "userId": user_id,
+                "totalItems": 3,
+                "updatedAt": now.isoformat()
+            }
+        },
+        "product-events": {
+            "eventId": str(uuid4()),
+            "timestamp": now,
+            "source": "ProductService",
+            "topic": "product-events",
+            "key": str(product_id),
+            "payload": {
+                "_id": product_id,
+                "name": "Zapatillas running",
+                "description": "Zapatillas ligeras para correr largas distancias",
+                "price": 59.99,
+                "category": "deportes",
+                "stock": 120,
+                "sku": "RUN-0001",
+                "created_at": now,
+                "updated_at": now
+            },
+            "snapshot": {"productId": str(product_id), "status": "CREATED", "timestamp": now.isoformat()}
+        }
+    }
+
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, (datetime, ObjectId)):
+            return str(obj)
+        return super().default(obj)
+
+def legacy_codec():
+    """The encoding used before shared.serializers: json + DateTimeEncoder"""
+    class Legacy:
+        name = 'legacy-json'
+
+        @staticmethod
+        def encode(event):
+            return json.dumps(event, cls=DateTimeEncoder).encode('utf-8')
+
+        @staticmethod
+        def decode(data):
+            return json.loads(data.decode('utf-8'))
+    return Legacy
+
+def bench(codec, event, iterations):
+    encoded = codec.encode(event)
+    encode_s = timeit.timeit(lambda: codec.encode(event), number=iterations)
+    decode_s = timeit.timeit(lambda: codec.decode(encoded), number=iterations)
+    return len(encoded), encode_s / iterations * 1e6, decode_s / iterations * 1e6
+
+def main(iterations=20000):
+    codecs = [legacy_codec()] + list(CODECS.values())
+    print(f"{'event':<20}{'codec':<14}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for shape, event in sample_events().items():
+        for codec in codecs:
+            size, encode_us, decode_us = bench(codec, event, iterations)
+            print(f"{shape:<20}{codec.name:<14}{size:>8}{encode_us:>12.2f}{decode_us:>12.2f}")
+
+    # The old event store path re-encoded every event through json_util
+    event = sample_events()["product-events"]
+    store_s = timeit.timeit(lambda: json.loads(json_util.dumps(event)), number=iterations)
+    print(f"\nevent store json_util round trip: {store_s / iterations * 1e6:.2f} us/event")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
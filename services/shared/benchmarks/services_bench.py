@@ -0,0 +1,193 @@
+# shared/benchmarks/services_bench.py
+"""Load-test every service against the in-memory Kafka and Mongo backends.
+
+Each service runs in its own subprocess (they all ship an `app` package)
+with KAFKA_BACKEND=memory and MONGO_BACKEND=memory, is driven through the
+Flask test client, and reports request latency percentiles, request
+throughput and how long the outbox relay and consumers take to drain the
+events the requests produced.
+
+Run from the services directory:
+
+    python -m shared.benchmarks.services_bench [--requests N] [service ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from werkzeug.test import Client
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SERVICES = ['user-service', 'product-service', 'cart-service', 'notification-service']
+
+def _user_requests(client, n):
+    for i in range(n):
+        yield 'register', lambda i=i: client.post('/api/users/register', json={
+            'name': 'Usuario', 'last_name': 'Prueba', 'email': f'user{i}@example.com', 'password': 'secret123',
+            'phone': f'+57300{i:07d}'
+        })
+    yield 'list', lambda: client.get('/api/users/')
+
+def _product_requests(client, n):
+    for i in range(n):
+        yield 'create', lambda i=i: client.post('/api/products/', json={
+            'name': f'Producto {i}', 'description': 'Producto de prueba para carga',
+            'price': 10 + i % 90, 'category': f'category-{i % 10}', 'stock': 100
+        })
+    for i in range(n):
+        yield 'by-category', lambda i=i: client.get(f'/api/products/category/category-{i % 10}')
+
+def _cart_requests(client, n):
+    # Adds are validated against the product projection, which is fed by product-events
+    from shared.kafka_config import KafkaConfig
+    from shared.kafka_service import KafkaService
+    from app import mongo
+    from app.projection import product_projection
+
+    # Adds also reserve stock in the shared products collection
+    mongo.db.products.insert_many([{'_id': f'product-{i}', 'stock': 1000000} for i in range(200)])
+    for i in range(200):
+        KafkaService.produce_event(
+            topic=KafkaConfig.PRODUCT_EVENTS_TOPIC,
+            source='ProductService',
+            payload={'name': f'Producto {i}', 'price': 10 + i % 90, 'stock': 1000},
+            snapshot={'productId': f'product-{i}', 'status': 'CREATED', 'timestamp': '2024-01-01T00:00:00'},
+            key=f'product-{i}'
+        )
+    if not _wait_until(lambda: product_projection.get('product-199'), 30):
+        raise RuntimeError("product projection was not populated")
+
+    for i in range(n):
+        yield 'add-item', lambda i=i: client.post('/api/cart/items', json={
+            'userId': f'user-{i % 50}', 'productId': f'product-{i % 200}', 'quantity': 1 + i % 3
+        })
+    for i in range(n):
+        yield 'get-cart', lambda i=i: client.get(f'/api/cart/?userId=user-{i % 50}')
+
+def _notification_requests(client, n):
+    # Notifications have no write API; feed their topics the way the other services do
+    from shared.kafka_config import KafkaConfig
+    from shared.kafka_service import KafkaService
+
+    def publish(i):
+        KafkaService.produce_event(
+            topic=KafkaConfig.WELCOME_TOPIC,
+            source='UserService',
+            payload={'to': f'user{i}@example.com', 'subject': 'Bienvenido', 'content': 'Hola'},
+            snapshot={'userId': f'user-{i}', 'status': 'WELCOME_SENT'},
+            key=f'user-{i}'
+        )
+
+    for i in range(n):
+        yield 'welcome-event', lambda i=i: publish(i)
+    yield 'list', lambda: client.get('/api/notifications/')
+
+SCENARIOS = {
+    'user-service': _user_requests,
+    'product-service': _product_requests,
+    'cart-service': _cart_requests,
+    'notification-service': _notification_requests
+}
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def _wait_until(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def run_service(service, requests):
+    """Benchmark one service in this process and return its results"""
+    sys.path.insert(0, os.path.join(SERVICES_DIR, service))
+    from shared.memory_kafka import MemoryBroker
+    from shared.outbox import PENDING
+    import app as service_app
+
+    # Kafka starts on a background thread; consumers are up once the groups have joined
+    broker = MemoryBroker.instance()
+    if not _wait_until(lambda: broker.metadata().topics and broker.group_ids(), 30):
+        raise RuntimeError(f"{service} did not finish Kafka initialization")
+
+    # Plain WSGI client: Flask's test_client breaks on newer Werkzeug releases
+    client = Client(service_app.app)
+    latencies = {}
+    errors = 0
+    started = time.perf_counter()
+    for name, request in SCENARIOS[service](client, requests):
+        t0 = time.perf_counter()
+        response = request()
+        latencies.setdefault(name, []).append(time.perf_counter() - t0)
+        if response is not None and response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    drained = _wait_until(
+        lambda: service_app.mongo.db.outbox.count_documents({'status': PENDING}) == 0 and broker.lag() == 0,
+        60
+    )
+    drain_time = time.perf_counter() - started
+
+    return {
+        'service': service,
+        'requests': sum(len(samples) for samples in latencies.values()),
+        'errors': errors,
+        'requests_per_second': round(sum(len(s) for s in latencies.values()) / elapsed, 1),
+        'events_drained': drained,
+        'drain_seconds': round(drain_time, 3),
+        'latency_ms': {
+            name: {
+                'p50': round(statistics.median(samples) * 1000, 3),
+                'p95': round(_percentile(samples, 95) * 1000, 3),
+                'p99': round(_percentile(samples, 99) * 1000, 3)
+            }
+            for name, samples in latencies.items()
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the services on in-memory backends')
+    parser.add_argument('services', nargs='*', help=f"services to benchmark (default: {', '.join(SERVICES)})")
+    parser.add_argument('--requests', type=int, default=500, help='write requests per service')
+    parser.add_argument('--run-service', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    unknown = set(args.services) - set(SERVICES)
+    if unknown:
+        parser.error(f"unknown services: {', '.join(sorted(unknown))}")
+
+    if args.run_service:
+        print(json.dumps(run_service(args.run_service, args.requests)))
+        return
+
+    env = dict(
+        os.environ,
+        KAFKA_BACKEND='memory',
+        MONGO_BACKEND='memory',
+        PYTHONPATH=SERVICES_DIR,
+        PYTHONHASHSEED='0'
+    )
+    for service in args.services or SERVICES:
+        proc = subprocess.run(
+            [sys.executable, '-m', 'shared.benchmarks.services_bench', '--run-service', service,
+             '--requests', str(args.requests)],
+            cwd=SERVICES_DIR, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{service}: failed\n{proc.stderr[-2000:]}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{service}: {result['requests']} requests, {result['errors']} errors, "
+              f"{result['requests_per_second']} req/s, events drained in {result['drain_seconds']}s"
+              f"{'' if result['events_drained'] else ' (timed out)'}")
+        for name, latency in result['latency_ms'].items():
+            print(f"  {name:<14} p50 {latency['p50']:>8.3f} ms  p95 {latency['p95']:>8.3f} ms  p99 {latency['p99']:>8.3f} ms")
+
+if __name__ == '__main__':
+    main()
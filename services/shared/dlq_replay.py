@@ -0,0 +1,121 @@
+# shared/dlq_replay.py
+"""Re-inject dead-lettered events into the retry path of the group that dead-lettered them.
+
+Events go to the group's first retry topic, due immediately, with the
+original-topic header kept and the attempt count reset. Only that group
+consumes its retry topics and ConsumerRuntime routes them by the original
+topic, so the failing handler runs again and other groups subscribed to
+the same original topic do not see the event twice.
+
+Run from the services directory:
+
+    python -m shared.dlq_replay <group_id> [--topic TOPIC] [--limit N] [--dry-run]
+
+Progress is committed under its own consumer group (one per --topic filter),
+so running the tool again only replays events that reached the DLQ since.
+"""
+import argparse
+import logging
+import time
+from collections import Counter
+from confluent_kafka import KafkaError
+from shared.kafka_config import KafkaConfig
+from shared.backends import create_consumer
+from shared.kafka_producer import ProducerManager
+from shared.kafka_service import ORIGINAL_TOPIC_HEADER, RETRY_ATTEMPT_HEADER, RETRY_AT_HEADER, ERROR_HEADER
+
+logger = logging.getLogger(__name__)
+
+_RETRY_HEADERS = (RETRY_ATTEMPT_HEADER, RETRY_AT_HEADER, ERROR_HEADER)
+
+def _replay_group(group_id, topic=None):
+    return f"{group_id}.dlq-replay" + (f".{topic}" if topic else '')
+
+def replay(group_id, topic=None, limit=None, dry_run=False, idle_timeout=5.0):
+    """Replay the DLQ of group_id; returns a Counter of replayed events per original topic"""
+    dlq = KafkaConfig.dead_letter_topic(group_id)
+    if not KafkaConfig.RETRY_DELAYS:
+        raise RuntimeError("KAFKA_RETRY_DELAYS is empty: the group has no retry topic to replay into")
+    target = KafkaConfig.retry_topic(group_id, KafkaConfig.RETRY_DELAYS[0])
+    consumer = create_consumer({
+        'bootstrap.servers': KafkaConfig.BROKER,
+        'group.id': _replay_group(group_id, topic),
+        'auto.offset.reset': 'earliest',
+        'enable.auto.commit': False,
+        'enable.partition.eof': True
+    })
+    consumer.subscribe([dlq])
+    manager = ProducerManager.instance()
+    replayed = Counter()
+    seen = 0
+    at_end = set()
+
+    try:
+        while limit is None or seen < limit:
+            batch_size = 500 if limit is None else min(500, limit - seen)
+            msgs = consumer.consume(num_messages=batch_size, timeout=idle_timeout)
+            if not msgs:
+                break
+
+            with manager.batch() as batch:
+                for msg in msgs:
+                    if msg.error():
+                        if msg.error().code() == KafkaError._PARTITION_EOF:
+                            at_end.add((msg.topic(), msg.partition()))
+                        else:
+                            logger.error(f"Consumer error: {msg.error()}")
+                        continue
+
+                    at_end.discard((msg.topic(), msg.partition()))
+                    seen += 1
+                    headers = dict(msg.headers() or [])
+                    original = headers.get(ORIGINAL_TOPIC_HEADER)
+                    if not original:
+                        logger.warning(f"Skipping {dlq}[{msg.partition()}]@{msg.offset()}: no {ORIGINAL_TOPIC_HEADER} header")
+                        continue
+                    original = original.decode('utf-8')
+                    if topic and original != topic:
+                        continue
+
+                    replayed[original] += 1
+                    if not dry_run:
+                        retry_headers = [(k, v) for k, v in headers.items() if k not in _RETRY_HEADERS]
+                        retry_headers += [
+                            (RETRY_ATTEMPT_HEADER, b'0'),
+                            (RETRY_AT_HEADER, str(int(time.time() * 1000)).encode('ascii'))
+                        ]
+                        batch.add(target, msg.value(), key=msg.key(), headers=retry_headers)
+
+            failed = [report for report in batch.reports if report.error is not None]
+            if failed:
+                raise RuntimeError(f"{len(failed)} events could not be replayed, stopping without committing: {failed[0].error}")
+            if not dry_run:
+                consumer.commit(asynchronous=False)
+
+            assignment = consumer.assignment()
+            if assignment and at_end >= {(tp.topic, tp.partition) for tp in assignment}:
+                break
+    finally:
+        consumer.close()
+
+    return replayed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay dead-lettered Kafka events')
+    parser.add_argument('group_id', help='consumer group whose DLQ should be replayed, e.g. notification-service-group')
+    parser.add_argument('--topic', help='only replay events that failed on this topic')
+    parser.add_argument('--limit', type=int, help='stop after reading this many DLQ messages')
+    parser.add_argument('--dry-run', action='store_true', help='count events without republishing or committing')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    replayed = replay(args.group_id, topic=args.topic, limit=args.limit, dry_run=args.dry_run)
+
+    action = 'Would replay' if args.dry_run else 'Replayed'
+    for original, count in sorted(replayed.items()):
+        print(f"{action} {count} events that failed on {original}")
+    print(f"{action} {sum(replayed.values())} events from {KafkaConfig.dead_letter_topic(args.group_id)} "
+          f"into {KafkaConfig.retry_topic(args.group_id, KafkaConfig.RETRY_DELAYS[0])}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# shared/event_archive.py
+"""Archive old events into compressed, append-only segment files.
+
+Events older than EVENT_ARCHIVE_AFTER_SECONDS are copied to one segment file
+per UTC day (events-YYYY-MM-DD.seg) and marked with archivedAt; a TTL index
+on archivedAt then expires them from MongoDB, so nothing is deleted before
+it is on disk.
+
+A segment is a sequence of blocks, each appended by one archiver pass:
+
+    header  = magic b'EVB1', then uint32 compressed size, uint32 raw size,
+              uint32 crc32 of the compressed bytes, uint32 event count,
+              int64 first and last stored_at (ms since epoch)
+    payload = zlib-compressed concatenation of BSON documents
+
+Segments are scanned through mmap; blocks outside the requested time range
+are skipped without being decompressed.
+
+Run from the services directory:
+
+    python -m shared.event_archive run [--once]
+    python -m shared.event_archive scan [--since ISO] [--until ISO] [--topic TOPIC]
+"""
+import argparse
+import calendar
+import glob
+import logging
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime, timedelta
+from uuid import uuid4
+import bson
+from bson import json_util
+from shared.kafka_config import KafkaConfig
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'EVB1'
+HEADER = struct.Struct('<4sIIIIqq')
+
+def _events_collection():
+    from app import mongo
+    return mongo.db.events
+
+def _millis(dt):
+    return calendar.timegm(dt.utctimetuple()) * 1000 + dt.microsecond // 1000
+
+def segment_path(directory, day):
+    return os.path.join(directory, f"events-{day.strftime('%Y-%m-%d')}.seg")
+
+def _valid_length(path):
+    """Length of the prefix of complete blocks (a crash can leave a torn block at the end)"""
+    end = 0
+    for offset, header in _headers(path):
+        end = offset + HEADER.size + header[1]
+    return end
+
+def _headers(path):
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offset = 0
+        while offset + HEADER.size <= size:
+            header = HEADER.unpack_from(data, offset)
+            if header[0] != MAGIC or offset + HEADER.size + header[1] > size:
+                break
+            yield offset, header
+            offset += HEADER.size + header[1]
+
+def append_block(path, documents):
+    """Append one compressed block of documents to a segment and fsync it"""
+    raw = b''.join(bson.encode(document) for document in documents)
+    compressed = zlib.compress(raw, 6)
+    stamps = [_millis(document['stored_at']) for document in documents]
+    header = HEADER.pack(MAGIC, len(compressed), len(raw), zlib.crc32(compressed),
+                         len(documents), min(stamps), max(stamps))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'ab') as f:
+        valid = _valid_length(path)
+        if f.tell() != valid:
+            logger.warning(f"Truncating torn block at the end of {path}")
+            f.truncate(valid)
+            f.seek(valid)
+        f.write(header)
+        f.write(compressed)
+        f.flush()
+        os.fsync(f.fileno())
+
+def scan_segment(path, since=None, until=None):
+    """Yield the events of one segment whose stored_at is within [since, until)"""
+    since_ms = _millis(since) if since else None
+    until_ms = _millis(until) if until else None
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for offset, (_, size, raw_size, crc, count, first, last) in _headers(path):
+                if (since_ms is not None and last < since_ms) or (until_ms is not None and first >= until_ms):
+                    continue
+                compressed = data[offset + HEADER.size:offset + HEADER.size + size]
+                if zlib.crc32(compressed) != crc:
+                    logger.error(f"Skipping corrupt block at {path}:{offset}")
+                    continue
+                for event in bson.decode_all(zlib.decompress(compressed)):
+                    stored_at = event.get('stored_at')
+                    if since and stored_at < since or until and stored_at >= until:
+                        continue
+                    yield event
+
+def scan(directory=None, since=None, until=None, predicate=None):
+    """Yield archived events in segment (day) order, without touching MongoDB"""
+    directory = directory or KafkaConfig.EVENT_ARCHIVE_DIR
+    for path in sorted(glob.glob(os.path.join(directory, 'events-*.seg'))):
+        day = datetime.strptime(os.path.basename(path)[7:17], '%Y-%m-%d')
+        if since and day + timedelta(days=1) <= since or until and day >= until:
+            continue
+        for event in scan_segment(path, since, until):
+            if predicate is None or predicate(event):
+                yield event
+
+class EventArchiver:
+    """Moves events past the hot window from MongoDB to segment files"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, directory=None, batch_size=None, interval=None, collection=None):
+        self._collection = collection
+        self.directory = directory or KafkaConfig.EVENT_ARCHIVE_DIR
+        self.batch_size = batch_size or KafkaConfig.EVENT_ARCHIVE_BATCH_SIZE
+        self.interval = interval or KafkaConfig.EVENT_ARCHIVE_INTERVAL
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._stopped = threading.Event()
+
+    @classmethod
+    def start(cls):
+        """Start the process-wide archiver when EVENT_ARCHIVE_ENABLED is set"""
+        if not KafkaConfig.EVENT_ARCHIVE_ENABLED:
+            return None
+        with cls._lock:
+            if cls._instance is None:
+                archiver = cls()
+                threading.Thread(target=archiver.run, name='event-archiver', daemon=True).start()
+                cls._instance = archiver
+                logger.info(f"Event archiver started as {archiver.owner}, writing to {archiver.directory}")
+        return cls._instance
+
+    def stop(self):
+        self._stopped.set()
+
+    def _events(self):
+        return self._collection if self._collection is not None else _events_collection()
+
+    def claim(self):
+        """Lease the oldest unarchived events past the hot window, so archivers never share a batch"""
+        events = self._events()
+        now = datetime.utcnow()
+        claimable = {
+            'stored_at': {'$lt': now - timedelta(seconds=KafkaConfig.EVENT_ARCHIVE_AFTER_SECONDS)},
+            'archivedAt': None,
+            '$or': [{'archiveLeaseUntil': None}, {'archiveLeaseUntil': {'$lt': now}}]
+        }
+        ids = [doc['_id'] for doc in events.find(claimable, {'_id': 1}).sort('stored_at', 1).limit(self.batch_size)]
+        if not ids:
+            return []
+        events.update_many(
+            {'_id': {'$in': ids}, **claimable},
+            {'$set': {'archiveOwner': self.owner, 'archiveLeaseUntil': now + timedelta(minutes=5)}}
+        )
+        return list(events.find({'_id': {'$in': ids}, 'archiveOwner': self.owner}).sort('stored_at', 1))
+
+    def archive_once(self):
+        """Archive one batch; returns the number of events archived"""
+        documents = self.claim()
+        if not documents:
+            return 0
+
+        by_day = {}
+        for document in documents:
+            document.pop('archiveOwner', None)
+            document.pop('archiveLeaseUntil', None)
+            by_day.setdefault(document['stored_at'].date(), []).append(document)
+        for day, day_documents in by_day.items():
+            append_block(segment_path(self.directory, day), day_documents)
+
+        # Marked only once the block is on disk; a crash in between archives the batch twice
+        self._events().update_many(
+            {'_id': {'$in': [document['_id'] for document in documents]}, 'archiveOwner': self.owner},
+            {'$set': {'archivedAt': datetime.utcnow()}, '$unset': {'archiveOwner': '', 'archiveLeaseUntil': ''}}
+        )
+        logger.info(f"Archived {len(documents)} events to {len(by_day)} segment(s)")
+        return len(documents)
+
+    def run(self, once=False):
+        while not self._stopped.is_set():
+            try:
+                archived = self.archive_once()
+            except Exception as e:
+                logger.error(f"Error archiving events: {str(e)}", exc_info=True)
+                archived = 0
+            if once and archived < self.batch_size:
+                return
+            if archived < self.batch_size:
+                self._stopped.wait(self.interval)
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archive and scan the event store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='archive events past the hot window')
+    run.add_argument('--once', action='store_true', help='stop once the backlog is archived')
+    scan_cmd = commands.add_parser('scan', help='print archived events as JSON lines')
+    scan_cmd.add_argument('--since', help='ISO timestamp (UTC)')
+    scan_cmd.add_argument('--until', help='ISO timestamp (UTC)')
+    scan_cmd.add_argument('--topic', help='only events of this topic')
+    parser.add_argument('--dir', help=f'segment directory (default: {KafkaConfig.EVENT_ARCHIVE_DIR})')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'run':
+        from pymongo import MongoClient
+        client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/ecommerce'))
+        collection = client.get_default_database('ecommerce').events
+        EventArchiver(directory=args.dir, collection=collection).run(once=args.once)
+        return
+
+    predicate = (lambda event: event.get('topic') == args.topic) if args.topic else None
+    for event in scan(args.dir, _parse_time(args.since), _parse_time(args.until), predicate):
+        sys.stdout.write(json_util.dumps(event) + '\n')
+
+if __name__ == '__main__':
+    main()
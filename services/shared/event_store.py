@@ -0,0 +1,299 @@
+# shared/event_store.py
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+from bson import ObjectId, Decimal128
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from shared.kafka_config import KafkaConfig
+from shared.metrics import registry
+from shared.indexes import index, query
+
+logger = logging.getLogger(__name__)
+
+STORED_EVENTS = registry.counter(
+    'event_store_events_total', 'Events handed to the event store by result (stored, duplicate, error)', ('result',))
+STORE_BATCH_SIZE = registry.histogram(
+    'event_store_batch_size', 'Events per insert_many', buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+STORE_QUEUE_DEPTH = registry.gauge(
+    'event_store_queue_depth', 'Event batches waiting for the writer thread')
+
+_FLUSH = object()
+
+DUPLICATE_KEY = 11000
+
+def _events_collection():
+    from app import mongo
+    return mongo.db.events
+
+# Indexes of the shared events collection, part of every service's index registry
+EVENT_INDEXES = [
+    # One document per eventId; documents without one are not constrained
+    index('events', 'eventId', unique=True, partialFilterExpression={'eventId': {'$type': 'string'}}),
+    index('events', [('source', 1), ('stored_at', -1)]),
+    # Hot data only: archived events expire, the archiver picks the oldest unarchived ones
+    index('events', 'archivedAt', expireAfterSeconds=KafkaConfig.EVENT_ARCHIVED_RETENTION_SECONDS),
+    index('events', [('archivedAt', 1), ('stored_at', 1)])
+]
+
+EVENT_QUERIES = [
+    query('event-by-id', 'events', {'eventId': 'probe'}),
+    query('events-by-source', 'events', {'source': 'NotificationService'}, [('stored_at', -1)]),
+    query('events-to-archive', 'events', {'archivedAt': None, 'stored_at': {'$lt': datetime(2000, 1, 1)}}, [('stored_at', 1)])
+]
+
+class RecentEventIds:
+    """Bounded LRU of eventIds this process has already written.
+
+    Lets self-consumed and redelivered events skip the write instead of
+    relying on the unique index to reject it. Ids are recorded when the
+    event is queued and dropped again if its write fails.
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, event_id):
+        """Remember event_id; returns False if it was already known"""
+        with self._lock:
+            if event_id in self._ids:
+                self._ids.move_to_end(event_id)
+                return False
+            self._ids[event_id] = None
+            if len(self._ids) > self._capacity:
+                self._ids.popitem(last=False)
+            return True
+
+    def discard(self, event_ids):
+        """Forget eventIds whose write failed, so a redelivery is written again"""
+        with self._lock:
+            for event_id in event_ids:
+                self._ids.pop(event_id, None)
+
+    def __contains__(self, event_id):
+        with self._lock:
+            return event_id in self._ids
+
+def to_bson(value):
+    """Convert a value to types BSON stores natively, without a JSON round trip"""
+    if isinstance(value, dict):
+        return {str(k): to_bson(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_bson(v) for v in value]
+    if value is None or isinstance(value, (str, bool, int, float, datetime, ObjectId, bytes, Decimal128)):
+        return value
+    if isinstance(value, Decimal):
+        return Decimal128(value)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, UUID):
+        return str(value)
+    return str(value)
+
+def to_event_document(event, stored_at):
+    document = to_bson(event)
+    document.setdefault('_id', ObjectId())
+    document['stored_at'] = stored_at
+    return document
+
+class EventStoreWriter:
+    """Buffers event documents and writes them to the events collection in bulk.
+
+    Callers hand events to a bounded queue and return immediately; a
+    background thread flushes them with one unordered insert_many whenever
+    batch_size documents are waiting or flush_interval seconds have passed.
+    A full queue blocks the caller. Pass sync=True to wait until the events
+    are in MongoDB.
+
+    The store is idempotent on eventId: events this process already wrote
+    (or is writing) are skipped, and the unique index (see EVENT_INDEXES) turns any other
+    repeat into a no-op.
+    With upsert=True the event's fields are set on the stored document
+    instead, e.g. to record when a consumer started processing it.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, batch_size=None, flush_interval=None, queue_size=None):
+        self.batch_size = batch_size or KafkaConfig.EVENT_STORE_BATCH_SIZE
+        self.flush_interval = flush_interval or KafkaConfig.EVENT_STORE_FLUSH_INTERVAL
+        self._queue = queue.Queue(maxsize=queue_size or KafkaConfig.EVENT_STORE_QUEUE_SIZE)
+        self._recent = RecentEventIds(KafkaConfig.EVENT_STORE_DEDUP_SIZE)
+        self._stopped = threading.Event()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='event-store-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def instance(cls):
+        """Return the process-wide writer, creating it on first use"""
+        writer = cls._instance
+        if writer is None or writer._pid != os.getpid():
+            with cls._lock:
+                writer = cls._instance
+                if writer is None or writer._pid != os.getpid():
+                    writer = cls()
+                    cls._instance = writer
+        return writer
+
+    def write(self, events, sync=False, timeout=None, upsert=False):
+        """Queue events for storage and return their _ids (None for events skipped as already stored).
+
+        With sync=True, block until they are written and raise if the write failed.
+        """
+        stored_at = datetime.utcnow()
+        ids, documents = [], []
+        for event in events:
+            event_id = event.get('eventId')
+            if event_id is not None and not self._recent.add(event_id) and not upsert:
+                ids.append(None)
+                continue
+            document = to_event_document(event, stored_at)
+            ids.append(document['_id'])
+            documents.append(document)
+
+        if len(documents) < len(events):
+            STORED_EVENTS.inc(len(events) - len(documents), result='duplicate')
+        if not documents:
+            return ids
+
+        future = Future() if sync or self._stopped.is_set() else None
+        if self._stopped.is_set():
+            # Writer already closed (interpreter shutdown): write inline
+            self._write(documents if not upsert else [], documents if upsert else [], [future])
+        else:
+            self._queue.put((documents, future, upsert))
+            STORE_QUEUE_DEPTH.set(self._queue.qsize())
+
+        if future is not None:
+            future.result(timeout=KafkaConfig.EVENT_STORE_SYNC_TIMEOUT if timeout is None else timeout)
+        return ids
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written"""
+        future = Future()
+        self._queue.put((_FLUSH, future, False))
+        future.result(timeout=KafkaConfig.EVENT_STORE_SYNC_TIMEOUT if timeout is None else timeout)
+
+    def close(self):
+        if self._stopped.is_set() or self._pid != os.getpid():
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush event store on shutdown: {str(e)}")
+        self._stopped.set()
+
+    def _run(self):
+        while True:
+            inserts, upserts, waiters, flushes = [], [], [], []
+            deadline = None
+            while len(inserts) + len(upserts) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    batch, future, upsert = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if batch is _FLUSH:
+                    flushes.append(future)
+                    break
+                (upserts if upsert else inserts).extend(batch)
+                waiters.append(future)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            STORE_QUEUE_DEPTH.set(self._queue.qsize())
+            if inserts or upserts:
+                try:
+                    self._write(inserts, upserts, waiters)
+                except Exception as e:
+                    logger.error(f"Failed to store {len(inserts) + len(upserts)} events: {str(e)}", exc_info=True)
+                    for future in waiters:
+                        if future is not None and not future.done():
+                            future.set_exception(e)
+            for future in flushes:
+                future.set_result(None)
+
+    def _write(self, inserts, upserts, waiters):
+        error = None
+        try:
+            if inserts:
+                error = self._bulk(inserts, lambda: _events_collection().insert_many(inserts, ordered=False))
+            if upserts:
+                requests = [self._upsert_request(document) for document in upserts]
+                error = self._bulk(upserts, lambda: _events_collection().bulk_write(requests, ordered=False)) or error
+        except Exception:
+            self._forget(inserts + upserts)
+            raise
+        if error is not None:
+            # Documents stored before the error are kept out by the unique index on a retry
+            self._forget(inserts + upserts)
+
+        for future in waiters:
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    def _forget(self, documents):
+        self._recent.discard(document['eventId'] for document in documents if document.get('eventId') is not None)
+
+    @staticmethod
+    def _upsert_request(document):
+        document = dict(document)
+        on_insert = {'_id': document.pop('_id'), 'stored_at': document.pop('stored_at')}
+        if document.get('eventId') is None:
+            return UpdateOne({'_id': on_insert['_id']}, {'$set': document, '$setOnInsert': on_insert}, upsert=True)
+        return UpdateOne({'eventId': document['eventId']}, {'$set': document, '$setOnInsert': on_insert}, upsert=True)
+
+    def _bulk(self, documents, operation):
+        """Run one bulk write with retries; returns the error that made events fail, if any"""
+        stored, duplicates, error = 0, 0, None
+        for attempt in range(1, 4):
+            try:
+                operation()
+                stored, error = len(documents), None
+                break
+            except BulkWriteError as e:
+                # Unordered: everything but the failed documents was written. Duplicate keys are
+                # events stored earlier (or by a retried batch that had partially gone through).
+                write_errors = e.details.get('writeErrors', [])
+                failed = [w for w in write_errors if w.get('code') != DUPLICATE_KEY]
+                duplicates = len(write_errors) - len(failed)
+                stored = len(documents) - len(write_errors)
+                error = e if failed else None
+                if failed:
+                    logger.error(f"{len(failed)}/{len(documents)} events could not be stored: {failed[0].get('errmsg')}")
+                break
+            except PyMongoError as e:
+                logger.warning(f"Event store write failed (attempt {attempt}/3): {str(e)}")
+                error = e
+                time.sleep(0.5 * attempt)
+
+        if stored:
+            STORED_EVENTS.inc(stored, result='stored')
+            STORE_BATCH_SIZE.observe(stored)
+            logger.info(f"{stored} events saved to MongoDB")
+        if duplicates:
+            STORED_EVENTS.inc(duplicates, result='duplicate')
+        failed = len(documents) - stored - duplicates
+        if failed:
+            STORED_EVENTS.inc(failed, result='error')
+            logger.error(f"Dropped {failed} events: {str(error)}")
+        return error
@@ -0,0 +1,95 @@
+# shared/indexes.py
+"""Declarative MongoDB indexes, applied idempotently at startup.
+
+Each service lists its indexes and the hot queries they are meant to serve
+in app/indexes.py. The queries can be checked against the live database
+with an explain plan:
+
+    MONGO_URI=mongodb://localhost:27017/ecommerce python -m shared.indexes cart-service [--apply]
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+from collections import namedtuple
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+Index = namedtuple('Index', ['collection', 'keys', 'options'])
+Query = namedtuple('Query', ['name', 'collection', 'filter', 'sort'])
+
+def index(collection, keys, **options):
+    """Declare an index; keys is a field name or a list of (field, direction)"""
+    if isinstance(keys, str):
+        keys = [(keys, 1)]
+    options.setdefault('name', '_'.join(f'{field}_{direction}' for field, direction in keys))
+    return Index(collection, keys, options)
+
+def query(name, collection, filter, sort=None):
+    """Declare a hot query that must be served by an index"""
+    return Query(name, collection, filter, sort)
+
+def ensure_indexes(db, indexes):
+    """Create every declared index that does not exist yet; returns the names that failed"""
+    failed = []
+    for spec in indexes:
+        try:
+            db[spec.collection].create_index(spec.keys, **spec.options)
+        except OperationFailure as e:
+            # Conflicting options or duplicate data: the rest of the registry still applies
+            logger.error(f"Could not create index {spec.collection}.{spec.options['name']}: {str(e)}")
+            failed.append(f"{spec.collection}.{spec.options['name']}")
+    logger.info(f"Ensured {len(indexes) - len(failed)}/{len(indexes)} indexes")
+    return failed
+
+def _stages(plan):
+    yield plan.get('stage')
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            yield from _stages(child)
+
+def verify_queries(db, queries):
+    """Explain every declared query; returns {query name: winning plan stages} for those scanning a collection"""
+    scans = {}
+    for spec in queries:
+        cursor = db[spec.collection].find(spec.filter)
+        if spec.sort:
+            cursor = cursor.sort(spec.sort)
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        stages = [stage for stage in _stages(plan) if stage]
+        if 'COLLSCAN' in stages:
+            scans[spec.name] = stages
+            logger.warning(f"Query {spec.name} on {spec.collection} is a collection scan: {stages}")
+    return scans
+
+def _load_registry(service):
+    """Load a service's app/indexes.py without importing (and starting) the service"""
+    services_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.path.join(services_dir, service, 'app', 'indexes.py')
+    spec = importlib.util.spec_from_file_location(f'{service}_indexes', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply and verify a service's MongoDB indexes")
+    parser.add_argument('service', help='e.g. cart-service')
+    parser.add_argument('--apply', action='store_true', help='create missing indexes before verifying')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from pymongo import MongoClient
+    registry = _load_registry(args.service)
+    db = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/ecommerce')).get_default_database('ecommerce')
+
+    if args.apply:
+        ensure_indexes(db, registry.INDEXES)
+    scans = verify_queries(db, registry.QUERIES)
+    for spec in registry.QUERIES:
+        print(f"{'COLLSCAN' if spec.name in scans else 'indexed':<9} {spec.name}")
+    sys.exit(1 if scans else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+# shared/inventory.py
+"""Stock reservations held against carts.
+
+Reserving takes stock with a single conditional update on the product
+({'stock': {'$gte': quantity}} with $inc), so any number of concurrent
+reservations of a hot SKU can never oversell and nothing is read first.
+The reservation itself is one document per cart line in `reservations`
+(quantity and expiresAt). Stock is taken before the reservation is
+recorded: a crash in between leaks stock rather than creating it.
+
+Releasing deletes or decrements the reservation first and returns exactly
+what it held, so a cart removal racing the expiry sweeper cannot restock
+twice. Every stock change is published to inventory-updates as a compact
+event: productId, delta, stock left and the reason.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from shared.kafka_config import KafkaConfig
+from shared.metrics import registry
+from shared.indexes import index, query
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'InventoryService'
+
+RESERVED = 'reserved'
+RELEASED = 'released'
+EXPIRED = 'expired'
+ABANDONED = 'abandoned'
+
+STOCK_CHANGES = registry.counter(
+    'inventory_stock_changes_total', 'Units taken from or returned to stock by reason', ('reason',))
+RESERVATION_REJECTIONS = registry.counter(
+    'inventory_reservation_rejections_total', 'Reservations refused for lack of stock')
+
+# Part of the registry of every service that reserves stock
+INVENTORY_INDEXES = [
+    index('reservations', 'userId'),
+    index('reservations', 'expiresAt')
+]
+
+INVENTORY_QUERIES = [
+    query('reservations-by-user', 'reservations', {'userId': 'probe'}),
+    query('expired-reservations', 'reservations', {'expiresAt': {'$lt': datetime(2000, 1, 1)}})
+]
+
+class InsufficientStock(ValueError):
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Only {available} units of product {product_id} available, {requested} requested")
+
+def _products_collection():
+    from app import mongo
+    return mongo.db.products
+
+def _reservations_collection():
+    from app import mongo
+    return mongo.db.reservations
+
+def _product_key(product_id):
+    return ObjectId(product_id) if ObjectId.is_valid(product_id) else product_id
+
+def _reservation_id(user_id, product_id):
+    return f"{user_id}:{product_id}"
+
+class Inventory:
+    @staticmethod
+    def reserve(user_id, product_id, quantity):
+        """Take quantity units of a product for the user's cart; returns the stock left"""
+        stock = Inventory._take(product_id, quantity)
+        try:
+            _reservations_collection().update_one(
+                {'_id': _reservation_id(user_id, product_id)},
+                {
+                    '$inc': {'quantity': quantity},
+                    '$set': {'expiresAt': datetime.utcnow() + timedelta(seconds=KafkaConfig.INVENTORY_RESERVATION_SECONDS)},
+                    '$setOnInsert': {'userId': user_id, 'productId': product_id, 'createdAt': datetime.utcnow()}
+                },
+                upsert=True
+            )
+        except PyMongoError:
+            Inventory._restock(product_id, quantity)
+            raise
+        Inventory._publish([(user_id, product_id, -quantity, stock, RESERVED)])
+        return stock
+
+    @staticmethod
+    def reserve_many(user_id, quantities):
+        """Reserve {productId: quantity} all or nothing; returns what was reserved"""
+        reserved = {}
+        try:
+            for product_id, quantity in quantities.items():
+                Inventory.reserve(user_id, product_id, quantity)
+                reserved[product_id] = quantity
+        except Exception:
+            Inventory.release_many(user_id, reserved)
+            raise
+        return reserved
+
+    @staticmethod
+    def release(user_id, product_id, quantity=None, reason=RELEASED):
+        """Return up to quantity units (all of them by default) of the user's reservation to stock"""
+        reservations = _reservations_collection()
+        reservation_id = _reservation_id(user_id, product_id)
+        released = 0
+        if quantity is not None:
+            if reservations.find_one_and_update(
+                {'_id': reservation_id, 'quantity': {'$gt': quantity}},
+                {'$inc': {'quantity': -quantity}}
+            ):
+                released = quantity
+        if not released:
+            # Releasing everything, or at least as much as is held (it may have expired meanwhile)
+            reservation = reservations.find_one_and_delete({'_id': reservation_id})
+            released = reservation['quantity'] if reservation else 0
+        if released:
+            stock = Inventory._restock(product_id, released)
+            Inventory._publish([(user_id, product_id, released, stock, reason)])
+        return released
+
+    @staticmethod
+    def release_many(user_id, quantities, reason=RELEASED):
+        for product_id, quantity in quantities.items():
+            Inventory.release(user_id, product_id, quantity, reason)
+
+    @staticmethod
+    def release_all(user_id, reason=RELEASED):
+        """Return every reservation of the user's cart to stock; returns the units released"""
+        product_ids = _reservations_collection().distinct('productId', {'userId': user_id})
+        return sum(Inventory.release(user_id, product_id, reason=reason) for product_id in product_ids)
+
+    @staticmethod
+    def release_expired(limit=None):
+        """Return up to limit expired reservations to stock; returns how many were released"""
+        reservations = _reservations_collection()
+        limit = limit or KafkaConfig.INVENTORY_SWEEP_BATCH_SIZE
+        changes = []
+        for _ in range(limit):
+            # Claimed by deleting it: a concurrent add either refreshed expiresAt first or starts a new one
+            reservation = reservations.find_one_and_delete({'expiresAt': {'$lt': datetime.utcnow()}})
+            if reservation is None:
+                break
+            stock = Inventory._restock(reservation['productId'], reservation['quantity'])
+            changes.append((reservation['userId'], reservation['productId'], reservation['quantity'], stock, EXPIRED))
+        Inventory._publish(changes)
+        return len(changes)
+
+    @staticmethod
+    def reserved(user_id):
+        """{productId: quantity} currently reserved for the user's cart"""
+        return {
+            reservation['productId']: reservation['quantity']
+            for reservation in _reservations_collection().find({'userId': user_id}, {'productId': 1, 'quantity': 1})
+        }
+
+    @staticmethod
+    def _take(product_id, quantity):
+        product = _products_collection().find_one_and_update(
+            {'_id': _product_key(product_id), 'stock': {'$gte': quantity}},
+            {'$inc': {'stock': -quantity}},
+            projection={'stock': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if product is None:
+            RESERVATION_REJECTIONS.inc()
+            # Failure path only: read what is left for the error message
+            current = _products_collection().find_one({'_id': _product_key(product_id)}, {'stock': 1})
+            raise InsufficientStock(product_id, quantity, (current or {}).get('stock') or 0)
+        return product['stock']
+
+    @staticmethod
+    def _restock(product_id, quantity):
+        product = _products_collection().find_one_and_update(
+            {'_id': _product_key(product_id)},
+            {'$inc': {'stock': quantity}},
+            projection={'stock': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return product['stock'] if product else None
+
+    @staticmethod
+    def _publish(changes):
+        """One inventory-updates event per (userId, productId, delta, stock, reason)"""
+        if not changes:
+            return
+        from shared.kafka_service import KafkaService
+
+        timestamp = datetime.utcnow().isoformat()
+        for _, _, delta, _, reason in changes:
+            STOCK_CHANGES.inc(abs(delta), reason=reason)
+        try:
+            KafkaService.produce_events([
+                {
+                    'topic': KafkaConfig.INVENTORY_UPDATES_TOPIC,
+                    'source': SOURCE,
+                    'payload': {'productId': product_id, 'userId': user_id, 'delta': delta, 'reason': reason},
+                    'snapshot': {'productId': product_id, 'stock': stock, 'timestamp': timestamp},
+                    'key': product_id
+                }
+                for user_id, product_id, delta, stock, reason in changes
+            ])
+        except Exception as e:
+            # The stock change itself is done; only its announcement is lost
+            logger.error(f"Failed to publish {len(changes)} inventory updates: {str(e)}")
+
+class ReservationSweeper:
+    """Background worker returning expired reservations to stock"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, interval=None, batch_size=None):
+        self.interval = interval or KafkaConfig.INVENTORY_SWEEP_INTERVAL
+        self.batch_size = batch_size or KafkaConfig.INVENTORY_SWEEP_BATCH_SIZE
+        self._stopped = threading.Event()
+
+    @classmethod
+    def start(cls):
+        """Start the process-wide sweeper (no-op if it is already running)"""
+        with cls._lock:
+            if cls._instance is None:
+                sweeper = cls()
+                threading.Thread(target=sweeper.run, name='reservation-sweeper', daemon=True).start()
+                cls._instance = sweeper
+                logger.info("Reservation sweeper started")
+        return cls._instance
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                released = Inventory.release_expired(self.batch_size)
+                if released:
+                    logger.info(f"Released {released} expired reservations")
+            except Exception as e:
+                logger.error(f"Error releasing expired reservations: {str(e)}", exc_info=True)
+                released = 0
+            if released < self.batch_size:
+                self._stopped.wait(self.interval)
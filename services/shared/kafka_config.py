@@ -3,9 +3,14 @@ import os
 
 class KafkaConfig:
     BROKER = os.getenv('KAFKA_BROKER', 'kafka:9092')
+    # 'kafka' for a real cluster, 'memory' for the in-process stand-in (load tests, CI)
+    BACKEND = os.getenv('KAFKA_BACKEND', 'kafka')
     
     # Topics
     USER_REGISTRATION_TOPIC = 'user-registration'
+    USER_UPDATES_TOPIC = 'user-updates'
+    USER_DELETIONS_TOPIC = 'user-deletions'
+    USER_LOGINS_TOPIC = 'user-logins'
     WELCOME_TOPIC = 'welcome-flow'
     NOTIFICATION_TOPIC = 'notification-topic'
     CART_UPDATES_TOPIC = 'cart-updates'
@@ -13,16 +18,105 @@ class KafkaConfig:
     ORDER_CREATED_TOPIC = 'order-created'
     INVOICE_PROCESSING_TOPIC = 'invoice-processing'
     PRODUCT_EVENTS_TOPIC = 'product-events'
+    INVENTORY_UPDATES_TOPIC = 'inventory-updates'
     
     @staticmethod
     def get_all_topics():
         return [
             KafkaConfig.USER_REGISTRATION_TOPIC,
+            KafkaConfig.USER_UPDATES_TOPIC,
+            KafkaConfig.USER_DELETIONS_TOPIC,
+            KafkaConfig.USER_LOGINS_TOPIC,
             KafkaConfig.WELCOME_TOPIC,
             KafkaConfig.NOTIFICATION_TOPIC,
             KafkaConfig.CART_UPDATES_TOPIC,
             KafkaConfig.CART_REMOVALS_TOPIC,
             KafkaConfig.ORDER_CREATED_TOPIC,
             KafkaConfig.INVOICE_PROCESSING_TOPIC,
-            KafkaConfig.PRODUCT_EVENTS_TOPIC
-        ]
\ No newline at end of file
+            KafkaConfig.PRODUCT_EVENTS_TOPIC,
+            KafkaConfig.INVENTORY_UPDATES_TOPIC
+        ]
+
+    # Producer
+    PRODUCER_POLL_INTERVAL = float(os.getenv('KAFKA_PRODUCER_POLL_INTERVAL', '0.1'))
+    PRODUCER_FLUSH_TIMEOUT = float(os.getenv('KAFKA_PRODUCER_FLUSH_TIMEOUT', '10'))
+    DELIVERY_TIMEOUT = float(os.getenv('KAFKA_DELIVERY_TIMEOUT', '10'))
+    PRODUCER_LINGER_MS = int(os.getenv('KAFKA_PRODUCER_LINGER_MS', '5'))
+    PRODUCER_BATCH_SIZE = int(os.getenv('KAFKA_PRODUCER_BATCH_SIZE', '131072'))
+    PRODUCER_COMPRESSION = os.getenv('KAFKA_PRODUCER_COMPRESSION', 'lz4')
+    # Same hashing as the Java client, so keyed events land on the same partition from any producer
+    PARTITIONER = os.getenv('KAFKA_PARTITIONER', 'murmur2_random')
+
+    @staticmethod
+    def get_producer_config():
+        return {
+            'bootstrap.servers': KafkaConfig.BROKER,
+            'message.timeout.ms': 5000,
+            'retries': 5,
+            'linger.ms': KafkaConfig.PRODUCER_LINGER_MS,
+            'batch.size': KafkaConfig.PRODUCER_BATCH_SIZE,
+            'compression.type': KafkaConfig.PRODUCER_COMPRESSION,
+            'partitioner': KafkaConfig.PARTITIONER
+        }
+
+    # Wire format of event values: json (orjson when installed) or msgpack
+    EVENT_CODEC = os.getenv('KAFKA_EVENT_CODEC', 'json')
+
+    # Outbox relay
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '0.5'))
+    OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '30'))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+    # Failed publishes back off exponentially from OUTBOX_RETRY_BACKOFF up to OUTBOX_MAX_BACKOFF seconds
+    OUTBOX_RETRY_BACKOFF = float(os.getenv('OUTBOX_RETRY_BACKOFF', '1'))
+    OUTBOX_MAX_BACKOFF = float(os.getenv('OUTBOX_MAX_BACKOFF', '300'))
+    # Rows that ran out of attempts are re-queued this often (0 disables it), at most OUTBOX_MAX_REDRIVES times
+    OUTBOX_REDRIVE_INTERVAL = int(os.getenv('OUTBOX_REDRIVE_INTERVAL', '900'))
+    OUTBOX_MAX_REDRIVES = int(os.getenv('OUTBOX_MAX_REDRIVES', '5'))
+    OUTBOX_RETENTION_SECONDS = int(os.getenv('OUTBOX_RETENTION_SECONDS', '86400'))
+    # Rows still FAILED this long after their last attempt are dropped
+    OUTBOX_FAILED_RETENTION_SECONDS = int(os.getenv('OUTBOX_FAILED_RETENTION_SECONDS', '604800'))
+
+    # Event store writer
+    EVENT_STORE_BATCH_SIZE = int(os.getenv('EVENT_STORE_BATCH_SIZE', '500'))
+    EVENT_STORE_FLUSH_INTERVAL = float(os.getenv('EVENT_STORE_FLUSH_INTERVAL', '0.2'))
+    EVENT_STORE_QUEUE_SIZE = int(os.getenv('EVENT_STORE_QUEUE_SIZE', '10000'))
+    EVENT_STORE_SYNC_TIMEOUT = float(os.getenv('EVENT_STORE_SYNC_TIMEOUT', '10'))
+    # eventIds remembered per process so repeats skip the write
+    EVENT_STORE_DEDUP_SIZE = int(os.getenv('EVENT_STORE_DEDUP_SIZE', '100000'))
+
+    # Event archive: events older than EVENT_ARCHIVE_AFTER_SECONDS move to segment files and
+    # expire from MongoDB EVENT_ARCHIVED_RETENTION_SECONDS after being archived
+    EVENT_ARCHIVE_ENABLED = os.getenv('EVENT_ARCHIVE_ENABLED', 'false').lower() == 'true'
+    EVENT_ARCHIVE_DIR = os.getenv('EVENT_ARCHIVE_DIR', 'archive')
+    EVENT_ARCHIVE_AFTER_SECONDS = int(os.getenv('EVENT_ARCHIVE_AFTER_SECONDS', '86400'))
+    EVENT_ARCHIVED_RETENTION_SECONDS = int(os.getenv('EVENT_ARCHIVED_RETENTION_SECONDS', '86400'))
+    EVENT_ARCHIVE_BATCH_SIZE = int(os.getenv('EVENT_ARCHIVE_BATCH_SIZE', '5000'))
+    EVENT_ARCHIVE_INTERVAL = float(os.getenv('EVENT_ARCHIVE_INTERVAL', '60'))
+
+    # Stock reservations held against carts: they expire INVENTORY_RESERVATION_SECONDS after the
+    # line was last added to, and a sweeper returns expired ones to stock
+    INVENTORY_RESERVATION_SECONDS = int(os.getenv('INVENTORY_RESERVATION_SECONDS', '900'))
+    INVENTORY_SWEEP_INTERVAL = float(os.getenv('INVENTORY_SWEEP_INTERVAL', '30'))
+    INVENTORY_SWEEP_BATCH_SIZE = int(os.getenv('INVENTORY_SWEEP_BATCH_SIZE', '500'))
+
+    # Consumer
+    CONSUMER_BATCH_SIZE = int(os.getenv('KAFKA_CONSUMER_BATCH_SIZE', '100'))
+    CONSUMER_BATCH_TIMEOUT = float(os.getenv('KAFKA_CONSUMER_BATCH_TIMEOUT', '1.0'))
+    CONSUMER_WORKERS = int(os.getenv('KAFKA_CONSUMER_WORKERS', '4'))
+    CONSUMER_WORKER_QUEUE_SIZE = int(os.getenv('KAFKA_CONSUMER_WORKER_QUEUE_SIZE', '100'))
+    CONSUMER_COMMIT_INTERVAL = float(os.getenv('KAFKA_CONSUMER_COMMIT_INTERVAL', '1.0'))
+    CONSUMER_METRICS_INTERVAL = float(os.getenv('KAFKA_CONSUMER_METRICS_INTERVAL', '10'))
+
+    # Failed events move through one delayed retry topic per entry, then to the dead-letter topic
+    RETRY_DELAYS = [int(d) for d in os.getenv('KAFKA_RETRY_DELAYS', '1,30,300').split(',') if d.strip()]
+    # Backoff cap when a failed event cannot be moved to its retry or dead-letter topic
+    REROUTE_MAX_BACKOFF = float(os.getenv('KAFKA_REROUTE_MAX_BACKOFF', '30'))
+
+    @staticmethod
+    def retry_topic(group_id, delay):
+        return f"{group_id}.retry-{delay}s"
+
+    @staticmethod
+    def dead_letter_topic(group_id):
+        return f"{group_id}.dlq"
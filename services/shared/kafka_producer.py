@@ -0,0 +1,169 @@
+# shared/kafka_producer.py
+import atexit
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, wait
+from confluent_kafka import KafkaException
+from shared.kafka_config import KafkaConfig
+from shared.backends import create_producer
+
+logger = logging.getLogger(__name__)
+
+DeliveryReport = namedtuple('DeliveryReport', ['topic', 'partition', 'offset', 'error'])
+
+class ProducerBatch:
+    """Collects the delivery futures of many messages so they can be awaited together"""
+
+    def __init__(self, manager, timeout=None):
+        self._manager = manager
+        self._timeout = KafkaConfig.DELIVERY_TIMEOUT if timeout is None else timeout
+        self._futures = []
+        self.reports = []
+
+    def add(self, topic, value, key=None, headers=None):
+        future = self._manager.produce(topic, value, key=key, headers=headers)
+        self._futures.append((topic, future))
+        return future
+
+    def wait(self):
+        """Wait for every message in the batch and return one DeliveryReport per message"""
+        wait([future for _, future in self._futures], timeout=self._timeout)
+        self.reports = [self._report(topic, future) for topic, future in self._futures]
+        failed = sum(1 for report in self.reports if report.error is not None)
+        if failed:
+            logger.warning(f"{failed}/{len(self.reports)} messages in batch were not delivered")
+        return self.reports
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wait()
+        return False
+
+    @staticmethod
+    def _report(topic, future):
+        if not future.done():
+            return DeliveryReport(topic, None, None, 'Delivery timed out')
+        error = future.exception()
+        if error is not None:
+            return DeliveryReport(topic, None, None, str(error))
+        msg = future.result()
+        return DeliveryReport(msg.topic(), msg.partition(), msg.offset(), None)
+
+class ProducerManager:
+    """Owns a single long-lived Kafka producer per process.
+
+    Messages are handed to librdkafka asynchronously; a background thread
+    polls for delivery reports and the producer is only flushed on shutdown
+    or when a caller explicitly waits on a delivery.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, config=None, poll_interval=None):
+        self._config = config or KafkaConfig.get_producer_config()
+        self._producer = create_producer(self._config)
+        self._poll_interval = poll_interval or KafkaConfig.PRODUCER_POLL_INTERVAL
+        self._stopped = threading.Event()
+        self._poll_thread = threading.Thread(
+            target=self._poll_loop,
+            name='kafka-producer-poll',
+            daemon=True
+        )
+        self._poll_thread.start()
+        self._pid = os.getpid()
+        self._partitioner = None
+        self._partition_counts = {}
+        atexit.register(self.close)
+
+    @classmethod
+    def instance(cls):
+        """Return the process-wide manager, creating it on first use"""
+        manager = cls._instance
+        # A forked worker must not reuse the parent's producer
+        if manager is None or manager._pid != os.getpid():
+            with cls._lock:
+                manager = cls._instance
+                if manager is None or manager._pid != os.getpid():
+                    manager = cls()
+                    cls._instance = manager
+        return manager
+
+    @property
+    def producer(self):
+        return self._producer
+
+    def set_partitioner(self, partitioner):
+        """Route keyed messages with partitioner(key, partition_count) instead of
+        the librdkafka partitioner configured by KAFKA_PARTITIONER"""
+        self._partitioner = partitioner
+        self._partition_counts = {}
+
+    def produce(self, topic, value, key=None, headers=None):
+        """Queue a message and return a Future resolved by its delivery report"""
+        future = Future()
+        kwargs = {'key': key, 'headers': headers}
+        if self._partitioner is not None and key is not None:
+            partition = self._partition_for(topic, key)
+            if partition is not None:
+                kwargs['partition'] = partition
+
+        def on_delivery(err, msg):
+            if err is not None:
+                logger.error(f"Delivery failed for message to {topic}: {err}")
+                future.set_exception(KafkaException(err))
+            else:
+                future.set_result(msg)
+
+        try:
+            self._producer.produce(topic, value=value, on_delivery=on_delivery, **kwargs)
+        except BufferError:
+            # Local queue is full: serve delivery reports to make room, then retry once
+            logger.warning(f"Producer queue full, waiting before producing to {topic}")
+            self._producer.poll(1.0)
+            self._producer.produce(topic, value=value, on_delivery=on_delivery, **kwargs)
+        return future
+
+    def _partition_for(self, topic, key):
+        count = self._partition_counts.get(topic)
+        if count is None:
+            try:
+                metadata = self._producer.list_topics(topic, timeout=5)
+                count = len(metadata.topics[topic].partitions)
+            except Exception as e:
+                logger.warning(f"Partition count unavailable for {topic}, using default partitioner: {str(e)}")
+                return None
+            if not count:
+                return None
+            self._partition_counts[topic] = count
+        return self._partitioner(key, count)
+
+    def batch(self, timeout=None):
+        """Start a batch whose messages are linger-batched by librdkafka and awaited together"""
+        return ProducerBatch(self, timeout=timeout)
+
+    def flush(self, timeout=None):
+        """Block until all queued messages are delivered; returns the number still queued"""
+        remaining = self._producer.flush(KafkaConfig.PRODUCER_FLUSH_TIMEOUT if timeout is None else timeout)
+        if remaining:
+            logger.warning(f"{remaining} messages still queued after producer flush")
+        return remaining
+
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._poll_thread.join(timeout=self._poll_interval * 10)
+        self.flush()
+        logger.info("Kafka producer closed")
+
+    def _poll_loop(self):
+        while not self._stopped.is_set():
+            try:
+                self._producer.poll(self._poll_interval)
+            except Exception as e:
+                logger.error(f"Error polling Kafka producer: {str(e)}")
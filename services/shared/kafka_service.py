@@ -1,29 +1,49 @@
 # shared/kafka_service.py
 import time
-import json
-from confluent_kafka import Producer, Consumer, KafkaException
-from confluent_kafka.admin import AdminClient, NewTopic
+import threading
+from confluent_kafka import KafkaError, KafkaException, TopicPartition
+from confluent_kafka.admin import NewTopic
 import logging
 from datetime import datetime
 from uuid import uuid4
 from shared.kafka_config import KafkaConfig
-from json import JSONEncoder
-from bson import ObjectId
-from bson import json_util
+from shared.backends import create_admin_client, create_consumer
+from shared.kafka_producer import ProducerManager
+from shared.kafka_workers import KeyOrderedExecutor, OffsetTracker, event_key
+from shared.outbox import Outbox
+from shared.serializers import encode_event, decode_event
+from shared.metrics import registry
 
 logger = logging.getLogger(__name__)
 
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (datetime, ObjectId)):
-            return str(obj)
-        return super().default(obj)
+# Headers added to events moved to a retry or dead-letter topic
+ORIGINAL_TOPIC_HEADER = 'original-topic'
+RETRY_ATTEMPT_HEADER = 'retry-attempt'
+RETRY_AT_HEADER = 'retry-at'
+ERROR_HEADER = 'error'
+
+# A malformed event fails the same way on every attempt, so it goes straight to the DLQ
+NON_RETRYABLE_ERRORS = (ValueError, KeyError, TypeError)
+
+CONSUMED_MESSAGES = registry.counter(
+    'kafka_consumer_messages_total', 'Messages received by the consumer', ('group', 'topic'))
+CONSUMER_THROUGHPUT = registry.gauge(
+    'kafka_consumer_messages_per_second', 'Messages received per second over the last metrics interval', ('group', 'topic'))
+CONSUMER_ERRORS = registry.counter(
+    'kafka_consumer_errors_total', 'Consumer errors by kind (consume, decode, handler, reroute)', ('group', 'topic', 'kind'))
+REROUTED_EVENTS = registry.counter(
+    'kafka_consumer_rerouted_total', 'Failed events moved to a retry or dead-letter topic, or dropped', ('group', 'topic', 'destination'))
+CONSUMER_LAG = registry.gauge(
+    'kafka_consumer_lag', 'High watermark minus committed offset', ('group', 'topic', 'partition'))
+HANDLER_LATENCY = registry.histogram(
+    'kafka_consumer_handler_seconds', 'Time spent in one handler call (per event, or per batch for batch handlers)',
+    ('group', 'topic'))
 
 class KafkaService:
     @staticmethod
     def wait_for_kafka(max_retries=30, delay=5):
         """Wait for Kafka to be available"""
-        admin_client = AdminClient({'bootstrap.servers': KafkaConfig.BROKER})
+        admin_client = create_admin_client({'bootstrap.servers': KafkaConfig.BROKER})
         
         for i in range(max_retries):
             try:
@@ -37,12 +57,12 @@ class KafkaService:
         raise Exception("Failed to connect to Kafka after multiple attempts")
 
     @staticmethod
-    def create_topics():
+    def create_topics(topics=None):
         """Create necessary topics if they don't exist"""
-        admin_client = AdminClient({'bootstrap.servers': KafkaConfig.BROKER})
+        admin_client = create_admin_client({'bootstrap.servers': KafkaConfig.BROKER})
         
         topic_list = [NewTopic(topic, num_partitions=3, replication_factor=1) 
-                     for topic in KafkaConfig.get_all_topics()]
+                     for topic in (topics or KafkaConfig.get_all_topics())]
 
         existing_topics = admin_client.list_topics(timeout=10).topics
         topics_to_create = [t for t in topic_list if t.topic not in existing_topics]
@@ -61,16 +81,16 @@ class KafkaService:
 
     @staticmethod
     def get_producer():
-        return Producer({
-            'bootstrap.servers': KafkaConfig.BROKER,
-            'message.timeout.ms': 5000,
-            'retries': 5
-        })
+        """Return the process-wide producer shared by every request"""
+        return ProducerManager.instance().producer
 
     @staticmethod
-    def produce_event(topic, source, payload, snapshot=None):
-        producer = KafkaService.get_producer()
-        
+    def build_event(topic, source, payload, snapshot=None, key=None):
+        """Build an event envelope.
+
+        key is the partitioning key; when omitted it falls back to the
+        userId/productId found in the snapshot or payload.
+        """
         event = {
             "eventId": str(uuid4()),
             "timestamp": datetime.utcnow(),
@@ -79,58 +99,107 @@ class KafkaService:
             "payload": payload,
             "snapshot": snapshot or {}
         }
+        event["key"] = str(key) if key is not None else event_key(event)
+        return event
+
+    @staticmethod
+    def serialize_event(event):
+        """Encode an event with the configured codec; returns (value, headers)"""
+        return encode_event(event)
+
+    @staticmethod
+    def deserialize_message(msg):
+        return decode_event(msg.value(), msg.headers())
+
+    @staticmethod
+    def produce_event(topic, source, payload, snapshot=None, key=None, durable=False, session=None):
+        """Record an event for publication and return it.
+
+        By default the event is written to the outbox (one Mongo insert) and the
+        relay publishes it. With durable=True it is sent straight to Kafka and
+        the call blocks until the broker acknowledges it.
+        """
+        event = KafkaService.build_event(topic, source, payload, snapshot, key=key)
 
         try:
-            serialized_event = json.dumps(event, cls=DateTimeEncoder)
-            producer.produce(topic, serialized_event)
-            producer.flush()
-            logger.info(f"Event produced to {topic}")
-            
-            from app import app
-            with app.app_context():
-                from app.services.mongo_service import save_event_to_mongo
-                save_event_to_mongo(event)
+            if durable:
+                report = KafkaService.publish_events([event])[0]
+                if report.error is not None:
+                    raise KafkaException(report.error)
+                logger.info(f"Event delivered to {topic}")
+            else:
+                Outbox.enqueue([event], session=session)
+            return event
                 
         except Exception as e:
             logger.error(f"Failed to produce event to {topic}: {str(e)}", exc_info=True)
             raise
 
     @staticmethod
-    def consume_events(topic, group_id, callback):
-        """Consume Kafka events and execute callback"""
-        consumer = Consumer({
+    def event_batch(durable=False, timeout=None, session=None):
+        """Context manager collecting many events into one outbox insert or producer batch"""
+        return EventBatch(durable=durable, timeout=timeout, session=session)
+
+    @staticmethod
+    def produce_events(envelopes, durable=False, timeout=None, session=None):
+        """Publish many events at once.
+
+        Each envelope is a dict with topic, source, payload and optional
+        snapshot and key.
+        Returns the enqueued events, or their delivery reports when durable.
+        """
+        with KafkaService.event_batch(durable=durable, timeout=timeout, session=session) as batch:
+            for envelope in envelopes:
+                batch.add(**envelope)
+        return batch.reports if durable else batch.events
+
+    @staticmethod
+    def publish_events(events, timeout=None):
+        """Send already built events directly to Kafka and store the delivered ones"""
+        with ProducerManager.instance().batch(timeout=timeout) as batch:
+            for event in events:
+                value, headers = KafkaService.serialize_event(event)
+                batch.add(event['topic'], value, key=event.get('key'), headers=headers)
+
+        delivered = [event for event, report in zip(events, batch.reports) if report.error is None]
+        if delivered:
+            # Durable callers expect the event store to be up to date on return
+            from app.services.mongo_service import save_events_to_mongo
+            save_events_to_mongo(delivered, sync=True)
+        return batch.reports
+
+    @staticmethod
+    def get_consumer(group_id, offset_reset='earliest'):
+        return create_consumer({
             'bootstrap.servers': KafkaConfig.BROKER,
             'group.id': group_id,
-            'auto.offset.reset': 'earliest',
+            'auto.offset.reset': offset_reset,
             'enable.auto.commit': False
         })
 
-        consumer.subscribe([topic])
+    @staticmethod
+    def consume_events(topic, group_id, callback, workers=None, key_fn=event_key):
+        """Consume Kafka events and execute callback once per event.
+
+        With workers set, callbacks run on a key-ordered worker pool instead of
+        the poll thread.
+        """
+        runtime = ConsumerRuntime(group_id, workers=workers, key_fn=key_fn)
+        runtime.register(topic, callback)
+        runtime.run()
+
+    @staticmethod
+    def consume_batches(topic, group_id, batch_callback, batch_size=None, batch_timeout=None):
+        """Consume Kafka events in batches and commit offsets once per batch.
+
+        batch_callback receives a list of decoded events. A batch is handed over
+        when it reaches batch_size or when batch_timeout seconds have passed
+        since its first event.
+        """
+        runtime = ConsumerRuntime(group_id, batch_size=batch_size, batch_timeout=batch_timeout)
+        runtime.register_batch(topic, batch_callback)
+        runtime.run()
 
-        try:
-            logger.info(f"Starting consumer for topic {topic}")
-            while True:
-                try:
-                    msg = consumer.poll(1.0)
-                    if msg is None:
-                        continue
-                    if msg.error():
-                        if msg.error().code() == KafkaException._PARTITION_EOF:
-                            continue
-                        logger.error(f"Consumer error: {msg.error()}")
-                        continue
-
-                    event = json.loads(msg.value().decode('utf-8'))
-                    logger.info(f"Received event from {topic}: {event}")
-                    callback(event)
-                    consumer.commit(asynchronous=False)
-                except Exception as e:
-                    logger.error(f"Error processing message in consumer loop: {str(e)}")
-        except KeyboardInterrupt:
-            pass
-        finally:
-            consumer.close()
-    
     @staticmethod
     def start_consumers_in_background(topic, group_id, callback):
         """Start background consumers"""
@@ -139,4 +208,388 @@ class KafkaService:
             topic,
             group_id,
             callback
-        )).start()
\ No newline at end of file
+        )).start()
+
+class ConsumerRuntime:
+    """A single consumer per service, subscribed to many topics.
+
+    Handlers are registered per topic, optionally per snapshot.status, and
+    every polled event is dispatched to the matching one. Per-event handlers
+    run inline or, with workers > 1, on a key-ordered worker pool; batch
+    handlers receive a list of events once it reaches batch_size or
+    batch_timeout. Offsets are committed per partition only up to the last
+    message whose predecessors have all been handled.
+
+    An event whose handler raises is republished to the group's next retry
+    topic (one per entry of retry_delays) or, once retries are exhausted or
+    the error is not retryable, to its dead-letter topic, and its offset is
+    committed so the partition keeps moving; while that topic cannot be
+    written to the move is retried with backoff. Messages that cannot be
+    decoded (e.g. a codec this version does not know yet) go straight to
+    the dead-letter topic, to be replayed once the consumer is upgraded.
+    Retry topics are consumed by the same runtime; a partition whose next
+    event is not due yet is paused instead of blocking the loop. With dead_letter=False and no retry
+    delays, failed events are logged and skipped instead, and the group gets
+    no topics of its own; use it for per-replica groups whose work is
+    disposable (cache invalidation), together with offset_reset='latest'.
+
+    previous_groups maps a topic to the group ids that consumed it before
+    this runtime did. Partitions the group has no committed offset for yet
+    start from the furthest offset those groups committed instead of
+    offset_reset, so merging consumers into one group does not replay the
+    topic from the beginning.
+    """
+
+    def __init__(self, group_id, workers=None, batch_size=None, batch_timeout=None, key_fn=event_key,
+                 retry_delays=None, non_retryable=NON_RETRYABLE_ERRORS, offset_reset='earliest', dead_letter=True,
+                 previous_groups=None):
+        self.group_id = group_id
+        self.workers = workers or 1
+        self.batch_size = batch_size or KafkaConfig.CONSUMER_BATCH_SIZE
+        self.batch_timeout = batch_timeout or KafkaConfig.CONSUMER_BATCH_TIMEOUT
+        self.key_fn = key_fn
+        self.retry_delays = list(KafkaConfig.RETRY_DELAYS if retry_delays is None else retry_delays)
+        self.non_retryable = tuple(non_retryable)
+        self.offset_reset = offset_reset
+        self.dead_letter = dead_letter
+        self.previous_groups = {topic: list(groups) for topic, groups in (previous_groups or {}).items()}
+        self._handlers = {}
+        self._batch_handlers = {}
+        self._buffers = {}
+        self._buffer_started = None
+        self._paused = {}
+        self._running = threading.Event()
+        self._stopping = threading.Event()
+        self._consumer = None
+        self._executor = None
+        self._tracker = OffsetTracker()
+        self._received = {}
+
+    @property
+    def topics(self):
+        return list(self._handlers) + [t for t in self._batch_handlers if t not in self._handlers]
+
+    @property
+    def retry_topics(self):
+        return [KafkaConfig.retry_topic(self.group_id, delay) for delay in self.retry_delays]
+
+    @property
+    def dead_letter_topic(self):
+        return KafkaConfig.dead_letter_topic(self.group_id)
+
+    def register(self, topic, handler, status=None):
+        """Call handler(event) for events of topic (and snapshot.status, when given)"""
+        self._handlers.setdefault(topic, {})[status] = handler
+        return self
+
+    def register_batch(self, topic, handler):
+        """Call handler(events) with batches of events of topic"""
+        self._batch_handlers[topic] = handler
+        return self
+
+    def start(self):
+        """Run the consumer loop on a background thread"""
+        thread = threading.Thread(target=self.run, name=f'consumer-{self.group_id}', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._running.clear()
+        self._stopping.set()
+
+    def run(self):
+        own_topics = self.retry_topics + ([self.dead_letter_topic] if self.dead_letter else [])
+        try:
+            if own_topics:
+                KafkaService.create_topics(own_topics)
+        except Exception as e:
+            logger.error(f"Failed to create retry topics for {self.group_id}: {str(e)}")
+
+        self._consumer = KafkaService.get_consumer(self.group_id, self.offset_reset)
+        try:
+            self._adopt_offsets()
+        except KafkaException as e:
+            logger.error(f"Failed to take over offsets of {self.previous_groups} for {self.group_id}: {str(e)}")
+        if self.workers > 1:
+            self._executor = KeyOrderedExecutor(self.workers, queue_size=KafkaConfig.CONSUMER_WORKER_QUEUE_SIZE)
+        self._consumer.subscribe(self.topics + self.retry_topics, on_revoke=self._on_revoke)
+        self._running.set()
+
+        last_commit = last_metrics = time.monotonic()
+        try:
+            logger.info(f"Starting consumer {self.group_id} for topics {self.topics} with {self.workers} workers")
+            while self._running.is_set():
+                try:
+                    self._resume_due()
+                    timeout = self.batch_timeout
+                    if self._buffer_started is not None:
+                        timeout = max(0, self._buffer_started + self.batch_timeout - time.monotonic())
+                    if self._paused:
+                        timeout = max(0, min(timeout, min(self._paused.values()) - time.time()))
+
+                    for msg in self._consumer.consume(num_messages=self.batch_size, timeout=timeout):
+                        self._handle_message(msg)
+
+                    flushed = self._flush_batches()
+                    if flushed or time.monotonic() - last_commit >= KafkaConfig.CONSUMER_COMMIT_INTERVAL:
+                        self._commit()
+                        last_commit = time.monotonic()
+                    if time.monotonic() - last_metrics >= KafkaConfig.CONSUMER_METRICS_INTERVAL:
+                        self._update_metrics(time.monotonic() - last_metrics)
+                        last_metrics = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Error processing message in consumer loop: {str(e)}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._drain()
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._consumer.close()
+
+    def _adopt_offsets(self):
+        """Commit the previous groups' offsets for partitions this group has never committed"""
+        adopted = []
+        for topic, groups in self.previous_groups.items():
+            metadata = self._consumer.list_topics(topic, timeout=10).topics.get(topic)
+            if metadata is None or not metadata.partitions:
+                continue
+            partitions = [TopicPartition(topic, partition) for partition in metadata.partitions]
+            missing = [tp for tp in self._consumer.committed(partitions, timeout=10) if tp.offset < 0]
+            if not missing:
+                continue
+            previous = {}
+            for group_id in groups:
+                consumer = KafkaService.get_consumer(group_id)
+                try:
+                    for tp in consumer.committed(missing, timeout=10):
+                        if tp.offset >= 0:
+                            previous[tp.partition] = max(previous.get(tp.partition, 0), tp.offset)
+                finally:
+                    consumer.close()
+            adopted += [TopicPartition(topic, partition, offset) for partition, offset in previous.items()]
+        if adopted:
+            self._consumer.commit(offsets=adopted, asynchronous=False)
+            logger.info(f"{self.group_id} took over {len(adopted)} partition offsets from {self.previous_groups}")
+
+    def _handle_message(self, msg):
+        if msg.error():
+            if msg.error().code() != KafkaError._PARTITION_EOF:
+                logger.error(f"Consumer error: {msg.error()}")
+                CONSUMER_ERRORS.inc(group=self.group_id, topic=msg.topic() or '', kind='consume')
+            return
+
+        # Already fetched messages behind a paused retry partition are fetched again on resume
+        if (msg.topic(), msg.partition()) in self._paused:
+            return
+        headers = dict(msg.headers() or [])
+        retry_at = headers.get(RETRY_AT_HEADER)
+        if retry_at is not None and int(retry_at) / 1000 > time.time():
+            self._pause_until(msg, int(retry_at) / 1000)
+            return
+
+        position = (msg.topic(), msg.partition(), msg.offset())
+        self._tracker.track(*position)
+        self._received[msg.topic()] = self._received.get(msg.topic(), 0) + 1
+        CONSUMED_MESSAGES.inc(group=self.group_id, topic=msg.topic())
+        original = headers.get(ORIGINAL_TOPIC_HEADER)
+        topic = original.decode('utf-8') if original else msg.topic()
+        try:
+            event = KafkaService.deserialize_message(msg)
+        except ValueError as e:
+            # An unknown codec or a newer envelope may decode after an upgrade: dead-letter it for replay
+            logger.error(f"Undecodable message at {msg.topic()}[{msg.partition()}]@{msg.offset()}: {str(e)}")
+            CONSUMER_ERRORS.inc(group=self.group_id, topic=topic, kind='decode')
+            if self._reroute(topic, msg, e):
+                self._tracker.complete(*position)
+            return
+        if topic in self._batch_handlers:
+            if self._buffer_started is None:
+                self._buffer_started = time.monotonic()
+            self._buffers.setdefault(topic, []).append((position, msg, event))
+            return
+
+        handler = self._route(topic, event)
+        if handler is None:
+            logger.debug(f"No handler for {topic} event with status {event.get('snapshot', {}).get('status')}")
+            self._tracker.complete(*position)
+            return
+
+        if self._executor is None:
+            self._process(handler, topic, position, msg, event)
+        else:
+            key = msg.key()
+            key = key.decode('utf-8', 'replace') if key else event.get('key') or self.key_fn(event)
+            self._executor.submit(key or f"{topic}:{msg.partition()}", self._process, handler, topic, position, msg, event)
+
+    def _route(self, topic, event):
+        handlers = self._handlers.get(topic, {})
+        status = (event.get('snapshot') or {}).get('status')
+        return handlers.get(status) or handlers.get(None)
+
+    def _process(self, handler, topic, position, msg, event):
+        try:
+            with HANDLER_LATENCY.time(group=self.group_id, topic=topic):
+                handler(event)
+        except Exception as e:
+            logger.error(f"Error processing event {event.get('eventId', 'unknown')} from {topic}: {str(e)}")
+            CONSUMER_ERRORS.inc(group=self.group_id, topic=topic, kind='handler')
+            if not self._reroute(topic, msg, e):
+                # Only when stopping: leave the offset uncommitted so the event is replayed after a restart
+                return
+        self._tracker.complete(*position)
+
+    def _flush_batches(self, force=False):
+        """Hand buffered events to batch handlers when the batch is full or old enough"""
+        if self._buffer_started is None:
+            return False
+        buffered = sum(len(items) for items in self._buffers.values())
+        if not force and buffered < self.batch_size and time.monotonic() - self._buffer_started < self.batch_timeout:
+            return False
+
+        buffers, self._buffers, self._buffer_started = self._buffers, {}, None
+        for topic, items in buffers.items():
+            events = [event for _, _, event in items]
+            logger.info(f"Received {len(events)} events from {topic}")
+            try:
+                with HANDLER_LATENCY.time(group=self.group_id, topic=topic):
+                    self._batch_handlers[topic](events)
+            except Exception as e:
+                logger.error(f"Error processing batch from {topic}: {str(e)}")
+                CONSUMER_ERRORS.inc(group=self.group_id, topic=topic, kind='handler')
+                # The handler may have applied part of the batch; retries are at-least-once
+                items = [item for item in items if self._reroute(topic, item[1], e)]
+            for position, _, _ in items:
+                self._tracker.complete(*position)
+        return True
+
+    def _reroute(self, topic, msg, error):
+        """Publish a failed message to its next retry topic or the DLQ; True once it is delivered"""
+        headers = dict(msg.headers() or [])
+        attempt = int(headers.get(RETRY_ATTEMPT_HEADER) or 0)
+        if isinstance(error, self.non_retryable) or attempt >= len(self.retry_delays):
+            if not self.dead_letter:
+                REROUTED_EVENTS.inc(group=self.group_id, topic=topic, destination='dropped')
+                logger.warning(f"Dropping message {msg.topic()}[{msg.partition()}]@{msg.offset()} after error: {error}")
+                return True
+            target, destination = self.dead_letter_topic, 'dlq'
+            headers.pop(RETRY_AT_HEADER, None)
+        else:
+            delay = self.retry_delays[attempt]
+            target, destination = KafkaConfig.retry_topic(self.group_id, delay), 'retry'
+            headers[RETRY_AT_HEADER] = str(int((time.time() + delay) * 1000)).encode('ascii')
+
+        headers[ORIGINAL_TOPIC_HEADER] = topic.encode('utf-8')
+        headers[RETRY_ATTEMPT_HEADER] = str(attempt + 1).encode('ascii')
+        headers[ERROR_HEADER] = f"{type(error).__name__}: {error}"[:1000].encode('utf-8')
+
+        # Until the message is delivered its offset cannot be committed, and nothing after it
+        # on the partition either: keep trying, backing off, rather than stall the partition
+        backoff = 1.0
+        while True:
+            try:
+                ProducerManager.instance().produce(
+                    target, msg.value(), key=msg.key(), headers=list(headers.items())
+                ).result(timeout=KafkaConfig.DELIVERY_TIMEOUT)
+                break
+            except Exception as e:
+                logger.error(f"Failed to move message {msg.topic()}[{msg.partition()}]@{msg.offset()} to {target}, "
+                             f"retrying in {backoff:.0f}s: {str(e)}")
+                CONSUMER_ERRORS.inc(group=self.group_id, topic=topic, kind='reroute')
+            if not self._running.is_set() or self._stopping.wait(backoff):
+                # Shutting down: the offset stays uncommitted and the event is replayed after a restart
+                return False
+            backoff = min(backoff * 2, KafkaConfig.REROUTE_MAX_BACKOFF)
+
+        REROUTED_EVENTS.inc(group=self.group_id, topic=topic, destination=destination)
+        logger.warning(f"Message from {topic} moved to {target} after {attempt + 1} failed attempt(s)")
+        return True
+
+    def _pause_until(self, msg, due):
+        """Stop fetching a retry partition until its next message is due"""
+        tp = TopicPartition(msg.topic(), msg.partition(), msg.offset())
+        self._consumer.pause([tp])
+        self._consumer.seek(tp)
+        self._paused[(msg.topic(), msg.partition())] = due
+
+    def _resume_due(self):
+        now = time.time()
+        due = [tp for tp, until in self._paused.items() if until <= now]
+        if due:
+            self._consumer.resume([TopicPartition(topic, partition) for topic, partition in due])
+            for tp in due:
+                del self._paused[tp]
+
+    def _commit(self, asynchronous=True):
+        offsets = self._tracker.committable()
+        if offsets:
+            self._consumer.commit(
+                offsets=[TopicPartition(t, p, offset) for (t, p), offset in offsets.items()],
+                asynchronous=asynchronous
+            )
+
+    def _drain(self):
+        """Finish buffered and in-flight work and commit its offsets"""
+        self._flush_batches(force=True)
+        if self._executor is not None:
+            self._executor.join()
+        try:
+            self._commit(asynchronous=False)
+        except KafkaException as e:
+            logger.error(f"Failed to commit offsets: {str(e)}")
+
+    def _update_metrics(self, elapsed):
+        """Refresh throughput and per-partition lag of the assigned partitions"""
+        received, self._received = self._received, {}
+        for topic in self.topics + self.retry_topics:
+            CONSUMER_THROUGHPUT.set(round(received.get(topic, 0) / elapsed, 3), group=self.group_id, topic=topic)
+
+        try:
+            assignment = self._consumer.assignment()
+            if not assignment:
+                return
+            for tp in self._consumer.committed(assignment, timeout=5):
+                low, high = self._consumer.get_watermark_offsets(tp, timeout=5)
+                # Nothing committed yet: everything still in the partition is pending
+                committed = tp.offset if tp.offset >= 0 else low
+                CONSUMER_LAG.set(max(0, high - committed), group=self.group_id, topic=tp.topic, partition=tp.partition)
+        except KafkaException as e:
+            logger.warning(f"Could not refresh consumer lag for {self.group_id}: {str(e)}")
+
+    def _on_revoke(self, consumer, partitions):
+        # Work for revoked partitions must be committed before another member takes them
+        self._drain()
+        self._tracker.forget([(tp.topic, tp.partition) for tp in partitions])
+        for tp in partitions:
+            self._paused.pop((tp.topic, tp.partition), None)
+            CONSUMER_LAG.remove(group=self.group_id, topic=tp.topic, partition=tp.partition)
+
+class EventBatch:
+    """Builds event envelopes and hands them over together when the block exits"""
+
+    def __init__(self, durable=False, timeout=None, session=None):
+        self.durable = durable
+        self.timeout = timeout
+        self.session = session
+        self.events = []
+        self.reports = []
+
+    def add(self, topic, source, payload, snapshot=None, key=None):
+        event = KafkaService.build_event(topic, source, payload, snapshot, key=key)
+        self.events.append(event)
+        return event
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None or not self.events:
+            return False
+
+        if self.durable:
+            self.reports = KafkaService.publish_events(self.events, timeout=self.timeout)
+            delivered = sum(1 for report in self.reports if report.error is None)
+            logger.info(f"Batch delivered {delivered}/{len(self.events)} events")
+        else:
+            Outbox.enqueue(self.events, session=self.session)
+        return False
@@ -0,0 +1,106 @@
+# shared/kafka_workers.py
+import logging
+import queue
+import threading
+import zlib
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+def event_key(event):
+    """Ordering key of an event: the user or product it is about"""
+    for section in ('snapshot', 'payload'):
+        data = event.get(section) or {}
+        for field in ('userId', 'productId'):
+            if data.get(field):
+                return str(data[field])
+    return None
+
+class KeyOrderedExecutor:
+    """Bounded thread pool that runs tasks with the same key in submission order.
+
+    Every key is pinned to one worker, so different keys run concurrently
+    while a single key never does.
+    """
+
+    def __init__(self, workers, queue_size=100, name='kafka-worker'):
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f'{name}-{i}', daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, fn, *args):
+        """Queue fn(*args) on the worker owning key; blocks when that worker is full"""
+        index = zlib.crc32(key.encode('utf-8')) % len(self._queues)
+        self._queues[index].put((fn, args))
+
+    def join(self):
+        """Wait until every queued task has run"""
+        for q in self._queues:
+            q.join()
+
+    def shutdown(self):
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    @staticmethod
+    def _run(tasks):
+        while True:
+            task = tasks.get()
+            try:
+                if task is _STOP:
+                    return
+                fn, args = task
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Unhandled error in worker task: {str(e)}", exc_info=True)
+            finally:
+                tasks.task_done()
+
+class OffsetTracker:
+    """Tracks in-flight offsets per partition and exposes only contiguous completed ones.
+
+    A partition's commit position never moves past a message that is still
+    being processed, even if later messages have already finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._done = {}
+
+    def track(self, topic, partition, offset):
+        with self._lock:
+            self._pending.setdefault((topic, partition), deque()).append(offset)
+
+    def complete(self, topic, partition, offset):
+        with self._lock:
+            self._done.setdefault((topic, partition), set()).add(offset)
+
+    def committable(self):
+        """Return {(topic, partition): next offset to commit} for partitions that advanced"""
+        advanced = {}
+        with self._lock:
+            for tp, pending in self._pending.items():
+                done = self._done.get(tp, set())
+                last = None
+                while pending and pending[0] in done:
+                    last = pending.popleft()
+                    done.discard(last)
+                if last is not None:
+                    advanced[tp] = last + 1
+        return advanced
+
+    def forget(self, partitions):
+        """Drop state for partitions that were revoked from this consumer"""
+        with self._lock:
+            for tp in partitions:
+                self._pending.pop(tp, None)
+                self._done.pop(tp, None)
@@ -0,0 +1,400 @@
+# shared/memory_kafka.py
+"""In-process stand-in for a Kafka cluster.
+
+Implements the subset of the confluent_kafka Producer, Consumer and
+AdminClient API the services use, on top of a single process-wide broker
+with topics, partitions, consumer groups and committed offsets. Selected
+with KAFKA_BACKEND=memory; meant for offline load tests and CI, not for
+running more than one process.
+"""
+import itertools
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from confluent_kafka import KafkaError, KafkaException, TopicPartition, TIMESTAMP_CREATE_TIME
+
+OFFSET_INVALID = -1001
+DEFAULT_PARTITIONS = 3
+
+class MemoryMessage:
+    """Same accessors as confluent_kafka.Message"""
+
+    def __init__(self, topic, partition, offset=None, key=None, value=None, headers=None, error=None):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+        self._error = error
+        self._timestamp = int(time.time() * 1000)
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return self._headers
+
+    def error(self):
+        return self._error
+
+    def timestamp(self):
+        return TIMESTAMP_CREATE_TIME, self._timestamp
+
+    def __len__(self):
+        return len(self._value or b'')
+
+class _PartitionMetadata:
+    def __init__(self, partition_id):
+        self.id = partition_id
+
+class _TopicMetadata:
+    def __init__(self, topic, partitions):
+        self.topic = topic
+        self.partitions = {i: _PartitionMetadata(i) for i in range(partitions)}
+        self.error = None
+
+class _ClusterMetadata:
+    def __init__(self, topics):
+        self.topics = topics
+
+class _Group:
+    def __init__(self):
+        self.members = {}
+        self.committed = {}
+        self.generation = 0
+
+class MemoryBroker:
+    """Process-wide broker shared by every in-memory client"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._topics = {}
+        self._groups = {}
+        self._member_ids = itertools.count()
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Drop every topic, message and group (between benchmark runs)"""
+        with cls._instance_lock:
+            cls._instance = None
+
+    # Topics
+
+    def create_topic(self, topic, partitions=DEFAULT_PARTITIONS):
+        with self._lock:
+            if topic in self._topics:
+                return False
+            self._topics[topic] = [[] for _ in range(partitions)]
+            for group in self._groups.values():
+                group.generation += 1
+            return True
+
+    def metadata(self, topic=None):
+        with self._lock:
+            names = [topic] if topic is not None else list(self._topics)
+            return _ClusterMetadata({
+                name: _TopicMetadata(name, len(self._topics[name]))
+                for name in names if name in self._topics
+            })
+
+    def partition_count(self, topic):
+        with self._lock:
+            partitions = self._topics.get(topic)
+            return len(partitions) if partitions is not None else None
+
+    def append(self, topic, partition, key, value, headers):
+        with self._lock:
+            log = self._topics[topic][partition]
+            msg = MemoryMessage(topic, partition, len(log), key, value, headers)
+            log.append(msg)
+            self._lock.notify_all()
+            return msg
+
+    def fetch(self, topic, partition, offset, limit):
+        with self._lock:
+            return self._topics[topic][partition][offset:offset + limit]
+
+    def watermarks(self, topic, partition):
+        with self._lock:
+            return 0, len(self._topics[topic][partition])
+
+    def wait_for_data(self, timeout):
+        with self._lock:
+            self._lock.wait(timeout)
+
+    # Consumer groups
+
+    def join(self, group_id, topics):
+        with self._lock:
+            group = self._groups.setdefault(group_id, _Group())
+            member_id = next(self._member_ids)
+            group.members[member_id] = list(topics)
+            group.generation += 1
+            return member_id
+
+    def leave(self, group_id, member_id):
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group and group.members.pop(member_id, None) is not None:
+                group.generation += 1
+                self._lock.notify_all()
+
+    def group_ids(self):
+        with self._lock:
+            return [group_id for group_id, group in self._groups.items() if group.members]
+
+    def generation(self, group_id):
+        with self._lock:
+            return self._groups[group_id].generation
+
+    def assignment(self, group_id, member_id):
+        """Round-robin the partitions of each topic over the members subscribed to it"""
+        with self._lock:
+            group = self._groups[group_id]
+            assigned = []
+            topics = sorted({t for subscribed in group.members.values() for t in subscribed})
+            for topic in topics:
+                if topic not in self._topics:
+                    continue
+                members = sorted(m for m, subscribed in group.members.items() if topic in subscribed)
+                for partition in range(len(self._topics[topic])):
+                    if members[partition % len(members)] == member_id:
+                        assigned.append((topic, partition))
+            return group.generation, assigned
+
+    def commit(self, group_id, offsets):
+        with self._lock:
+            self._groups.setdefault(group_id, _Group()).committed.update(offsets)
+
+    def committed(self, group_id, topic, partition):
+        with self._lock:
+            group = self._groups.get(group_id)
+            return group.committed.get((topic, partition), OFFSET_INVALID) if group else OFFSET_INVALID
+
+    def lag(self):
+        """Messages not yet committed by the active groups, summed over their subscriptions"""
+        with self._lock:
+            total = 0
+            for group in self._groups.values():
+                topics = {t for subscribed in group.members.values() for t in subscribed}
+                for topic in topics & set(self._topics):
+                    for partition, log in enumerate(self._topics[topic]):
+                        total += len(log) - max(0, group.committed.get((topic, partition), 0))
+            return total
+
+class MemoryProducer:
+    """Messages are appended immediately; delivery callbacks are served by poll() and flush()"""
+
+    def __init__(self, config=None):
+        self._broker = MemoryBroker.instance()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._round_robin = itertools.count()
+
+    def produce(self, topic, value=None, key=None, partition=None, on_delivery=None, headers=None, **kwargs):
+        on_delivery = on_delivery or kwargs.get('callback')
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+
+        count = self._broker.partition_count(topic)
+        if count is None:
+            result = (KafkaError(KafkaError.UNKNOWN_TOPIC_OR_PART), MemoryMessage(topic, partition, key=key, value=value))
+        else:
+            if partition is None or partition < 0:
+                partition = zlib.crc32(key) % count if key is not None else next(self._round_robin) % count
+            result = (None, self._broker.append(topic, partition, key, value, headers))
+
+        if on_delivery is not None:
+            with self._lock:
+                self._callbacks.append((on_delivery, result))
+
+    def poll(self, timeout=None):
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for on_delivery, (err, msg) in callbacks:
+            on_delivery(err, msg)
+        if not callbacks and timeout:
+            time.sleep(min(timeout, 0.01))
+        return len(callbacks)
+
+    def flush(self, timeout=None):
+        self.poll(0)
+        return 0
+
+    def list_topics(self, topic=None, timeout=None):
+        return self._broker.metadata(topic)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._callbacks)
+
+class MemoryConsumer:
+    def __init__(self, config):
+        self._broker = MemoryBroker.instance()
+        self._group_id = config['group.id']
+        self._reset = config.get('auto.offset.reset', 'latest')
+        self._partition_eof = config.get('enable.partition.eof', False)
+        self._member_id = None
+        self._generation = None
+        self._on_assign = None
+        self._on_revoke = None
+        self._positions = {}
+        self._paused = set()
+        self._eof_reported = set()
+        self._closed = False
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None, on_lost=None):
+        if self._member_id is not None:
+            self._broker.leave(self._group_id, self._member_id)
+        self._on_assign = on_assign
+        self._on_revoke = on_revoke
+        self._member_id = self._broker.join(self._group_id, topics)
+
+    def _rebalance(self):
+        if self._broker.generation(self._group_id) == self._generation:
+            return
+        previous = [TopicPartition(t, p) for t, p in self._positions]
+        if previous and self._on_revoke is not None:
+            self._on_revoke(self, previous)
+
+        self._generation, assigned = self._broker.assignment(self._group_id, self._member_id)
+        self._positions = {}
+        for topic, partition in assigned:
+            committed = self._broker.committed(self._group_id, topic, partition)
+            if committed < 0:
+                low, high = self._broker.watermarks(topic, partition)
+                committed = low if self._reset in ('earliest', 'smallest', 'beginning') else high
+            self._positions[(topic, partition)] = committed
+        self._paused &= set(self._positions)
+        self._eof_reported.clear()
+
+        if self._on_assign is not None:
+            self._on_assign(self, [TopicPartition(t, p, o) for (t, p), o in self._positions.items()])
+
+    def consume(self, num_messages=1, timeout=-1):
+        if self._closed:
+            raise RuntimeError('Consumer closed')
+        deadline = time.monotonic() + (timeout if timeout is not None and timeout >= 0 else 3600)
+        while True:
+            self._rebalance()
+            msgs = self._fetch(num_messages)
+            remaining = deadline - time.monotonic()
+            if msgs or remaining <= 0:
+                return msgs
+            self._broker.wait_for_data(min(remaining, 0.1))
+
+    def _fetch(self, limit):
+        msgs = []
+        for tp, position in list(self._positions.items()):
+            if tp in self._paused or len(msgs) >= limit:
+                continue
+            batch = self._broker.fetch(tp[0], tp[1], position, limit - len(msgs))
+            if batch:
+                msgs.extend(batch)
+                self._positions[tp] = position + len(batch)
+                self._eof_reported.discard(tp)
+            elif self._partition_eof and tp not in self._eof_reported:
+                self._eof_reported.add(tp)
+                msgs.append(MemoryMessage(tp[0], tp[1], position, error=KafkaError(KafkaError._PARTITION_EOF)))
+        return msgs
+
+    def poll(self, timeout=None):
+        msgs = self.consume(1, -1 if timeout is None else timeout)
+        return msgs[0] if msgs else None
+
+    def commit(self, message=None, offsets=None, asynchronous=True):
+        if message is not None:
+            committed = {(message.topic(), message.partition()): message.offset() + 1}
+        elif offsets is not None:
+            committed = {(tp.topic, tp.partition): tp.offset for tp in offsets}
+        else:
+            committed = dict(self._positions)
+        self._broker.commit(self._group_id, committed)
+        if not asynchronous:
+            return [TopicPartition(t, p, o) for (t, p), o in committed.items()]
+
+    def committed(self, partitions, timeout=None):
+        return [
+            TopicPartition(tp.topic, tp.partition, self._broker.committed(self._group_id, tp.topic, tp.partition))
+            for tp in partitions
+        ]
+
+    def position(self, partitions):
+        return [
+            TopicPartition(tp.topic, tp.partition, self._positions.get((tp.topic, tp.partition), OFFSET_INVALID))
+            for tp in partitions
+        ]
+
+    def get_watermark_offsets(self, partition, timeout=None, cached=False):
+        return self._broker.watermarks(partition.topic, partition.partition)
+
+    def assignment(self):
+        return [TopicPartition(t, p) for t, p in self._positions]
+
+    def pause(self, partitions):
+        self._paused.update((tp.topic, tp.partition) for tp in partitions)
+
+    def resume(self, partitions):
+        self._paused.difference_update((tp.topic, tp.partition) for tp in partitions)
+
+    def seek(self, partition):
+        tp = (partition.topic, partition.partition)
+        if tp not in self._positions:
+            raise KafkaException(KafkaError(KafkaError._UNKNOWN_PARTITION))
+        self._positions[tp] = partition.offset
+
+    def list_topics(self, topic=None, timeout=None):
+        return self._broker.metadata(topic)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            if self._member_id is not None:
+                self._broker.leave(self._group_id, self._member_id)
+
+class MemoryAdminClient:
+    def __init__(self, config=None):
+        self._broker = MemoryBroker.instance()
+
+    def list_topics(self, topic=None, timeout=None):
+        return self._broker.metadata(topic)
+
+    def create_topics(self, new_topics, **kwargs):
+        futures = {}
+        for new_topic in new_topics:
+            future = Future()
+            partitions = new_topic.num_partitions if new_topic.num_partitions > 0 else DEFAULT_PARTITIONS
+            if self._broker.create_topic(new_topic.topic, partitions):
+                future.set_result(None)
+            else:
+                future.set_exception(KafkaException(KafkaError(
+                    KafkaError.TOPIC_ALREADY_EXISTS, f"Topic already exists: {new_topic.topic}"
+                )))
+            futures[new_topic.topic] = future
+        return futures
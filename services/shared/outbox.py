@@ -0,0 +1,263 @@
+# shared/outbox.py
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from uuid import uuid4
+from shared.kafka_config import KafkaConfig
+from shared.kafka_producer import ProducerManager
+from shared.indexes import index, query
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'PENDING'
+SENT = 'SENT'
+FAILED = 'FAILED'
+
+# Part of every service's index registry
+OUTBOX_INDEXES = [
+    index('outbox', [('status', 1), ('_id', 1)]),
+    index('outbox', 'sentAt', expireAfterSeconds=KafkaConfig.OUTBOX_RETENTION_SECONDS),
+    # Only FAILED rows have a failedAt: the ones past their last re-drive age out here
+    index('outbox', 'failedAt', expireAfterSeconds=KafkaConfig.OUTBOX_FAILED_RETENTION_SECONDS)
+]
+
+OUTBOX_QUERIES = [
+    query('outbox-pending', 'outbox', {'status': PENDING}, [('_id', 1)])
+]
+
+def _outbox_collection():
+    from app import mongo
+    return mongo.db.outbox
+
+def _supports_transactions(client):
+    # Transactions need a replica set or a sharded cluster; mongomock has no topology at all
+    description = getattr(client, 'topology_description', None)
+    return description is not None and description.topology_type_name in ('ReplicaSetWithPrimary', 'Sharded')
+
+def retry_backoff(attempts):
+    """Seconds to wait before publishing a row again after its attempts-th failure"""
+    return min(KafkaConfig.OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1), KafkaConfig.OUTBOX_MAX_BACKOFF)
+
+class Outbox:
+    """Events waiting to be published, stored next to the domain data"""
+
+    @staticmethod
+    @contextmanager
+    def transaction():
+        """Session to pass to the domain write and to enqueue, so both commit or neither does.
+
+        Yields None where the server cannot run transactions (standalone
+        MongoDB, mongomock); the writes then happen one after the other.
+        """
+        from app import mongo
+
+        if not _supports_transactions(mongo.cx):
+            yield None
+            return
+        with mongo.cx.start_session() as session:
+            with session.start_transaction():
+                yield session
+
+    @staticmethod
+    def enqueue(events, session=None):
+        """Write events to the outbox in a single insert.
+
+        Pass the session of the domain write to make both part of one transaction.
+        """
+        if not events:
+            return []
+        now = datetime.utcnow()
+        rows = [{
+            "eventId": event['eventId'],
+            "topic": event['topic'],
+            "event": event,
+            "status": PENDING,
+            "attempts": 0,
+            "createdAt": now
+        } for event in events]
+        result = _outbox_collection().insert_many(rows, ordered=True, session=session)
+        logger.info(f"{len(rows)} events written to outbox")
+        OutboxRelay.notify()
+        return result.inserted_ids
+
+    @staticmethod
+    def claim(owner, limit, lease_seconds):
+        """Lease the oldest pending rows so concurrent relays never publish the same batch"""
+        outbox = _outbox_collection()
+        now = datetime.utcnow()
+        claimable = {
+            'status': PENDING,
+            '$or': [{'leaseUntil': None}, {'leaseUntil': {'$lt': now}}]
+        }
+
+        ids = [row['_id'] for row in outbox.find(claimable, {'_id': 1}).sort('_id', 1).limit(limit)]
+        if not ids:
+            return []
+
+        outbox.update_many(
+            {'_id': {'$in': ids}, **claimable},
+            {'$set': {'leaseOwner': owner, 'leaseUntil': now + timedelta(seconds=lease_seconds)}}
+        )
+        return list(outbox.find({'_id': {'$in': ids}, 'leaseOwner': owner}).sort('_id', 1))
+
+    @staticmethod
+    def mark_sent(owner, ids):
+        if not ids:
+            return
+        _outbox_collection().update_many(
+            {'_id': {'$in': ids}, 'leaseOwner': owner},
+            {
+                '$set': {'status': SENT, 'sentAt': datetime.utcnow()},
+                '$unset': {'leaseOwner': '', 'leaseUntil': ''}
+            }
+        )
+
+    @staticmethod
+    def mark_failed(owner, row, error):
+        """Back the row off exponentially (claim skips it until leaseUntil), or fail it for good"""
+        attempts = row.get('attempts', 0) + 1
+        now = datetime.utcnow()
+        if attempts >= KafkaConfig.OUTBOX_MAX_ATTEMPTS:
+            update = {'status': FAILED, 'attempts': attempts, 'lastError': str(error), 'failedAt': now, 'leaseUntil': None}
+        else:
+            update = {
+                'status': PENDING, 'attempts': attempts, 'lastError': str(error),
+                'leaseUntil': now + timedelta(seconds=retry_backoff(attempts))
+            }
+        _outbox_collection().update_one(
+            {'_id': row['_id'], 'leaseOwner': owner},
+            {'$set': update, '$unset': {'leaseOwner': ''}}
+        )
+        if update['status'] == FAILED:
+            logger.error(f"Outbox event {row['eventId']} gave up after {attempts} attempts: {error}")
+
+    @staticmethod
+    def redrive(failed_before=None, limit=None, max_redrives=None):
+        """Put FAILED rows (those that failed before failed_before, by default all) back in the queue.
+
+        Rows already re-driven max_redrives times are left FAILED, for the
+        failedAt TTL to drop. Returns how many were re-queued. Their attempts
+        start over.
+        """
+        query = {'status': FAILED}
+        if failed_before is not None:
+            query['failedAt'] = {'$lt': failed_before}
+        if max_redrives is not None:
+            query['$or'] = [{'redrives': {'$lt': max_redrives}}, {'redrives': None}]
+        outbox = _outbox_collection()
+        cursor = outbox.find(query, {'_id': 1}).sort('_id', 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        ids = [row['_id'] for row in cursor]
+        if not ids:
+            return 0
+        result = outbox.update_many(
+            {'_id': {'$in': ids}, 'status': FAILED},
+            {'$set': {'status': PENDING, 'attempts': 0, 'leaseUntil': None}, '$inc': {'redrives': 1}, '$unset': {'failedAt': ''}}
+        )
+        logger.warning(f"{result.modified_count} failed outbox events re-queued")
+        OutboxRelay.notify()
+        return result.modified_count
+
+class OutboxRelay:
+    """Background worker that tails the outbox and publishes it to Kafka in batches.
+
+    Every OUTBOX_REDRIVE_INTERVAL seconds it also re-queues the rows that
+    ran out of attempts at least that long ago, so an outage longer than
+    the retry backoff delays events instead of losing them. A row is
+    re-queued at most OUTBOX_MAX_REDRIVES times; after that it stays FAILED
+    until OUTBOX_FAILED_RETENTION_SECONDS drops it.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, batch_size=None, poll_interval=None, lease_seconds=None):
+        self.batch_size = batch_size or KafkaConfig.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or KafkaConfig.OUTBOX_POLL_INTERVAL
+        self.lease_seconds = lease_seconds or KafkaConfig.OUTBOX_LEASE_SECONDS
+        self.redrive_interval = KafkaConfig.OUTBOX_REDRIVE_INTERVAL
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def start(cls):
+        """Start the process-wide relay (no-op if it is already running)"""
+        with cls._lock:
+            if cls._instance is None:
+                relay = cls()
+                relay._thread = threading.Thread(target=relay._run, name='outbox-relay', daemon=True)
+                relay._thread.start()
+                cls._instance = relay
+                logger.info(f"Outbox relay started as {relay.owner}")
+        return cls._instance
+
+    @classmethod
+    def notify(cls):
+        """Wake the local relay so freshly written events go out without waiting a poll cycle"""
+        relay = cls._instance
+        if relay is not None:
+            relay._wakeup.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def relay_once(self):
+        """Publish one claimed batch; returns the number of rows handled"""
+        from shared.kafka_service import KafkaService
+
+        rows = Outbox.claim(self.owner, self.batch_size, self.lease_seconds)
+        if not rows:
+            return 0
+
+        with ProducerManager.instance().batch() as batch:
+            for row in rows:
+                value, headers = KafkaService.serialize_event(row['event'])
+                batch.add(row['topic'], value, key=row['event'].get('key'), headers=headers)
+
+        sent = []
+        for row, report in zip(rows, batch.reports):
+            if report.error is None:
+                sent.append(row)
+            else:
+                Outbox.mark_failed(self.owner, row, report.error)
+
+        Outbox.mark_sent(self.owner, [row['_id'] for row in sent])
+        logger.info(f"Outbox relay published {len(sent)}/{len(rows)} events")
+
+        if sent:
+            # The event store is an audit log: a failure here must not republish
+            try:
+                from app.services.mongo_service import save_events_to_mongo
+                save_events_to_mongo([row['event'] for row in sent])
+            except Exception as e:
+                logger.error(f"Failed to store relayed events: {str(e)}")
+        return len(rows)
+
+    def _run(self):
+        last_redrive = time.monotonic()
+        while not self._stopped.is_set():
+            if self.redrive_interval and time.monotonic() - last_redrive >= self.redrive_interval:
+                last_redrive = time.monotonic()
+                try:
+                    Outbox.redrive(failed_before=datetime.utcnow() - timedelta(seconds=self.redrive_interval),
+                                   limit=self.batch_size, max_redrives=KafkaConfig.OUTBOX_MAX_REDRIVES)
+                except Exception as e:
+                    logger.error(f"Error re-queuing failed outbox events: {str(e)}")
+            try:
+                handled = self.relay_once()
+            except Exception as e:
+                logger.error(f"Error relaying outbox: {str(e)}", exc_info=True)
+                handled = 0
+
+            # A full batch means there is probably more waiting
+            if handled < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
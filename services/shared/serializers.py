@@ -0,0 +1,153 @@
+# shared/serializers.py
+import json
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+from bson import ObjectId
+from shared.kafka_config import KafkaConfig
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Kafka headers describing how an event value was written
+CODEC_HEADER = 'codec'
+SCHEMA_VERSION_HEADER = 'schema-version'
+SCHEMA_VERSION = 1
+
+_OBJECT_ID_EXT = 1
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+class _StdlibEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        try:
+            return _default(obj)
+        except TypeError:
+            return super().default(obj)
+
+class JsonCodec:
+    """JSON on the wire, encoded with orjson when it is installed"""
+
+    name = 'json'
+
+    @staticmethod
+    def encode(event):
+        if orjson is not None:
+            return orjson.dumps(event, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(event, cls=_StdlibEncoder).encode('utf-8')
+
+    @staticmethod
+    def decode(data):
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data.decode('utf-8'))
+
+def _plain(value):
+    """Values decoded by msgpack as the JSON codec returns them (timestamps as ISO strings)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+class MsgpackCodec:
+    """Compact binary encoding; decodes to the same types as the JSON codec.
+
+    Datetimes and ObjectIds are written as ISO strings and hex strings, as
+    JSON writes them. Events written by earlier versions carry them as a
+    msgpack timestamp and an ext type, which are decoded to strings too.
+    """
+
+    name = 'msgpack'
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return _default(obj)
+
+    @staticmethod
+    def _ext_hook(code, data):
+        if code == _OBJECT_ID_EXT:
+            return str(ObjectId(data))
+        return msgpack.ExtType(code, data)
+
+    @staticmethod
+    def _object_hook(obj):
+        return {key: _plain(value) for key, value in obj.items()}
+
+    @staticmethod
+    def encode(event):
+        return msgpack.packb(event, default=MsgpackCodec._default, use_bin_type=True)
+
+    @staticmethod
+    def decode(data):
+        return msgpack.unpackb(
+            data, raw=False, timestamp=3, ext_hook=MsgpackCodec._ext_hook, object_hook=MsgpackCodec._object_hook
+        )
+
+CODECS = {JsonCodec.name: JsonCodec}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec
+
+def get_codec(name=None):
+    name = name or KafkaConfig.EVENT_CODEC
+    codec = CODECS.get(name)
+    if codec is None:
+        logger.warning(f"Event codec {name} is not available, falling back to json")
+        codec = JsonCodec
+    return codec
+
+def encode_event(event, codec=None):
+    """Encode an event; returns the message value and the headers describing it"""
+    codec = get_codec(codec)
+    headers = [
+        (CODEC_HEADER, codec.name.encode('ascii')),
+        (SCHEMA_VERSION_HEADER, str(SCHEMA_VERSION).encode('ascii'))
+    ]
+    return codec.encode(event), headers
+
+def decode_event(value, headers=None):
+    """Decode a message value using its headers.
+
+    Messages without a codec header were written before the envelope existed
+    and are plain JSON. Raises ValueError for anything that is not an
+    event: tombstones, malformed values, values that are not an object.
+    """
+    header_map = dict(headers or [])
+    codec_name = header_map.get(CODEC_HEADER, b'json').decode('ascii')
+    version = int(header_map.get(SCHEMA_VERSION_HEADER, b'1'))
+    if version > SCHEMA_VERSION:
+        logger.debug(f"Decoding event with newer schema version {version}")
+
+    codec = CODECS.get(codec_name)
+    if codec is None:
+        raise ValueError(f"Unsupported event codec: {codec_name}")
+    if not value:
+        # Tombstones (compacted deletes) and empty values carry no event
+        raise ValueError("Message has no value")
+    try:
+        event = codec.decode(value)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Malformed {codec_name} event: {str(e)}")
+    if not isinstance(event, dict):
+        raise ValueError(f"Expected an event object, got {type(event).__name__}")
+    return event
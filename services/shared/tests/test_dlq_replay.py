@@ -0,0 +1,80 @@
+# shared/tests/test_dlq_replay.py
+"""DLQ replay against the in-memory broker.
+
+Run from the services directory:
+
+    python -m pytest shared/tests
+"""
+import os
+
+os.environ['KAFKA_BACKEND'] = 'memory'
+
+import json
+import time
+import unittest
+from shared.memory_kafka import MemoryBroker
+from shared.kafka_config import KafkaConfig
+from shared.kafka_service import ConsumerRuntime
+from shared.dlq_replay import replay
+
+TOPIC = 'replay-test-events'
+
+def _wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def _messages(broker, topic):
+    return sum(broker.watermarks(topic, partition)[1] for partition in range(broker.partition_count(topic) or 0))
+
+class DlqReplayTest(unittest.TestCase):
+    def setUp(self):
+        MemoryBroker.reset()
+        self.broker = MemoryBroker.instance()
+        self.broker.create_topic(TOPIC, 1)
+        self.runtimes = []
+
+    def tearDown(self):
+        for runtime in self.runtimes:
+            runtime.stop()
+
+    def _start(self, group_id, handler):
+        runtime = ConsumerRuntime(group_id)
+        runtime.register(TOPIC, handler)
+        runtime.start()
+        self.runtimes.append(runtime)
+        return runtime
+
+    def test_replay_reaches_only_the_failing_group(self):
+        failing, other = [], []
+        broken = {'value': True}
+
+        def flaky(event):
+            failing.append(event)
+            if broken['value']:
+                # Not retryable: straight to the DLQ
+                raise ValueError('handler bug')
+
+        self._start('replay-failing-group', flaky)
+        self._start('replay-other-group', other.append)
+        self.assertTrue(_wait_until(lambda: len(self.broker.group_ids()) == 2))
+
+        self.broker.append(TOPIC, 0, b'k', json.dumps({'eventId': 'e-1'}).encode('utf-8'), [])
+        dlq = KafkaConfig.dead_letter_topic('replay-failing-group')
+        self.assertTrue(_wait_until(lambda: _messages(self.broker, dlq) == 1))
+        self.assertTrue(_wait_until(lambda: len(other) == 1))
+
+        broken['value'] = False
+        replayed = replay('replay-failing-group', idle_timeout=0.5)
+        self.assertEqual(replayed[TOPIC], 1)
+
+        self.assertTrue(_wait_until(lambda: len(failing) == 2))
+        time.sleep(0.5)
+        self.assertEqual([event['eventId'] for event in other], ['e-1'])
+        self.assertEqual(_messages(self.broker, TOPIC), 1)
+
+if __name__ == '__main__':
+    unittest.main()
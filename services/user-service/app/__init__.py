@@ -1,10 +1,15 @@
-from flask import Flask
+from flask import Flask, Response
 from flask_pymongo import PyMongo
 import logging
 from shared.kafka_config import KafkaConfig
 from threading import Thread
 import time
 from shared.kafka_service import KafkaService
+from shared.outbox import OutboxRelay
+from shared.event_archive import EventArchiver
+from shared.metrics import registry, CONTENT_TYPE
+from shared.backends import init_mongo
+from shared.indexes import ensure_indexes
 
 import os
 logging.basicConfig(
@@ -24,25 +29,18 @@ def initialize_kafka():
         try:
             KafkaService.wait_for_kafka(max_retries=10, delay=2)
             KafkaService.create_topics()
+
+            # Relay events written to the outbox
+            OutboxRelay.start()
+
+            # Move old events to segment files (only where EVENT_ARCHIVE_ENABLED)
+            EventArchiver.start()
             
             # Import handlers after everything is initialized
-            from app.events.user_events import (
-                handle_user_registration,
-                handle_welcome_event
-            )
+            from app.events.user_events import start_event_consumers
             
-            # Start consumers in separate threads
-            Thread(target=lambda: KafkaService.consume_events(
-                KafkaConfig.USER_REGISTRATION_TOPIC,
-                'user-service-group',
-                handle_user_registration
-            )).start()
-
-            Thread(target=lambda: KafkaService.consume_events(
-                KafkaConfig.WELCOME_TOPIC,
-                'welcome-service-group',
-                handle_welcome_event
-            )).start()
+            # One consumer for all of the service's topics
+            start_event_consumers()
 
             logger.info("Kafka initialized successfully")
             return True
@@ -60,16 +58,21 @@ def create_app():
     
     # Additional configuration
     app.config["MONGO_URI"] = os.getenv('MONGO_URI', 'mongodb://mongo:27017/ecommerce')
+    app.config["MONGO_BACKEND"] = os.getenv('MONGO_BACKEND', 'mongo')
     app.config["PROPAGATE_EXCEPTIONS"] = True
 
     # Initialize MongoDB first
     try:
-        mongo.init_app(app)
+        init_mongo(mongo, app)
         
         # Verify MongoDB connection
         with app.app_context():
             mongo.db.command('ping')
             logger.info("MongoDB connection established successfully")
+
+        # Indexes for the service's hot queries (idempotent)
+        from app.indexes import INDEXES
+        ensure_indexes(mongo.db, INDEXES)
             
     except Exception as e:
         logger.error(f"MongoDB initialization failed: {str(e)}")
@@ -110,6 +113,11 @@ def create_app():
             logger.error(f"Health check failed: {str(e)}")
             return {"status": "unhealthy", "error": str(e)}, 500
 
+    # Consumer lag, throughput and handler latency
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
     # Initialize Kafka in background (with retries)
     Thread(target=initialize_kafka).start()
 
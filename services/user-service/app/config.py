@@ -8,5 +8,8 @@ class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/ecommerce')
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     USER_TOPIC = 'user-registration'
+    USER_UPDATES_TOPIC = 'user-updates'
+    USER_DELETIONS_TOPIC = 'user-deletions'
+    USER_LOGINS_TOPIC = 'user-logins'
     WELCOME_TOPIC = 'welcome-flow'
     NOTIFICATION_TOPIC = 'notification-topic'
\ No newline at end of file
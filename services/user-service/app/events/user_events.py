@@ -1,5 +1,5 @@
-from app.services.mongo_service import save_event_to_mongo
-from shared.kafka_service import KafkaService
+from app.services.mongo_service import save_event_to_mongo, save_events_to_mongo
+from shared.kafka_service import KafkaService, ConsumerRuntime
 from shared.kafka_config import KafkaConfig
 import logging
 from datetime import datetime
@@ -34,6 +34,7 @@ def handle_user_registration(event):
             topic=KafkaConfig.WELCOME_TOPIC,
             source="UserService",
             payload=welcome_payload,
+            key=event.get('snapshot', {}).get('userId'),
             snapshot={
                 "userId": event.get('snapshot', {}).get('userId'),
                 "status": "WELCOME_SENT",
@@ -43,6 +44,7 @@ def handle_user_registration(event):
         
     except Exception as e:
         logger.error(f"Error handling user registration: {e}")
+        raise
 
 def handle_welcome_event(event):
     try:
@@ -54,4 +56,23 @@ def handle_welcome_event(event):
         # For example, update user status or send metrics
         
     except Exception as e:
-        logger.error(f"Error handling welcome event: {e}")
\ No newline at end of file
+        logger.error(f"Error handling welcome event: {e}")
+        raise
+
+def handle_welcome_events_batch(events):
+    try:
+        # Save all welcome events of the batch with a single insert
+        save_events_to_mongo(events)
+        logger.info(f"{len(events)} welcome events saved")
+    except Exception as e:
+        logger.error(f"Error handling welcome events: {e}")
+        raise
+
+def start_event_consumers():
+    """Start one consumer for every topic user-service listens to"""
+    # Welcome events used to be consumed by a group of their own; start where it left off
+    runtime = ConsumerRuntime('user-service-group', previous_groups={KafkaConfig.WELCOME_TOPIC: ['welcome-service-group']})
+    runtime.register(KafkaConfig.USER_REGISTRATION_TOPIC, handle_user_registration)
+    runtime.register_batch(KafkaConfig.WELCOME_TOPIC, handle_welcome_events_batch)
+    runtime.start()
+    logger.info("Started user event consumer")
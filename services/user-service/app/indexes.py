@@ -0,0 +1,13 @@
+# Índices de MongoDB del servicio de usuarios; se aplican al arrancar (ver shared/indexes.py)
+from shared.indexes import index, query
+from shared.event_store import EVENT_INDEXES, EVENT_QUERIES
+from shared.outbox import OUTBOX_INDEXES, OUTBOX_QUERIES
+
+INDEXES = [
+    # Login y registro buscan por email, que además debe ser único
+    index('users', 'email', unique=True)
+] + EVENT_INDEXES + OUTBOX_INDEXES
+
+QUERIES = [
+    query('user-by-email', 'users', {'email': 'probe@example.com'})
+] + EVENT_QUERIES + OUTBOX_QUERIES
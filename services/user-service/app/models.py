@@ -5,31 +5,32 @@ from app import mongo  # Importamos mongo desde app
 
 class User:
     @staticmethod
-    def create(user_data):
+    def create(user_data, session=None):
         user_data['created_at'] = datetime.utcnow()
         user_data['updated_at'] = datetime.utcnow()
-        result = mongo.db.users.insert_one(user_data)
+        result = mongo.db.users.insert_one(user_data, session=session)
         return str(result.inserted_id)
 
     @staticmethod
-    def get_by_id(user_id):
-        return mongo.db.users.find_one({'_id': ObjectId(user_id)})
+    def get_by_id(user_id, session=None):
+        return mongo.db.users.find_one({'_id': ObjectId(user_id)}, session=session)
 
     @staticmethod
-    def get_by_email(email):
-        return mongo.db.users.find_one({'email': email})
+    def get_by_email(email, session=None):
+        return mongo.db.users.find_one({'email': email}, session=session)
 
     @staticmethod
-    def update(user_id, update_data):
+    def update(user_id, update_data, session=None):
         update_data['updated_at'] = datetime.utcnow()
         return mongo.db.users.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            session=session
         )
 
     @staticmethod
-    def delete(user_id):
-        return mongo.db.users.delete_one({'_id': ObjectId(user_id)})
+    def delete(user_id, session=None):
+        return mongo.db.users.delete_one({'_id': ObjectId(user_id)}, session=session)
 
     @staticmethod
     def get_all():
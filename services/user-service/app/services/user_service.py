@@ -3,7 +3,9 @@ from app.schemas import UserSchema, UserUpdateSchema, LoginSchema
 from app.services.kafka_service import KafkaService
 from app.services.mongo_service import save_event_to_mongo
 from app.config import Config
+from shared.outbox import Outbox
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 import hashlib
 import uuid
 from datetime import datetime
@@ -28,44 +30,47 @@ class UserService:
         user_data['password'] = hashlib.sha256(user_data['password'].encode()).hexdigest()
         user_data['user_id'] = str(uuid.uuid4())
 
-        # Crear usuario
-        user_id = User.create(user_data)
-        user = User.get_by_id(user_id)
-
-        # Publicar eventos (manejar serialización de fechas)
-        user_data_for_event = user_data.copy()
-        user_data_for_event.pop('password', None)  # No enviar contraseña en el evento
-        
-        KafkaService.produce_event(
-            topic=Config.USER_TOPIC,
-            source="UserService",
-            payload=user_data_for_event,
-            snapshot={
-                "userId": user['user_id'],
-                "status": "REGISTERED",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
-
-        welcome_payload = {
-            "to": user['email'],
-            "subject": "¡Bienvenido!",
-            "content": f"Hola {user['name']}, gracias por registrarte."
-        }
-
-        KafkaService.produce_event(
-            topic=Config.USER_TOPIC,
-            source="UserService",
-            payload={
-                **user_data_for_event,
-                "registration_timestamp": datetime.utcnow().isoformat()
-            },
-            snapshot={
-                "userId": user['user_id'],
-                "status": "REGISTERED",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+        # El usuario y sus eventos en el outbox se confirman juntos (donde Mongo admite transacciones)
+        try:
+            with Outbox.transaction() as session:
+                user_id = User.create(user_data, session=session)
+                user = User.get_by_id(user_id, session=session)
+
+                # Publicar eventos (manejar serialización de fechas)
+                user_data_for_event = user_data.copy()
+                user_data_for_event.pop('password', None)  # No enviar contraseña en el evento
+
+                # Ambos eventos se guardan juntos en el outbox
+                with KafkaService.event_batch(session=session) as batch:
+                    batch.add(
+                        topic=Config.USER_TOPIC,
+                        source="UserService",
+                        payload=user_data_for_event,
+                        key=user['user_id'],
+                        snapshot={
+                            "userId": user['user_id'],
+                            "status": "REGISTERED",
+                            "timestamp": datetime.utcnow().isoformat()
+                        }
+                    )
+
+                    batch.add(
+                        topic=Config.USER_TOPIC,
+                        source="UserService",
+                        payload={
+                            **user_data_for_event,
+                            "registration_timestamp": datetime.utcnow().isoformat()
+                        },
+                        key=user['user_id'],
+                        snapshot={
+                            "userId": user['user_id'],
+                            "status": "REGISTERED",
+                            "timestamp": datetime.utcnow().isoformat()
+                        }
+                    )
+        except DuplicateKeyError:
+            # Otro registro con el mismo email se adelantó entre la comprobación y el insert
+            raise ValueError("User already exists")
 
         return user
 
@@ -106,26 +111,33 @@ class UserService:
             if existing_user and str(existing_user['_id']) != user_id:
                 raise ValueError("Email already in use")
 
-        result = User.update(user_obj_id, update_data)
-        if result.modified_count == 0:
-            raise ValueError("User not found or no changes made")
-
-        user = User.get_by_id(user_obj_id)
-        
-        # Publicar evento de actualización
-        KafkaService.produce_event(
-            topic="user-updates",
-            source="UserService",
-            payload={
-                **update_data,
-                "update_timestamp": datetime.utcnow().isoformat()  # Fecha como string
-            },
-            snapshot={
-                "userId": user['user_id'],
-                "status": "UPDATED",
-                "timestamp": datetime.utcnow().isoformat()  # Fecha como string
-            }
-        )
+        # La actualización y su evento en el outbox se confirman juntos
+        try:
+            with Outbox.transaction() as session:
+                result = User.update(user_obj_id, update_data, session=session)
+                if result.modified_count == 0:
+                    raise ValueError("User not found or no changes made")
+
+                user = User.get_by_id(user_obj_id, session=session)
+
+                # Publicar evento de actualización
+                KafkaService.produce_event(
+                    topic=Config.USER_UPDATES_TOPIC,
+                    source="UserService",
+                    payload={
+                        **update_data,
+                        "update_timestamp": datetime.utcnow().isoformat()  # Fecha como string
+                    },
+                    key=user['user_id'],
+                    snapshot={
+                        "userId": user['user_id'],
+                        "status": "UPDATED",
+                        "timestamp": datetime.utcnow().isoformat()  # Fecha como string
+                    },
+                    session=session
+                )
+        except DuplicateKeyError:
+            raise ValueError("Email already in use")
         return user
 
     @staticmethod
@@ -137,25 +149,29 @@ class UserService:
         except Exception:
             raise ValueError("Invalid user ID format")
             
-        user = User.get_by_id(user_obj_id)
-        if not user:
-            raise ValueError("User not found")
-
-        result = User.delete(user_obj_id)
-        if result.deleted_count == 0:
-            raise ValueError("User not found")
-
-        # Publicar evento de eliminación
-        KafkaService.produce_event(
-            topic="user-deletions",
-            source="UserService",
-            payload={"userId": user['user_id']},
-            snapshot={
-                "userId": user['user_id'],
-                "status": "DELETED",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+        # El borrado y su evento en el outbox se confirman juntos
+        with Outbox.transaction() as session:
+            user = User.get_by_id(user_obj_id, session=session)
+            if not user:
+                raise ValueError("User not found")
+
+            result = User.delete(user_obj_id, session=session)
+            if result.deleted_count == 0:
+                raise ValueError("User not found")
+
+            # Publicar evento de eliminación
+            KafkaService.produce_event(
+                topic=Config.USER_DELETIONS_TOPIC,
+                source="UserService",
+                payload={"userId": user['user_id']},
+                key=user['user_id'],
+                snapshot={
+                    "userId": user['user_id'],
+                    "status": "DELETED",
+                    "timestamp": datetime.utcnow().isoformat()
+                },
+                session=session
+            )
 
         return {"message": "User deleted successfully"}
 
@@ -166,25 +182,29 @@ class UserService:
         if errors:
             raise ValueError(errors)
 
-        user = User.get_by_email(login_data['email'])
-        if not user:
-            raise ValueError("Invalid credentials")
-
-        hashed_password = hashlib.sha256(login_data['password'].encode()).hexdigest()
-        if user['password'] != hashed_password:
-            raise ValueError("Invalid credentials")
-
-        # Publicar evento de login
-        KafkaService.produce_event(
-            topic="user-logins",
-            source="UserService",
-            payload={"email": login_data['email']},
-            snapshot={
-                "userId": user['user_id'],
-                "status": "LOGGED_IN",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+        # El login se lee y su evento se encola en la misma transacción
+        with Outbox.transaction() as session:
+            user = User.get_by_email(login_data['email'], session=session)
+            if not user:
+                raise ValueError("Invalid credentials")
+
+            hashed_password = hashlib.sha256(login_data['password'].encode()).hexdigest()
+            if user['password'] != hashed_password:
+                raise ValueError("Invalid credentials")
+
+            # Publicar evento de login
+            KafkaService.produce_event(
+                topic=Config.USER_LOGINS_TOPIC,
+                source="UserService",
+                payload={"email": login_data['email']},
+                key=user['user_id'],
+                snapshot={
+                    "userId": user['user_id'],
+                    "status": "LOGGED_IN",
+                    "timestamp": datetime.utcnow().isoformat()
+                },
+                session=session
+            )
 
         return {"message": "Login successful", "user_id": user['user_id']}
 